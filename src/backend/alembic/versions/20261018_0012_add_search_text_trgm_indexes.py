@@ -0,0 +1,137 @@
+"""add trigger-maintained search_text columns with pg_trgm GIN indexes for global search
+
+Revision ID: 20261018_0012
+Revises: 20250914_0011
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0012'
+down_revision = '20250914_0011'
+branch_labels = None
+depends_on = None
+
+
+# Same text the search router used to concatenate on the fly (keep in sync with routers/search.py)
+TRIP_TEXT = "COALESCE({r}.name,'') || ' ' || COALESCE({r}.description,'') || ' ' || COALESCE({r}.start_date::text,'') || ' ' || COALESCE({r}.end_date::text,'')"
+NODE_TEXT = "COALESCE({r}.name,'') || ' ' || COALESCE({r}.description,'') || ' ' || COALESCE({r}.notes,'') || ' ' || COALESCE({r}.osm_name,'') || ' ' || COALESCE({r}.osm_country,'') || ' ' || COALESCE({r}.osm_state,'') || ' ' || COALESCE({r}.arrival_date::text,'') || ' ' || COALESCE({r}.departure_date::text,'')"
+LEG_TEXT = "COALESCE({r}.notes,'') || ' ' || COALESCE({r}.type,'') || ' ' || COALESCE({r}.start_osm_name,'') || ' ' || COALESCE({r}.end_osm_name,'') || ' ' || COALESCE({r}.start_osm_country,'') || ' ' || COALESCE({r}.end_osm_country,'') || ' ' || COALESCE({r}.start_osm_state,'') || ' ' || COALESCE({r}.end_osm_state,'') || ' ' || COALESCE({r}.date::text,'') || ' ' || COALESCE({fd}.airline,'') || ' ' || COALESCE({fd}.flight_number,'') || ' ' || COALESCE({fd}.start_airport,'') || ' ' || COALESCE({fd}.end_airport,'')"
+STOP_TEXT = "COALESCE({r}.name,'') || ' ' || COALESCE({r}.notes,'') || ' ' || COALESCE({r}.category,'') || ' ' || COALESCE({r}.osm_name,'') || ' ' || COALESCE({r}.osm_country,'') || ' ' || COALESCE({r}.osm_state,'') || ' ' || COALESCE({r}.start_date::text,'') || ' ' || COALESCE({r}.end_date::text,'')"
+ADVENTURE_TEXT = STOP_TEXT
+
+SIMPLE_TABLES = {
+    'trips': TRIP_TEXT,
+    'nodes': NODE_TEXT,
+    'stops': STOP_TEXT,
+    'adventures': ADVENTURE_TEXT,
+}
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    for tbl in list(SIMPLE_TABLES) + ['legs']:
+        op.execute(f"ALTER TABLE {tbl} ADD COLUMN IF NOT EXISTS search_text TEXT")
+
+    # Backfill existing rows without bumping updated_at
+    for tbl in list(SIMPLE_TABLES) + ['legs']:
+        op.execute(f"ALTER TABLE {tbl} DISABLE TRIGGER trg_{tbl}_set_updated_at")
+    for tbl, expr in SIMPLE_TABLES.items():
+        op.execute(f"UPDATE {tbl} r SET search_text = {expr.format(r='r')}")
+    op.execute(
+        f"""
+        UPDATE legs r SET search_text = {LEG_TEXT.format(r='r', fd='fd')}
+        FROM legs l LEFT JOIN flight_details fd ON fd.leg_id = l.id
+        WHERE l.id = r.id
+        """
+    )
+    for tbl in list(SIMPLE_TABLES) + ['legs']:
+        op.execute(f"ALTER TABLE {tbl} ENABLE TRIGGER trg_{tbl}_set_updated_at")
+
+    # Trips, nodes, stops, adventures: text comes from the row itself
+    for tbl, expr in SIMPLE_TABLES.items():
+        op.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION set_{tbl}_search_text() RETURNS trigger AS $$
+            BEGIN
+              NEW.search_text := {expr.format(r='NEW')};
+              RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS trg_{tbl}_set_search_text ON {tbl};
+            CREATE TRIGGER trg_{tbl}_set_search_text
+              BEFORE INSERT OR UPDATE ON {tbl}
+              FOR EACH ROW EXECUTE FUNCTION set_{tbl}_search_text();
+            """
+        )
+
+    # Legs also cover their flight_details; flight_details changes touch the leg so it recomputes
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION set_legs_search_text() RETURNS trigger AS $$
+        DECLARE
+          fd RECORD;
+        BEGIN
+          SELECT airline, flight_number, start_airport, end_airport INTO fd
+          FROM flight_details WHERE leg_id = NEW.id;
+          NEW.search_text := {LEG_TEXT.format(r='NEW', fd='fd')};
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_legs_set_search_text ON legs;
+        CREATE TRIGGER trg_legs_set_search_text
+          BEFORE INSERT OR UPDATE ON legs
+          FOR EACH ROW EXECUTE FUNCTION set_legs_search_text();
+
+        CREATE OR REPLACE FUNCTION touch_leg_search_text() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            UPDATE legs SET search_text = NULL WHERE id = OLD.leg_id;
+          ELSE
+            UPDATE legs SET search_text = NULL WHERE id = NEW.leg_id;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_flight_details_touch_leg_search_text ON flight_details;
+        CREATE TRIGGER trg_flight_details_touch_leg_search_text
+          AFTER INSERT OR UPDATE OR DELETE ON flight_details
+          FOR EACH ROW EXECUTE FUNCTION touch_leg_search_text();
+
+        -- That touch must not bump legs.updated_at (it feeds the list ETags): skip updates that
+        -- change nothing but search_text. BEFORE triggers run by name, so this sees the new text.
+        DROP TRIGGER IF EXISTS trg_legs_set_updated_at ON legs;
+        CREATE TRIGGER trg_legs_set_updated_at
+          BEFORE UPDATE ON legs
+          FOR EACH ROW
+          WHEN ((to_jsonb(OLD) - 'search_text' - 'updated_at') IS DISTINCT FROM (to_jsonb(NEW) - 'search_text' - 'updated_at'))
+          EXECUTE FUNCTION set_updated_at();
+        """
+    )
+
+    for tbl in list(SIMPLE_TABLES) + ['legs']:
+        op.execute(f"CREATE INDEX IF NOT EXISTS idx_{tbl}_search_text_trgm ON {tbl} USING GIN (search_text gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        DROP TRIGGER IF EXISTS trg_legs_set_updated_at ON legs;
+        CREATE TRIGGER trg_legs_set_updated_at
+          BEFORE UPDATE ON legs
+          FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+        """
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_flight_details_touch_leg_search_text ON flight_details")
+    op.execute("DROP FUNCTION IF EXISTS touch_leg_search_text()")
+    for tbl in list(SIMPLE_TABLES) + ['legs']:
+        op.execute(f"DROP INDEX IF EXISTS idx_{tbl}_search_text_trgm")
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{tbl}_set_search_text ON {tbl}")
+        op.execute(f"DROP FUNCTION IF EXISTS set_{tbl}_search_text()")
+        op.execute(f"ALTER TABLE {tbl} DROP COLUMN IF EXISTS search_text")
@@ -0,0 +1,206 @@
+"""add denormalized search_documents table kept in sync by triggers
+
+Revision ID: 20261018_0013
+Revises: 20261018_0012
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0013'
+down_revision = '20261018_0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS search_documents (
+            entity_type TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            trip_id INTEGER,
+            title TEXT,
+            subtitle TEXT,
+            date DATE,
+            start_date DATE,
+            end_date DATE,
+            field_names TEXT[] NOT NULL, -- searchable fields in matched_fields order
+            field_values TEXT[] NOT NULL,
+            search_text TEXT,            -- same concatenation as <table>.search_text
+            document TSVECTOR,           -- weighted: A title, B places, C notes/description, D dates
+            PRIMARY KEY (entity_type, entity_id)
+        );
+        """
+    )
+
+    # One row per searchable entity, in the shape global_search returns
+    op.execute(
+        """
+        CREATE OR REPLACE VIEW search_documents_source AS
+        SELECT
+            'trip'::text AS entity_type, t.id AS entity_id, NULL::int AS trip_id,
+            t.name AS title, t.description AS subtitle,
+            t.start_date AS date, t.start_date AS start_date, t.end_date AS end_date,
+            ARRAY['name','description','start_date','end_date'] AS field_names,
+            ARRAY[t.name, t.description, t.start_date::text, t.end_date::text] AS field_values,
+            t.search_text,
+            setweight(to_tsvector('simple', COALESCE(t.name,'')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(t.description,'')), 'C') ||
+            setweight(to_tsvector('simple', COALESCE(t.start_date::text,'') || ' ' || COALESCE(t.end_date::text,'')), 'D') AS document
+        FROM trips t
+
+        UNION ALL
+        SELECT
+            'node', n.id, n.trip_id,
+            n.name, COALESCE(NULLIF(n.description,''), NULLIF(n.notes,''), NULLIF(n.osm_name,'')),
+            COALESCE(n.arrival_date, n.departure_date), n.arrival_date, n.departure_date,
+            ARRAY['name','description','notes','osm_name','osm_country','osm_state','arrival_date','departure_date'],
+            ARRAY[n.name, n.description, n.notes, n.osm_name, n.osm_country, n.osm_state, n.arrival_date::text, n.departure_date::text],
+            n.search_text,
+            setweight(to_tsvector('simple', COALESCE(n.name,'')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(n.osm_name,'') || ' ' || COALESCE(n.osm_state,'') || ' ' || COALESCE(n.osm_country,'')), 'B') ||
+            setweight(to_tsvector('simple', COALESCE(n.description,'') || ' ' || COALESCE(n.notes,'')), 'C') ||
+            setweight(to_tsvector('simple', COALESCE(n.arrival_date::text,'') || ' ' || COALESCE(n.departure_date::text,'')), 'D')
+        FROM nodes n
+        WHERE n.invisible IS NOT TRUE
+
+        UNION ALL
+        SELECT
+            'leg', l.id, l.trip_id,
+            (COALESCE(ns.name, l.start_osm_name, 'Unknown') || ' → ' || COALESCE(ne.name, l.end_osm_name, 'Unknown')),
+            CASE
+                WHEN l.type = 'flight' AND fd.airline IS NOT NULL THEN
+                    (fd.airline || COALESCE(' ' || fd.flight_number, '') || COALESCE(' (' || l.miles::int || ' mi)', ''))
+                ELSE (l.type || COALESCE(' (' || l.miles::int || ' mi)', ''))
+            END,
+            l.date, l.date, NULL::date,
+            ARRAY['notes','type','start_osm_name','end_osm_name','start_osm_country','end_osm_country','start_osm_state','end_osm_state','date','airline','flight_number','start_airport','end_airport'],
+            ARRAY[l.notes, l.type, l.start_osm_name, l.end_osm_name, l.start_osm_country, l.end_osm_country, l.start_osm_state, l.end_osm_state, l.date::text, fd.airline, fd.flight_number, fd.start_airport, fd.end_airport],
+            l.search_text,
+            setweight(to_tsvector('simple', COALESCE(ns.name, l.start_osm_name, '') || ' ' || COALESCE(ne.name, l.end_osm_name, '')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(l.start_osm_name,'') || ' ' || COALESCE(l.end_osm_name,'') || ' ' || COALESCE(l.start_osm_state,'') || ' ' || COALESCE(l.end_osm_state,'') || ' ' || COALESCE(l.start_osm_country,'') || ' ' || COALESCE(l.end_osm_country,'') || ' ' || COALESCE(fd.start_airport,'') || ' ' || COALESCE(fd.end_airport,'')), 'B') ||
+            setweight(to_tsvector('simple', COALESCE(l.notes,'') || ' ' || COALESCE(l.type,'') || ' ' || COALESCE(fd.airline,'') || ' ' || COALESCE(fd.flight_number,'')), 'C') ||
+            setweight(to_tsvector('simple', COALESCE(l.date::text,'')), 'D')
+        FROM legs l
+        LEFT JOIN nodes ns ON ns.id = l.start_node_id
+        LEFT JOIN nodes ne ON ne.id = l.end_node_id
+        LEFT JOIN flight_details fd ON fd.leg_id = l.id
+
+        UNION ALL
+        SELECT
+            'stop', s.id, s.trip_id,
+            s.name, s.category,
+            s.start_date, s.start_date, s.end_date,
+            ARRAY['name','notes','category','osm_name','osm_country','osm_state','start_date','end_date'],
+            ARRAY[s.name, s.notes, s.category, s.osm_name, s.osm_country, s.osm_state, s.start_date::text, s.end_date::text],
+            s.search_text,
+            setweight(to_tsvector('simple', COALESCE(s.name,'')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(s.osm_name,'') || ' ' || COALESCE(s.osm_state,'') || ' ' || COALESCE(s.osm_country,'')), 'B') ||
+            setweight(to_tsvector('simple', COALESCE(s.notes,'') || ' ' || COALESCE(s.category,'')), 'C') ||
+            setweight(to_tsvector('simple', COALESCE(s.start_date::text,'') || ' ' || COALESCE(s.end_date::text,'')), 'D')
+        FROM stops s
+
+        UNION ALL
+        SELECT
+            'adventure', a.id, NULL::int,
+            a.name, a.category,
+            COALESCE(a.start_date, a.end_date), a.start_date, a.end_date,
+            ARRAY['name','notes','category','osm_name','osm_country','osm_state','start_date','end_date'],
+            ARRAY[a.name, a.notes, a.category, a.osm_name, a.osm_country, a.osm_state, a.start_date::text, a.end_date::text],
+            a.search_text,
+            setweight(to_tsvector('simple', COALESCE(a.name,'')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(a.osm_name,'') || ' ' || COALESCE(a.osm_state,'') || ' ' || COALESCE(a.osm_country,'')), 'B') ||
+            setweight(to_tsvector('simple', COALESCE(a.notes,'') || ' ' || COALESCE(a.category,'')), 'C') ||
+            setweight(to_tsvector('simple', COALESCE(a.start_date::text,'') || ' ' || COALESCE(a.end_date::text,'')), 'D')
+        FROM adventures a;
+        """
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION search_documents_refresh(p_type TEXT, p_id INTEGER) RETURNS void AS $$
+        BEGIN
+          DELETE FROM search_documents WHERE entity_type = p_type AND entity_id = p_id;
+          INSERT INTO search_documents (entity_type, entity_id, trip_id, title, subtitle, date, start_date, end_date,
+                                        field_names, field_values, search_text, document)
+          SELECT entity_type, entity_id, trip_id, title, subtitle, date, start_date, end_date,
+                 field_names, field_values, search_text, document
+          FROM search_documents_source
+          WHERE entity_type = p_type AND entity_id = p_id;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION search_documents_rebuild() RETURNS INTEGER AS $$
+        DECLARE
+          n INTEGER;
+        BEGIN
+          TRUNCATE search_documents;
+          INSERT INTO search_documents (entity_type, entity_id, trip_id, title, subtitle, date, start_date, end_date,
+                                        field_names, field_values, search_text, document)
+          SELECT entity_type, entity_id, trip_id, title, subtitle, date, start_date, end_date,
+                 field_names, field_values, search_text, document
+          FROM search_documents_source;
+          GET DIAGNOSTICS n = ROW_COUNT;
+          RETURN n;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- TG_ARGV[0] is the entity_type stored in search_documents
+        CREATE OR REPLACE FUNCTION search_documents_sync() RETURNS trigger AS $$
+        DECLARE
+          v_id INTEGER;
+          v_name_changed BOOLEAN := TRUE;
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            v_id := OLD.id;
+          ELSE
+            v_id := NEW.id;
+          END IF;
+          PERFORM search_documents_refresh(TG_ARGV[0], v_id);
+
+          -- Leg titles are built from their start/end node names
+          IF TG_TABLE_NAME = 'nodes' THEN
+            IF TG_OP = 'UPDATE' THEN
+              v_name_changed := NEW.name IS DISTINCT FROM OLD.name;
+            END IF;
+            IF v_name_changed THEN
+              PERFORM search_documents_refresh('leg', l.id)
+              FROM legs l
+              WHERE l.start_node_id = v_id OR l.end_node_id = v_id;
+            END IF;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+    # flight_details changes already touch their leg (20261018_0012), which fires the legs trigger
+    for tbl, entity_type in (('trips', 'trip'), ('nodes', 'node'), ('legs', 'leg'), ('stops', 'stop'), ('adventures', 'adventure')):
+        op.execute(
+            f"""
+            DROP TRIGGER IF EXISTS trg_{tbl}_search_documents ON {tbl};
+            CREATE TRIGGER trg_{tbl}_search_documents
+              AFTER INSERT OR UPDATE OR DELETE ON {tbl}
+              FOR EACH ROW EXECUTE FUNCTION search_documents_sync('{entity_type}');
+            """
+        )
+
+    op.execute("SELECT search_documents_rebuild()")
+
+    op.execute("CREATE INDEX IF NOT EXISTS idx_search_documents_search_text_trgm ON search_documents USING GIN (search_text gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_search_documents_document ON search_documents USING GIN (document)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_search_documents_trip_id ON search_documents(trip_id)")
+
+
+def downgrade() -> None:
+    for tbl in ('trips', 'nodes', 'legs', 'stops', 'adventures'):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{tbl}_search_documents ON {tbl}")
+    op.execute("DROP FUNCTION IF EXISTS search_documents_sync()")
+    op.execute("DROP FUNCTION IF EXISTS search_documents_rebuild()")
+    op.execute("DROP FUNCTION IF EXISTS search_documents_refresh(TEXT, INTEGER)")
+    op.execute("DROP VIEW IF EXISTS search_documents_source")
+    op.execute("DROP TABLE IF EXISTS search_documents")
@@ -0,0 +1,62 @@
+"""notify the search_suggest channel when suggestable names change
+
+Revision ID: 20261018_0014
+Revises: 20261018_0013
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0014'
+down_revision = '20261018_0013'
+branch_labels = None
+depends_on = None
+
+
+TABLES = (('trips', 'trip'), ('nodes', 'node'), ('stops', 'stop'), ('adventures', 'adventure'))
+
+
+def upgrade() -> None:
+    # Payload is '<entity_type>:<id>'; the API reloads that entity into its prefix index.
+    # pg_notify de-duplicates identical payloads within a transaction.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_search_suggest() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('search_suggest', TG_ARGV[0] || ':' || OLD.id);
+          ELSE
+            PERFORM pg_notify('search_suggest', TG_ARGV[0] || ':' || NEW.id);
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+    for tbl, entity_type in TABLES:
+        # Only the columns the suggest index reads
+        if tbl == 'trips':
+            cols = 'name'
+        elif tbl == 'nodes':
+            cols = 'name, osm_name, trip_id, invisible'
+        elif tbl == 'stops':
+            cols = 'name, osm_name, trip_id'
+        else:
+            cols = 'name, osm_name'
+        op.execute(
+            f"""
+            DROP TRIGGER IF EXISTS trg_{tbl}_notify_search_suggest ON {tbl};
+            CREATE TRIGGER trg_{tbl}_notify_search_suggest
+              AFTER INSERT OR UPDATE OF {cols} OR DELETE ON {tbl}
+              FOR EACH ROW EXECUTE FUNCTION notify_search_suggest('{entity_type}');
+            """
+        )
+
+
+def downgrade() -> None:
+    for tbl, _ in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{tbl}_notify_search_suggest ON {tbl}")
+    op.execute("DROP FUNCTION IF EXISTS notify_search_suggest()")
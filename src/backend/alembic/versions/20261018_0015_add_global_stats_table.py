@@ -0,0 +1,36 @@
+"""add global_stats table for precomputed /api/trips/data/statistics
+
+Revision ID: 20261018_0015
+Revises: 20261018_0014
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0015'
+down_revision = '20261018_0014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # One row per statistic (kind) and grouping (key, subkey): refs counts contributing
+    # rows, value sums a measure such as miles. Filled and kept current by 20261018_0016.
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS global_stats (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL DEFAULT '',
+            subkey TEXT NOT NULL DEFAULT '',
+            refs BIGINT NOT NULL DEFAULT 0,
+            value DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, key, subkey)
+        );
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS global_stats")
@@ -0,0 +1,214 @@
+"""add trigger-maintained statistics counters as an append-only delta log
+
+Revision ID: 20261018_0016
+Revises: 20261018_0015
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0016'
+down_revision = '20261018_0015'
+branch_labels = None
+depends_on = None
+
+
+# Counter rows each source row r contributes: (kind, key, subkey, value, applies)
+#   trip_count                      trips
+#   leg_miles     (type)            legs of that type ('' for NULL), value = miles
+#   trip_miles    (trip_id)         legs of that trip, value = miles
+#   dest_no_osm                     visible nodes without osm_id
+#   dest_osm      ('', osm_id)      visible nodes
+#   country       ('', osm_country) nodes
+#   state         ('', osm_state)   nodes + stops
+#   country_state (country, state)  visible nodes ('' for NULL state)
+#   country_dest  (country, osm_id) visible nodes
+#   category      (category)        stops + adventures
+# refs counts the contributing rows, so distinct counts are the number of keys with refs > 0.
+STAT_ROWS = {
+    'trips': """
+        ('trip_count', '', '', 0::double precision, TRUE)""",
+    'legs': """
+        ('leg_miles', COALESCE(r.type, ''), '', COALESCE(r.miles, 0), TRUE),
+        ('trip_miles', r.trip_id::text, '', COALESCE(r.miles, 0), r.trip_id IS NOT NULL)""",
+    'nodes': """
+        ('country', '', r.osm_country, 0::double precision, r.osm_country IS NOT NULL),
+        ('state', '', r.osm_state, 0, r.osm_state IS NOT NULL),
+        ('dest_osm', '', r.osm_id, 0, r.invisible IS NOT TRUE AND r.osm_id IS NOT NULL),
+        ('dest_no_osm', '', '', 0, r.invisible IS NOT TRUE AND r.osm_id IS NULL),
+        ('country_state', r.osm_country, COALESCE(r.osm_state, ''), 0, r.invisible IS NOT TRUE AND r.osm_country IS NOT NULL),
+        ('country_dest', r.osm_country, r.osm_id, 0, r.invisible IS NOT TRUE AND r.osm_country IS NOT NULL AND r.osm_id IS NOT NULL)""",
+    'stops': """
+        ('state', '', r.osm_state, 0::double precision, r.osm_state IS NOT NULL),
+        ('category', r.category, '', 0, r.category IS NOT NULL)""",
+    'adventures': """
+        ('category', r.category, '', 0::double precision, r.category IS NOT NULL)""",
+}
+
+
+def _stat_rows(tbl: str, source: str, sign: int) -> str:
+    return f"""
+        SELECT x.kind, x.key, x.subkey, {sign} AS refs, {sign} * x.value AS value
+        FROM {source} r
+        CROSS JOIN LATERAL (VALUES {STAT_ROWS[tbl]}
+        ) AS x(kind, key, subkey, value, applies)
+        WHERE x.applies"""
+
+
+# Writers fold the delta log into global_stats once every this many trigger batches
+COMPACT_EVERY = 500
+
+
+def _insert_deltas(rows: str, having: str = "") -> str:
+    return f"""
+    INSERT INTO global_stats_deltas (kind, key, subkey, refs, value)
+    SELECT kind, key, subkey, SUM(refs), SUM(value)
+    FROM ({rows}
+    ) d
+    GROUP BY kind, key, subkey{having};"""
+
+
+def upgrade() -> None:
+    # Writers only ever append to global_stats_deltas (one aggregated batch per statement),
+    # so they never wait on each other's counter rows. stats_compact() folds the log into
+    # global_stats, run by every COMPACT_EVERY-th batch (and POST /api/admin/stats/compact);
+    # readers only sum both through global_stats_current.
+    op.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS global_stats_deltas (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            subkey TEXT NOT NULL,
+            refs BIGINT NOT NULL,
+            value DOUBLE PRECISION NOT NULL
+        );
+
+        -- Counts delta batches; a sequence so writers never wait on each other for it
+        CREATE SEQUENCE IF NOT EXISTS global_stats_delta_batches;
+
+        CREATE OR REPLACE VIEW global_stats_current AS
+        SELECT kind, key, subkey, SUM(refs)::bigint AS refs, SUM(value) AS value
+        FROM (
+            SELECT kind, key, subkey, refs, value FROM global_stats
+            UNION ALL
+            SELECT kind, key, subkey, refs, value FROM global_stats_deltas
+        ) s
+        GROUP BY kind, key, subkey
+        HAVING SUM(refs) > 0;
+
+        CREATE OR REPLACE FUNCTION stats_compact() RETURNS void AS $$
+        BEGIN
+          -- One compactor at a time; the others just read base + log
+          IF NOT pg_try_advisory_xact_lock(hashtext('stats_compact')) THEN
+            RETURN;
+          END IF;
+          -- Only deltas committed before this statement are moved; later ones stay for next time
+          WITH moved AS (
+            DELETE FROM global_stats_deltas RETURNING kind, key, subkey, refs, value
+          )
+          INSERT INTO global_stats AS g (kind, key, subkey, refs, value)
+          SELECT kind, key, subkey, SUM(refs), SUM(value) FROM moved GROUP BY kind, key, subkey
+          ON CONFLICT (kind, key, subkey)
+          DO UPDATE SET refs = g.refs + EXCLUDED.refs, value = g.value + EXCLUDED.value;
+          DELETE FROM global_stats WHERE refs <= 0;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION stats_maybe_compact() RETURNS void AS $$
+        BEGIN
+          IF mod(nextval('global_stats_delta_batches'), {COMPACT_EVERY}) = 0 THEN
+            PERFORM stats_compact();
+          END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Merge overlapping trip date ranges (gaps-and-islands) and sum the covered nights
+        CREATE OR REPLACE FUNCTION stats_total_nights() RETURNS BIGINT AS $$
+          SELECT COALESCE(SUM(e - s), 0)
+          FROM (
+            SELECT MIN(s) AS s, MAX(e) AS e
+            FROM (
+              SELECT s, e, SUM(new_island) OVER (ORDER BY s, e ROWS UNBOUNDED PRECEDING) AS island
+              FROM (
+                SELECT start_date AS s, end_date AS e,
+                       CASE WHEN start_date <= MAX(end_date) OVER (ORDER BY start_date, end_date ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+                            THEN 0 ELSE 1 END AS new_island
+                FROM trips
+                WHERE start_date IS NOT NULL AND end_date IS NOT NULL AND end_date > start_date
+              ) flagged
+            ) numbered
+            GROUP BY island
+          ) islands
+        $$ LANGUAGE sql STABLE;
+        """
+    )
+
+    # Statement-level triggers with transition tables (which cannot have column lists):
+    # on UPDATE the old rows count -1 and the new rows +1, so unchanged counters cancel out
+    for tbl in STAT_ROWS:
+        changed = _stat_rows(tbl, 'new_rows', 1) + "\n        UNION ALL" + _stat_rows(tbl, 'old_rows', -1)
+        op.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION stats_sync_{tbl}() RETURNS trigger AS $$
+            BEGIN
+              IF TG_OP = 'INSERT' THEN
+                {_insert_deltas(_stat_rows(tbl, 'new_rows', 1))}
+              ELSIF TG_OP = 'DELETE' THEN
+                {_insert_deltas(_stat_rows(tbl, 'old_rows', -1))}
+              ELSE
+                {_insert_deltas(changed, " HAVING SUM(refs) <> 0 OR SUM(value) <> 0")}
+              END IF;
+              PERFORM stats_maybe_compact();
+              RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS trg_{tbl}_stats_insert ON {tbl};
+            CREATE TRIGGER trg_{tbl}_stats_insert
+              AFTER INSERT ON {tbl} REFERENCING NEW TABLE AS new_rows
+              FOR EACH STATEMENT EXECUTE FUNCTION stats_sync_{tbl}();
+            DROP TRIGGER IF EXISTS trg_{tbl}_stats_update ON {tbl};
+            CREATE TRIGGER trg_{tbl}_stats_update
+              AFTER UPDATE ON {tbl} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+              FOR EACH STATEMENT EXECUTE FUNCTION stats_sync_{tbl}();
+            DROP TRIGGER IF EXISTS trg_{tbl}_stats_delete ON {tbl};
+            CREATE TRIGGER trg_{tbl}_stats_delete
+              AFTER DELETE ON {tbl} REFERENCING OLD TABLE AS old_rows
+              FOR EACH STATEMENT EXECUTE FUNCTION stats_sync_{tbl}();
+            """
+        )
+
+    everything = "\n        UNION ALL".join(_stat_rows(tbl, tbl, 1) for tbl in STAT_ROWS)
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION stats_rebuild() RETURNS void AS $$
+        BEGIN
+          TRUNCATE global_stats, global_stats_deltas;
+          INSERT INTO global_stats (kind, key, subkey, refs, value)
+          SELECT kind, key, subkey, SUM(refs), SUM(value)
+          FROM ({everything}
+          ) d
+          GROUP BY kind, key, subkey;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+    op.execute("SELECT stats_rebuild()")
+
+
+def downgrade() -> None:
+    for tbl in STAT_ROWS:
+        for event in ('insert', 'update', 'delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS trg_{tbl}_stats_{event} ON {tbl}")
+        op.execute(f"DROP FUNCTION IF EXISTS stats_sync_{tbl}()")
+    op.execute("DROP FUNCTION IF EXISTS stats_rebuild()")
+    op.execute("DROP FUNCTION IF EXISTS stats_total_nights()")
+    op.execute("DROP FUNCTION IF EXISTS stats_maybe_compact()")
+    op.execute("DROP FUNCTION IF EXISTS stats_compact()")
+    op.execute("DROP SEQUENCE IF EXISTS global_stats_delta_batches")
+    op.execute("DROP VIEW IF EXISTS global_stats_current")
+    op.execute("DROP TABLE IF EXISTS global_stats_deltas")
+    op.execute("TRUNCATE global_stats")
@@ -0,0 +1,29 @@
+"""add covering indexes for per-trip ETag version lookups
+
+Revision ID: 20261018_0017
+Revises: 20261018_0016
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0017'
+down_revision = '20261018_0016'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('nodes', 'legs', 'stops')
+
+
+def upgrade() -> None:
+    # COUNT(*), MAX(updated_at), MAX(id) WHERE trip_id = ? as an index-only scan (routers/etag.py)
+    for tbl in TABLES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS idx_{tbl}_trip_version ON {tbl} (trip_id) INCLUDE (updated_at, id)")
+
+
+def downgrade() -> None:
+    for tbl in TABLES:
+        op.execute(f"DROP INDEX IF EXISTS idx_{tbl}_trip_version")
@@ -0,0 +1,47 @@
+"""add entity_daterange() and GiST indexes for date list matching
+
+Revision ID: 20261018_0018
+Revises: 20261018_0017
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0018'
+down_revision = '20261018_0017'
+branch_labels = None
+depends_on = None
+
+
+DATE_COLUMNS = {
+    'nodes': ('arrival_date', 'departure_date'),
+    'stops': ('start_date', 'end_date'),
+    'adventures': ('start_date', 'end_date'),
+}
+
+
+def upgrade() -> None:
+    # Inclusive range covering both dates; a single date is a one-day range, no dates is NULL
+    # (plain daterange() would treat a missing bound as unbounded and match every month)
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION entity_daterange(a DATE, b DATE) RETURNS daterange AS $$
+          SELECT CASE
+            WHEN a IS NULL AND b IS NULL THEN NULL
+            ELSE daterange(LEAST(a, b), GREATEST(a, b), '[]')
+          END
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+        """
+    )
+    for tbl, (start_col, end_col) in DATE_COLUMNS.items():
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{tbl}_daterange ON {tbl} USING GIST (entity_daterange({start_col}, {end_col}))"
+        )
+
+
+def downgrade() -> None:
+    for tbl in DATE_COLUMNS:
+        op.execute(f"DROP INDEX IF EXISTS idx_{tbl}_daterange")
+    op.execute("DROP FUNCTION IF EXISTS entity_daterange(DATE, DATE)")
@@ -0,0 +1,119 @@
+"""add materialized list_matches with trigger-driven invalidation
+
+Revision ID: 20261018_0019
+Revises: 20261018_0018
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0019'
+down_revision = '20261018_0018'
+branch_labels = None
+depends_on = None
+
+
+# Columns that decide whether an entity matches a list item (routers/lists.py)
+ENTITY_TABLES = {
+    'nodes': 'name, osm_name, osm_id, osm_country, osm_state, arrival_date, departure_date, invisible',
+    'stops': 'name, osm_name, osm_id, osm_country, osm_state, start_date, end_date',
+    'adventures': 'name, osm_name, osm_id, start_date, end_date',
+}
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS list_matches (
+            list_id INTEGER NOT NULL REFERENCES lists(id) ON DELETE CASCADE,
+            item TEXT NOT NULL,
+            entity_type TEXT NOT NULL,  -- 'nodes' | 'stops' | 'adventures'
+            entity_id INTEGER NOT NULL,
+            PRIMARY KEY (list_id, item, entity_type, entity_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_list_matches_entity ON list_matches(entity_type, entity_id);
+
+        -- Kept apart from lists so marking a list fresh does not bump lists.updated_at
+        CREATE TABLE IF NOT EXISTS list_match_status (
+            list_id INTEGER PRIMARY KEY REFERENCES lists(id) ON DELETE CASCADE,
+            stale BOOLEAN NOT NULL DEFAULT TRUE,
+            -- Bumped on every items/match_type change; a rematch only clears `stale` if unchanged
+            items_version BIGINT NOT NULL DEFAULT 0,
+            match_error BOOLEAN NOT NULL DEFAULT FALSE,
+            matched_at TIMESTAMP
+        );
+
+        -- Entities changed since list_matches was last brought up to date
+        CREATE TABLE IF NOT EXISTS list_match_queue (
+            entity_type TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            PRIMARY KEY (entity_type, entity_id)
+        );
+        """
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION mark_list_matches_stale() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP = 'INSERT' OR NEW.items IS DISTINCT FROM OLD.items OR NEW.match_type IS DISTINCT FROM OLD.match_type THEN
+            INSERT INTO list_match_status (list_id, stale) VALUES (NEW.id, TRUE)
+            ON CONFLICT (list_id) DO UPDATE
+              SET stale = TRUE, items_version = list_match_status.items_version + 1;
+            PERFORM pg_notify('list_match', '');
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_lists_mark_matches_stale ON lists;
+        CREATE TRIGGER trg_lists_mark_matches_stale
+          AFTER INSERT OR UPDATE OF items, match_type ON lists
+          FOR EACH ROW EXECUTE FUNCTION mark_list_matches_stale();
+
+        CREATE OR REPLACE FUNCTION queue_list_match() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            INSERT INTO list_match_queue (entity_type, entity_id) VALUES (TG_TABLE_NAME, OLD.id) ON CONFLICT DO NOTHING;
+          ELSE
+            INSERT INTO list_match_queue (entity_type, entity_id) VALUES (TG_TABLE_NAME, NEW.id) ON CONFLICT DO NOTHING;
+          END IF;
+          -- Wakes the list matcher in the API process once the transaction commits
+          PERFORM pg_notify('list_match', '');
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+    for tbl, cols in ENTITY_TABLES.items():
+        op.execute(
+            f"""
+            DROP TRIGGER IF EXISTS trg_{tbl}_queue_list_match ON {tbl};
+            CREATE TRIGGER trg_{tbl}_queue_list_match
+              AFTER INSERT OR UPDATE OF {cols} OR DELETE ON {tbl}
+              FOR EACH ROW EXECUTE FUNCTION queue_list_match();
+            """
+        )
+
+    # Existing lists are matched by the list matcher when the API starts
+    op.execute(
+        """
+        INSERT INTO list_match_status (list_id, stale)
+        SELECT id, TRUE FROM lists
+        ON CONFLICT (list_id) DO UPDATE SET stale = TRUE;
+        """
+    )
+
+
+def downgrade() -> None:
+    for tbl in ENTITY_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{tbl}_queue_list_match ON {tbl}")
+    op.execute("DROP FUNCTION IF EXISTS queue_list_match()")
+    op.execute("DROP TRIGGER IF EXISTS trg_lists_mark_matches_stale ON lists")
+    op.execute("DROP FUNCTION IF EXISTS mark_list_matches_stale()")
+    op.execute("DROP TABLE IF EXISTS list_match_queue")
+    op.execute("DROP TABLE IF EXISTS list_match_status")
+    op.execute("DROP TABLE IF EXISTS list_matches")
@@ -0,0 +1,24 @@
+"""add photos.variants for resized derivatives
+
+Revision ID: 20261018_0020
+Revises: 20261018_0019
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0020'
+down_revision = '20261018_0019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # {"thumb": {"width", "height", "webp", "avif"?}, "medium": {...}, "large": {...}}; NULL until generated
+    op.execute("ALTER TABLE photos ADD COLUMN IF NOT EXISTS variants JSONB")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE photos DROP COLUMN IF EXISTS variants")
@@ -0,0 +1,65 @@
+"""add content-addressed photo_blobs with trigger-maintained refcounts
+
+Revision ID: 20261018_0021
+Revises: 20261018_0020
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0021'
+down_revision = '20261018_0020'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        -- One row per stored file (/uploads/<sha256>.<ext>), shared by every photo with the same content
+        CREATE TABLE IF NOT EXISTS photo_blobs (
+            content_hash TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0 CHECK (refcount >= 0),
+            created_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_photo_blobs_unreferenced ON photo_blobs(content_hash) WHERE refcount = 0;
+
+        -- NULL for files uploaded before content addressing (uuid names, unlinked directly)
+        ALTER TABLE photos ADD COLUMN IF NOT EXISTS content_hash TEXT REFERENCES photo_blobs(content_hash);
+        CREATE INDEX IF NOT EXISTS idx_photos_content_hash ON photos(content_hash);
+        """
+    )
+
+    # A trigger rather than the API keeps counts right when photos go away through
+    # ON DELETE CASCADE from trips, legs, nodes, stops or adventures
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION photo_blobs_refcount() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.content_hash IS NOT NULL THEN
+            UPDATE photo_blobs SET refcount = refcount - 1 WHERE content_hash = OLD.content_hash;
+          END IF;
+          IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.content_hash IS NOT NULL THEN
+            UPDATE photo_blobs SET refcount = refcount + 1 WHERE content_hash = NEW.content_hash;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_photos_blob_refcount ON photos;
+        CREATE TRIGGER trg_photos_blob_refcount
+          AFTER INSERT OR UPDATE OF content_hash OR DELETE ON photos
+          FOR EACH ROW EXECUTE FUNCTION photo_blobs_refcount();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_photos_blob_refcount ON photos")
+    op.execute("DROP FUNCTION IF EXISTS photo_blobs_refcount()")
+    op.execute("DROP INDEX IF EXISTS idx_photos_content_hash")
+    op.execute("ALTER TABLE photos DROP COLUMN IF EXISTS content_hash")
+    op.execute("DROP TABLE IF EXISTS photo_blobs")
@@ -0,0 +1,60 @@
+"""add EXIF capture time and location to photos
+
+Revision ID: 20261018_0022
+Revises: 20261018_0021
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0022'
+down_revision = '20261018_0021'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Filled from EXIF by the background worker after upload (routers/images.py)
+    op.execute(
+        """
+        ALTER TABLE photos ADD COLUMN IF NOT EXISTS taken_at TIMESTAMP;
+        ALTER TABLE photos ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+        ALTER TABLE photos ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+        ALTER TABLE photos ADD COLUMN IF NOT EXISTS geog geography(Point,4326);
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION set_photos_geog() RETURNS trigger AS $$
+        BEGIN
+          IF NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL THEN
+            NEW.geog := ST_SetSRID(ST_MakePoint(NEW.longitude, NEW.latitude), 4326)::geography;
+          ELSE
+            NEW.geog := NULL;
+          END IF;
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_photos_set_geog ON photos;
+        CREATE TRIGGER trg_photos_set_geog
+          BEFORE INSERT OR UPDATE OF latitude, longitude ON photos
+          FOR EACH ROW EXECUTE FUNCTION set_photos_geog();
+        """
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS idx_photos_geog ON photos USING GIST (geog)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_photos_taken_at ON photos(taken_at)")
+    # Date window lookups for leg suggestions
+    op.execute("CREATE INDEX IF NOT EXISTS idx_legs_date ON legs(date)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_legs_date")
+    op.execute("DROP INDEX IF EXISTS idx_photos_taken_at")
+    op.execute("DROP INDEX IF EXISTS idx_photos_geog")
+    op.execute("DROP TRIGGER IF EXISTS trg_photos_set_geog ON photos")
+    op.execute("DROP FUNCTION IF EXISTS set_photos_geog()")
+    for col in ('geog', 'longitude', 'latitude', 'taken_at'):
+        op.execute(f"ALTER TABLE photos DROP COLUMN IF EXISTS {col}")
@@ -0,0 +1,93 @@
+"""add legs.geog / legs.geom lines and planar GiST indexes for map viewport queries
+
+Revision ID: 20261018_0023
+Revises: 20261018_0022
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0023'
+down_revision = '20261018_0022'
+branch_labels = None
+depends_on = None
+
+
+# Point tables served by /api/map (adventures already have geog since 0009); legs use legs.geom
+MAP_TABLES = ['nodes', 'stops', 'adventures']
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE legs ADD COLUMN IF NOT EXISTS geog geography(LineString,4326)")
+    # Planar copy of the great-circle path for viewport queries and tiles. A plain
+    # geog::geometry cast draws a leg crossing the antimeridian (e.g. lon 139 to -118) as a
+    # segment spanning the other way around the world, so such legs are split at +-180.
+    op.execute("ALTER TABLE legs ADD COLUMN IF NOT EXISTS geom geometry(MultiLineString,4326)")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION leg_map_geom(g geography) RETURNS geometry AS $$
+          SELECT CASE
+            WHEN g IS NULL THEN NULL
+            WHEN ST_Intersects(g, 'SRID=4326;LINESTRING(180 -90, 180 0, 180 90)'::geography) THEN
+              -- Make the path continuous in [0, 360), cut it at 180 and move the eastern part back
+              ST_Multi(ST_CollectionExtract(ST_WrapX(ST_Split(
+                ST_ShiftLongitude(ST_Segmentize(g, 50000)::geometry),
+                'SRID=4326;LINESTRING(180 -90, 180 90)'::geometry
+              ), 180, -360), 2))
+            ELSE ST_Multi(ST_Segmentize(g, 50000)::geometry)
+          END
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION set_legs_geog() RETURNS trigger AS $$
+        BEGIN
+          IF NEW.start_latitude IS NOT NULL AND NEW.start_longitude IS NOT NULL
+             AND NEW.end_latitude IS NOT NULL AND NEW.end_longitude IS NOT NULL THEN
+            NEW.geog := ST_SetSRID(ST_MakeLine(
+              ST_MakePoint(NEW.start_longitude, NEW.start_latitude),
+              ST_MakePoint(NEW.end_longitude, NEW.end_latitude)
+            ), 4326)::geography;
+          ELSE
+            NEW.geog := NULL;
+          END IF;
+          NEW.geom := leg_map_geom(NEW.geog);
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_legs_set_geog ON legs;
+        CREATE TRIGGER trg_legs_set_geog
+          BEFORE INSERT OR UPDATE OF start_latitude, start_longitude, end_latitude, end_longitude ON legs
+          FOR EACH ROW EXECUTE FUNCTION set_legs_geog();
+        """
+    )
+    op.execute(
+        """
+        UPDATE legs
+        SET geog = ST_SetSRID(ST_MakeLine(
+              ST_MakePoint(start_longitude, start_latitude),
+              ST_MakePoint(end_longitude, end_latitude)
+            ), 4326)::geography
+        WHERE geog IS NULL
+          AND start_latitude IS NOT NULL AND start_longitude IS NOT NULL
+          AND end_latitude IS NOT NULL AND end_longitude IS NOT NULL
+        """
+    )
+    op.execute("UPDATE legs SET geom = leg_map_geom(geog) WHERE geog IS NOT NULL AND geom IS NULL")
+
+    # Viewports are lon/lat rectangles: compare in planar 4326 so box edges follow meridians and
+    # parallels (a geography box has great-circle edges and breaks past 180 degrees of width)
+    for tbl in MAP_TABLES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS idx_{tbl}_geom ON {tbl} USING GIST ((geog::geometry))")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_legs_geom ON legs USING GIST (geom)")
+
+
+def downgrade() -> None:
+    for tbl in MAP_TABLES + ['legs']:
+        op.execute(f"DROP INDEX IF EXISTS idx_{tbl}_geom")
+    op.execute("DROP TRIGGER IF EXISTS trg_legs_set_geog ON legs")
+    op.execute("DROP FUNCTION IF EXISTS set_legs_geog()")
+    op.execute("DROP FUNCTION IF EXISTS leg_map_geom(geography)")
+    op.execute("ALTER TABLE legs DROP COLUMN IF EXISTS geom")
+    op.execute("ALTER TABLE legs DROP COLUMN IF EXISTS geog")
@@ -0,0 +1,100 @@
+"""add map_geometry_changes log for vector tile cache invalidation
+
+Revision ID: 20261018_0024
+Revises: 20261018_0023
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0024'
+down_revision = '20261018_0023'
+branch_labels = None
+depends_on = None
+
+
+# Columns that change what a vector tile shows (routers/tiles.py)
+TILE_TABLES = {
+    'nodes': 'latitude, longitude, trip_id, name, invisible',
+    'stops': 'latitude, longitude, trip_id, node_id, name, category',
+    'adventures': 'latitude, longitude, name, category',
+    'legs': 'start_latitude, start_longitude, end_latitude, end_longitude, trip_id, type',
+    'car_details': 'polyline',
+}
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        -- Bounding box of every change to mapped geometry. xid decides which tiles may be stale:
+        -- a tile generated with snapshot xmin X has seen every change with xid < X.
+        CREATE TABLE IF NOT EXISTS map_geometry_changes (
+            id BIGSERIAL PRIMARY KEY,
+            xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint),
+            geom geometry(Geometry, 4326) NOT NULL,
+            changed_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_map_geometry_changes_geom ON map_geometry_changes USING GIST (geom);
+        CREATE INDEX IF NOT EXISTS idx_map_geometry_changes_changed_at ON map_geometry_changes(changed_at);
+        """
+    )
+
+    op.execute(
+        """
+        -- car_details.polyline is a Google encoded polyline (precision 5) written by the frontend;
+        -- malformed values decode to NULL instead of failing the caller
+        CREATE OR REPLACE FUNCTION decode_route_polyline(p TEXT) RETURNS geometry AS $$
+        BEGIN
+          IF p IS NULL OR p = '' THEN
+            RETURN NULL;
+          END IF;
+          RETURN ST_LineFromEncodedPolyline(p, 5);
+        EXCEPTION WHEN others THEN
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION map_geometry_changed() RETURNS trigger AS $$
+        DECLARE
+          old_geom geometry;
+          new_geom geometry;
+        BEGIN
+          IF TG_TABLE_NAME = 'car_details' THEN
+            IF TG_OP <> 'INSERT' THEN old_geom := decode_route_polyline(OLD.polyline); END IF;
+            IF TG_OP <> 'DELETE' THEN new_geom := decode_route_polyline(NEW.polyline); END IF;
+          ELSIF TG_TABLE_NAME = 'legs' THEN
+            IF TG_OP <> 'INSERT' THEN old_geom := OLD.geom; END IF;
+            IF TG_OP <> 'DELETE' THEN new_geom := NEW.geom; END IF;
+          ELSE
+            IF TG_OP <> 'INSERT' THEN old_geom := OLD.geog::geometry; END IF;
+            IF TG_OP <> 'DELETE' THEN new_geom := NEW.geog::geometry; END IF;
+          END IF;
+          -- One box per part, so a leg split at the antimeridian does not dirty the whole band
+          INSERT INTO map_geometry_changes (geom)
+          SELECT ST_SetSRID(ST_Envelope(d.geom), 4326)
+          FROM ST_Dump(ST_Collect(old_geom, new_geom)) d;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+    for tbl, cols in TILE_TABLES.items():
+        op.execute(
+            f"""
+            DROP TRIGGER IF EXISTS trg_{tbl}_map_geometry_changed ON {tbl};
+            CREATE TRIGGER trg_{tbl}_map_geometry_changed
+              AFTER INSERT OR UPDATE OF {cols} OR DELETE ON {tbl}
+              FOR EACH ROW EXECUTE FUNCTION map_geometry_changed();
+            """
+        )
+
+
+def downgrade() -> None:
+    for tbl in TILE_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{tbl}_map_geometry_changed ON {tbl}")
+    op.execute("DROP FUNCTION IF EXISTS map_geometry_changed()")
+    op.execute("DROP FUNCTION IF EXISTS decode_route_polyline(TEXT)")
+    op.execute("DROP TABLE IF EXISTS map_geometry_changes")
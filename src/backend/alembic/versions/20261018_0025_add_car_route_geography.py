@@ -0,0 +1,84 @@
+"""decode car_details.polyline into a route line with simplified versions
+
+Revision ID: 20261018_0025
+Revises: 20261018_0024
+Create Date: 2026-10-18
+
+"""
+from __future__ import annotations
+from alembic import op
+
+
+revision = '20261018_0025'
+down_revision = '20261018_0024'
+branch_labels = None
+depends_on = None
+
+
+# Simplified copies of the route (ST_SimplifyPreserveTopology tolerance in degrees);
+# routers/car_details.py picks one by zoom
+SIMPLIFIED_COLUMNS = {
+    'route_1km': 0.01,
+    'route_100m': 0.001,
+    'route_10m': 0.0001,
+}
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE car_details ADD COLUMN IF NOT EXISTS route geography(LineString,4326)")
+    for col in SIMPLIFIED_COLUMNS:
+        op.execute(f"ALTER TABLE car_details ADD COLUMN IF NOT EXISTS {col} geometry(LineString,4326)")
+
+    simplified = ",\n".join(
+        f"            {col} = ST_SimplifyPreserveTopology(decoded, {tol})"
+        for col, tol in SIMPLIFIED_COLUMNS.items()
+    )
+    assignments = "\n".join(
+        f"          NEW.{col} := ST_SimplifyPreserveTopology(line, {tol});"
+        for col, tol in SIMPLIFIED_COLUMNS.items()
+    )
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION set_car_details_route() RETURNS trigger AS $$
+        DECLARE
+          line geometry := decode_route_polyline(NEW.polyline);
+        BEGIN
+          IF line IS NULL OR GeometryType(line) <> 'LINESTRING' OR ST_NPoints(line) < 2 THEN
+            line := NULL;
+          END IF;
+          NEW.route := line::geography;
+{assignments}
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_car_details_set_route ON car_details;
+        CREATE TRIGGER trg_car_details_set_route
+          BEFORE INSERT OR UPDATE OF polyline ON car_details
+          FOR EACH ROW EXECUTE FUNCTION set_car_details_route();
+        """
+    )
+
+    op.execute(
+        f"""
+        UPDATE car_details cd
+        SET route = decoded::geography,
+{simplified}
+        FROM (
+            SELECT leg_id, decode_route_polyline(polyline) AS decoded FROM car_details
+        ) d
+        WHERE cd.leg_id = d.leg_id
+          AND d.decoded IS NOT NULL AND GeometryType(d.decoded) = 'LINESTRING' AND ST_NPoints(d.decoded) >= 2
+        """
+    )
+
+    # Planar, like the other map indexes (0023)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_car_details_geom ON car_details USING GIST ((route::geometry))")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_car_details_geom")
+    op.execute("DROP TRIGGER IF EXISTS trg_car_details_set_route ON car_details")
+    op.execute("DROP FUNCTION IF EXISTS set_car_details_route()")
+    for col in ['route', *SIMPLIFIED_COLUMNS]:
+        op.execute(f"ALTER TABLE car_details DROP COLUMN IF EXISTS {col}")
@@ -1,6 +1,5 @@
 # backend/main.py
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
 #from src.backend.app.routers import trips
@@ -15,6 +14,9 @@ from fastapi.middleware.cors import CORSMiddleware
 #from src.backend.app.routers import search
 #from src.backend.app.routers import adventures
 #from src.backend.app.routers import lists
+#from src.backend.app.routers import uploads
+#from src.backend.app.routers import maps
+#from src.backend.app.routers import tiles
 from routers import trips
 from routers import nodes
 from routers import legs
@@ -27,6 +29,13 @@ from routers import stop_categories
 from routers import search
 from routers import adventures
 from routers import lists
+from routers import uploads
+from routers import maps
+from routers import tiles
+from routers.connect import close_pool
+from routers.suggest_index import suggest_index
+from routers.lists import list_matcher
+from routers.images import shutdown_image_pool
 
 app = FastAPI()
 #app = FastAPI(redirect_slashes=False)
@@ -39,6 +48,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Include routers
@@ -54,6 +64,21 @@ app.include_router(stop_categories.router)
 app.include_router(search.router)
 app.include_router(adventures.router)
 app.include_router(lists.router)
+app.include_router(maps.router)
+app.include_router(tiles.router)
+# Uploaded photos, with immutable caching and Range support
+app.include_router(uploads.router)
 
-# Serve uploaded photos statically
-app.mount("/uploads", StaticFiles(directory="/workspaces/src/uploads"), name="uploads")
\ No newline at end of file
+# Load the search suggest index and start the listeners that keep it and list_matches current
+@app.on_event("startup")
+def start_suggest_index():
+    suggest_index.start()
+    list_matcher.start()
+
+# Release pooled database connections and image workers on shutdown
+@app.on_event("shutdown")
+def shutdown_db_pool():
+    suggest_index.stop()
+    list_matcher.stop()
+    shutdown_image_pool()
+    close_pool()
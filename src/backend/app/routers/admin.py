@@ -6,6 +6,12 @@ import os
 import subprocess
 import shutil
 
+#from src.backend.app.routers.connect import get_db, pool_stats
+from .connect import get_db, pool_stats
+from .tiles import clear_tile_cache
+from .distance import recompute_leg_miles
+from .suggest_index import CHANNEL as SUGGEST_CHANNEL, RELOAD_ALL
+
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 BACKUP_DIR = Path(os.getenv("BACKUP_DIR", "/workspaces/src/backups")).resolve()
@@ -46,6 +52,80 @@ def _run(cmd: list[str], env: dict | None = None) -> tuple[int, str]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/db/pool")
+def get_pool_stats():
+    # Connection pool metrics (in use, idle, waiting, checkout latency)
+    return pool_stats()
+
+def _rebuild_search_documents() -> int:
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT search_documents_rebuild() AS documents")
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    conn.close()
+    return row["documents"]
+
+@router.post("/search/rebuild")
+def rebuild_search_documents():
+    # Repopulate search_documents in bulk (e.g. after a restore)
+    return {"documents": _rebuild_search_documents()}
+
+def _rebuild_statistics():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT stats_rebuild()")
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def _reload_suggest_index():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT pg_notify(%s, %s)", (SUGGEST_CHANNEL, RELOAD_ALL))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+@router.post("/stats/rebuild")
+def rebuild_statistics():
+    # Recompute global_stats from scratch and clear the delta log (see /api/trips/data/statistics/check)
+    _rebuild_statistics()
+    return {"message": "Statistics rebuilt"}
+
+@router.post("/stats/compact")
+def compact_statistics():
+    # Fold the delta log into global_stats now rather than waiting for the writers to
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) AS n FROM global_stats_deltas")
+    pending = cur.fetchone()["n"]
+    cur.execute("SELECT stats_compact()")
+    conn.commit()
+    cur.close()
+    conn.close()
+    return {"deltas": pending}
+
+@router.post("/legs/miles/recompute")
+def recompute_miles(dry_run: bool = Query(False)):
+    # Recompute every leg's miles server-side in one pass; stats follow via the legs triggers
+    conn = get_db()
+    cur = conn.cursor()
+    result = recompute_leg_miles(cur, dry_run=dry_run)
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    cur.close()
+    conn.close()
+    return {**result, "dry_run": dry_run}
+
+@router.post("/tiles/clear")
+def clear_tiles():
+    # Drop cached vector tiles; they are rebuilt on the next request
+    return {"removed": clear_tile_cache()}
+
 @router.post("/db/backup")
 def create_backup():
     ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
@@ -125,4 +205,25 @@ def restore_database(
     if code != 0:
         raise HTTPException(status_code=500, detail=f"Restore failed\n{log}")
 
-    return {"restored_from": src.name, "log": log}
\ No newline at end of file
+    # pg_restore/psql load rows without going through the sync triggers; rebuild derived tables
+    try:
+        search_documents = _rebuild_search_documents()
+    except Exception as e:
+        search_documents = None
+        log = f"{log}\nSearch rebuild failed: {e}".strip()
+    try:
+        _rebuild_statistics()
+    except Exception as e:
+        log = f"{log}\nStatistics rebuild failed: {e}".strip()
+    # Every API process reloads its suggest index from the restored tables
+    try:
+        _reload_suggest_index()
+    except Exception as e:
+        log = f"{log}\nSuggest index reload failed: {e}".strip()
+    # Cached tiles describe the old data
+    try:
+        clear_tile_cache()
+    except Exception as e:
+        log = f"{log}\nTile cache clear failed: {e}".strip()
+
+    return {"restored_from": src.name, "search_documents": search_documents, "log": log}
\ No newline at end of file
@@ -1,11 +1,34 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
 #from src.backend.app.routers.connect import get_db
 from .connect import get_db
+from .distance import recompute_leg_miles
 
 router = APIRouter(prefix="/api/car_details", tags=["car_details"])
 
+# Simplified route columns (migration 20261018_0025) by the highest zoom they are used for;
+# above the last one the full polyline is returned
+ROUTE_RESOLUTIONS = ((5, "route_1km"), (9, "route_100m"), (13, "route_10m"))
+
+
+def route_column(zoom: int | None) -> str | None:
+	if zoom is None:
+		return None
+	for max_zoom, column in ROUTE_RESOLUTIONS:
+		if zoom <= max_zoom:
+			return column
+	return None
+
+
+def route_polyline_sql(zoom: int | None, alias: str = "cd") -> str:
+	"""Encoded polyline expression at the resolution for zoom (the stored polyline if none applies)."""
+	column = route_column(zoom)
+	if column is None:
+		return f"{alias}.polyline"
+	# Routes that failed to decode have no simplified copy; fall back to what was stored
+	return f"COALESCE(ST_AsEncodedPolyline({alias}.{column}, 5), {alias}.polyline)"
+
 
 class CarDetails(BaseModel):
 	leg_id: int
@@ -19,14 +42,15 @@ class CarDetailsUpdate(BaseModel):
 
 
 @router.get("/{leg_id}")
-def get_car_details(leg_id: int):
+def get_car_details(leg_id: int, zoom: int | None = Query(None, ge=0, le=22)):
+	# zoom: map zoom the route is drawn at; lower zooms get a simplified (smaller) polyline
 	conn = get_db()
 	cur = conn.cursor()
 	cur.execute(
-		"""
-		SELECT leg_id, driving_time_seconds, polyline
-		FROM car_details
-		WHERE leg_id = %s
+		f"""
+		SELECT cd.leg_id, cd.driving_time_seconds, {route_polyline_sql(zoom)} AS polyline
+		FROM car_details cd
+		WHERE cd.leg_id = %s
 		""",
 		(leg_id,),
 	)
@@ -61,6 +85,8 @@ def create_car_details(details: CarDetails):
 		(details.leg_id, details.driving_time_seconds, details.polyline),
 	)
 	row = cur.fetchone()
+	# Car/bus legs take their miles from the route length
+	recompute_leg_miles(cur, [row["leg_id"]])
 	conn.commit()
 	cur.close()
 	conn.close()
@@ -83,6 +109,8 @@ def update_car_details(leg_id: int, update: CarDetailsUpdate):
 	cur = conn.cursor()
 	cur.execute(f"UPDATE car_details SET {set_clauses} WHERE leg_id = %s RETURNING leg_id", params)
 	row = cur.fetchone()
+	if row:
+		recompute_leg_miles(cur, [leg_id])
 	conn.commit()
 	cur.close()
 	conn.close()
@@ -99,6 +127,9 @@ def delete_car_details(leg_id: int):
 	cur = conn.cursor()
 	cur.execute("DELETE FROM car_details WHERE leg_id = %s RETURNING leg_id", (leg_id,))
 	row = cur.fetchone()
+	if row:
+		# Without a route the leg falls back to its stored or great-circle miles
+		recompute_leg_miles(cur, [leg_id])
 	conn.commit()
 	cur.close()
 	conn.close()
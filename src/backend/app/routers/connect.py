@@ -3,17 +3,278 @@
 
 # app/database.py
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import RealDictCursor
+from starlette.concurrency import run_in_threadpool
+
+# Pool sizing / behaviour (overridable via env)
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))  # connections opened up front
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))  # open connections (in use + idle) never exceed this
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))  # ping connections idle longer than this
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))  # seconds for a new connection to be established
+
+
+def _connect_kwargs():
+    return {
+        "host": os.getenv("DB_HOST", "172.17.0.1"),
+        "database": os.getenv("DB_NAME", "travel_database"),
+        "user": os.getenv("DB_USER", "user"),
+        "password": os.getenv("DB_PASS", "password"),
+        "connect_timeout": CONNECT_TIMEOUT,
+        "cursor_factory": RealDictCursor,
+    }
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Process-wide pool of psycopg2 connections.
+
+    A semaphore caps checked-out connections at `maxconn` (callers block up to
+    `timeout` seconds for a free one), and every returned connection is kept in an
+    idle stack for reuse, so a burst of concurrent requests reconnects at most once
+    per slot. Connections that sat idle are pinged before being handed out, and
+    simple counters feed the admin metrics endpoint.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, healthcheck_idle: float):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        # (connection, last returned at); most recently used on the right
+        self._idle: deque = deque()
+        self._closed = False
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.failed_healthchecks = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+        now = time.monotonic()
+        for _ in range(min(minconn, maxconn)):
+            self._idle.append((psycopg2.connect(**_connect_kwargs()), now))
+
+    def _healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _acquire(self):
+        # Idle connections first; there are at most maxconn of them, so this ends with a
+        # fresh connection, which raises OperationalError when the database is down
+        for _ in range(self.maxconn + 1):
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return psycopg2.connect(**_connect_kwargs())
+            conn, last_used = entry
+            if self._healthy(conn, last_used):
+                return conn
+            with self._lock:
+                self.failed_healthchecks += 1
+            self._discard(conn)
+        raise psycopg2.OperationalError("No healthy database connection available")
+
+    def getconn(self):
+        started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection")
+
+        try:
+            conn = self._acquire()
+        except Exception:
+            self._slots.release()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.checkout_time_total += elapsed
+            self.checkout_time_max = max(self.checkout_time_max, elapsed)
+        return conn
+
+    def putconn(self, conn):
+        try:
+            keep = not conn.closed and not self._closed
+            if keep and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                # Roll back whatever the handler left open; a connection in an unknown state is dropped
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    keep = False
+            if keep:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg = (self.checkout_time_total / self.checkouts) if self.checkouts else 0.0
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "failed_healthchecks": self.failed_healthchecks,
+                "checkout_latency_avg_ms": round(avg * 1000, 3),
+                "checkout_latency_max_ms": round(self.checkout_time_max * 1000, 3),
+            }
+
+
+class PooledConnection:
+    """Proxy returned by get_db(): behaves like the underlying connection, but
+    close() hands it back to the pool instead of tearing it down."""
+
+    def __init__(self, pool: ConnectionPool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self):
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.putconn(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Safety net for handlers that raise before calling close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+_pool_pid: int | None = None
+
+
+def get_pool() -> ConnectionPool:
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # Never share sockets across a fork (e.g. uvicorn --workers)
+                _pool = ConnectionPool(POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_TIMEOUT, POOL_HEALTHCHECK_IDLE)
+                _pool_pid = pid
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
 
 def get_db():
-    #print("Connecting to the database...")
-    conn = psycopg2.connect(
-        host=os.getenv("DB_HOST", "172.17.0.1"),
-        database=os.getenv("DB_NAME", "travel_database"),
-        user=os.getenv("DB_USER", "user"),
-        password=os.getenv("DB_PASS", "password"),
-        cursor_factory=RealDictCursor
-    )
-    #print("Returning database connection", conn)
-    return conn
+    # Check a connection out of the pool; conn.close() returns it
+    pool = get_pool()
+    return PooledConnection(pool, pool.getconn())
+
+
+@contextmanager
+def db_cursor(commit: bool = False):
+    """Context manager yielding a cursor on a pooled connection."""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        yield cur
+        if commit:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def db_connection():
+    """FastAPI dependency: `conn = Depends(db_connection)`."""
+    conn = get_db()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+async def run_db(fn, *args, commit: bool = False, **kwargs):
+    """Async entry point for `async def` routes: runs fn(cur, *args, **kwargs) on a
+    pooled connection in a worker thread so the event loop never blocks on psycopg2."""
+    def _call():
+        with db_cursor(commit=commit) as cur:
+            return fn(cur, *args, **kwargs)
+    return await run_in_threadpool(_call)
@@ -0,0 +1,84 @@
+## Leg distances computed by the backend
+#
+# Flights get the great-circle (haversine) distance between their endpoints. Car and bus
+# legs with a stored route (car_details.route) get the route's length. Other legs keep the
+# miles the client sent, or the great-circle distance when none was sent.
+#
+# recompute_leg_miles() handles one leg after a write as well as the whole table for the
+# admin backfill: one query, NumPy over all rows, one execute_values UPDATE.
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+# Mean earth radius, the same sphere PostGIS uses for ST_Length(geography, false)
+EARTH_RADIUS_MILES = 3958.7613
+METERS_PER_MILE = 1609.344
+ROAD_TYPES = {"car", "bus"}
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance in miles; works elementwise on NumPy arrays (NaN in, NaN out)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _column(rows, key):
+    return np.array([np.nan if r[key] is None else r[key] for r in rows], dtype=float)
+
+
+def compute_leg_miles(rows) -> np.ndarray:
+    """Miles for each row of (type, miles, start/end lat/lon, route_miles); NaN when unknown."""
+    great_circle = haversine_miles(
+        _column(rows, "start_latitude"), _column(rows, "start_longitude"),
+        _column(rows, "end_latitude"), _column(rows, "end_longitude"),
+    )
+    stored = _column(rows, "miles")
+    route = _column(rows, "route_miles")
+    types = np.array([r["type"] for r in rows], dtype=object)
+    is_flight = types == "flight"
+    is_road = np.isin(types, list(ROAD_TYPES))
+
+    miles = np.where(np.isnan(stored), great_circle, stored)
+    miles = np.where(is_road & ~np.isnan(route), route, miles)
+    # Flights without coordinates keep what they had
+    miles = np.where(is_flight & ~np.isnan(great_circle), great_circle, miles)
+    return np.round(miles, 1)
+
+
+def recompute_leg_miles(cur, leg_ids=None, dry_run=False) -> dict:
+    """Recompute legs.miles for leg_ids (all legs when None) and write the ones that changed."""
+    cur.execute(
+        """
+        SELECT l.id, l.type, l.miles,
+               l.start_latitude, l.start_longitude, l.end_latitude, l.end_longitude,
+               ST_Length(cd.route, false) / %(meters_per_mile)s AS route_miles
+        FROM legs l
+        LEFT JOIN car_details cd ON cd.leg_id = l.id
+        WHERE %(all)s OR l.id = ANY(%(ids)s)
+        """,
+        {"meters_per_mile": METERS_PER_MILE, "all": leg_ids is None, "ids": list(leg_ids or [])},
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return {"legs": 0, "updated": 0, "total_miles_before": 0, "total_miles_after": 0}
+
+    new_miles = compute_leg_miles(rows)
+    old_miles = _column(rows, "miles")
+    changed = ~np.isnan(new_miles) & (np.isnan(old_miles) | (np.abs(new_miles - old_miles) >= 0.05))
+    updates = [(rows[i]["id"], float(new_miles[i])) for i in np.flatnonzero(changed)]
+
+    if updates and not dry_run:
+        execute_values(
+            cur,
+            "UPDATE legs SET miles = v.miles FROM (VALUES %s) AS v(id, miles) WHERE legs.id = v.id",
+            updates,
+            template="(%s, %s::double precision)",
+            page_size=1000,
+        )
+    return {
+        "legs": len(rows),
+        "updated": len(updates),
+        "total_miles_before": round(float(np.nansum(old_miles)), 1),
+        "total_miles_after": round(float(np.nansum(np.where(changed, new_miles, old_miles))), 1),
+    }
@@ -0,0 +1,55 @@
+## Conditional GET helpers shared by the list endpoints
+#
+# A resource's version is (row count, max(updated_at), max(id)) over the rows it returns:
+# updates bump updated_at via the set_updated_at() triggers, inserts raise max(id) and
+# deletes change the count. That is one index-backed aggregate, so a matching
+# If-None-Match is answered with 304 before any rows are fetched or serialized.
+#
+# table_etag() opens a REPEATABLE READ transaction, so the caller's body query that
+# follows on the same connection reads the snapshot the ETag was computed from.
+
+import hashlib
+
+from fastapi import Request, Response
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Browsers revalidate on every use, so edits show up immediately
+CACHE_CONTROL = "no-cache"
+
+
+def table_etag(cur, table: str, where: str = "", params: tuple = ()) -> str:
+    # Only possible as the transaction's first statement; later callers keep their own isolation
+    if cur.connection.get_transaction_status() == TRANSACTION_STATUS_IDLE:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+    cur.execute(
+        f"SELECT COUNT(*) AS n, MAX(updated_at) AS ts, MAX(id) AS max_id FROM {table} {f'WHERE {where}' if where else ''}",
+        params,
+    )
+    row = cur.fetchone()
+    return make_etag(table, where, params, row["n"], row["ts"], row["max_id"])
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: ignore W/ prefixes
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def etag_response(content, etag: str) -> JSONResponse:
+    return JSONResponse(content=jsonable_encoder(content), headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
@@ -0,0 +1,186 @@
+## Resized derivatives (thumb/medium/large) and EXIF metadata for uploaded photos
+#
+# Resizing a 20MB original takes a few hundred ms of pure CPU, so it runs in a process
+# pool after the upload response has been sent. Each variant is written as WebP, plus
+# AVIF when Pillow was built with it, and the URLs are stored in photos.variants.
+# The same worker reads the EXIF capture time and GPS position into photos.taken_at,
+# latitude and longitude (geog follows via trg_photos_set_geog).
+
+import io
+import os
+import glob
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from PIL import Image, ImageOps, ExifTags
+from psycopg2.extras import Json
+
+#from src.backend.app.routers.connect import run_db
+from .connect import run_db
+
+# Longest edge in pixels; originals smaller than a variant are not upscaled
+VARIANT_SIZES = {"thumb": 320, "medium": 1024, "large": 2048}
+VARIANT_DIR = "variants"
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+logger = logging.getLogger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _avif_supported() -> bool:
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+
+def process_file(src_path: str, upload_dir: str, stem: str) -> tuple[dict, dict]:
+    """Runs in a worker process. Returns (variants, exif) for one stored original."""
+    with Image.open(src_path) as im:
+        exif = read_exif(im)
+        variants = render_variants(im, upload_dir, stem)
+    return variants, exif
+
+
+def render_variants(im: Image.Image, upload_dir: str, stem: str) -> dict:
+    """Returns {name: {"width", "height", "webp", "avif"?}}."""
+    out_dir = os.path.join(upload_dir, VARIANT_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    formats = [("webp", "WEBP", WEBP_QUALITY)]
+    if _avif_supported():
+        formats.append(("avif", "AVIF", AVIF_QUALITY))
+
+    variants = {}
+    im = ImageOps.exif_transpose(im)
+    if im.mode not in ("RGB", "RGBA"):
+        im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "PA") else "RGB")
+    prev_size, prev_name = None, None
+    for name, edge in sorted(VARIANT_SIZES.items(), key=lambda kv: kv[1]):
+        resized = im.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        # Same pixels as the previous size (small original): point at that file instead
+        if resized.size == prev_size:
+            variants[name] = dict(variants[prev_name])
+            continue
+        entry = {"width": resized.width, "height": resized.height}
+        for ext, fmt, quality in formats:
+            buf = io.BytesIO()
+            resized.save(buf, fmt, quality=quality)
+            data = buf.getvalue()
+            # Variants are served as immutable: a rebuild that changes the bytes gets a new URL
+            filename = f"{stem}_{name}_{hashlib.sha256(data).hexdigest()[:12]}.{ext}"
+            path = os.path.join(out_dir, filename)
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(data)
+            entry[ext] = f"/uploads/{VARIANT_DIR}/{filename}"
+        variants[name] = entry
+        prev_size, prev_name = resized.size, name
+    return variants
+
+
+def read_exif(im: Image.Image) -> dict:
+    """Capture time (camera local time, as written) and GPS position; missing values are None."""
+    exif = im.getexif()
+    sub = exif.get_ifd(ExifTags.IFD.Exif)
+    raw_time = sub.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime)
+    taken_at = None
+    if isinstance(raw_time, str):
+        try:
+            taken_at = datetime.strptime(raw_time.strip("\x00 "), "%Y:%m:%d %H:%M:%S").isoformat()
+        except ValueError:
+            pass
+
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    lat = _gps_degrees(gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef), 90)
+    lon = _gps_degrees(gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef), 180)
+    if lat is None or lon is None or (lat == 0 and lon == 0):  # 0,0 is what cameras write without a fix
+        lat = lon = None
+    return {"taken_at": taken_at, "latitude": lat, "longitude": lon}
+
+
+def _gps_degrees(dms, ref, limit):
+    try:
+        degrees = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    except (TypeError, IndexError, ValueError, ZeroDivisionError):
+        return None
+    if ref in ("S", "W"):
+        degrees = -degrees
+    return degrees if abs(degrees) <= limit else None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        workers = int(os.getenv("IMAGE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+        # spawn, not the default fork: forking a process that already runs threads (the
+        # listeners, the DB pool, the threadpool) can copy a held lock into the child and hang it
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _store_processed(cur, photo_id, variants, exif):
+    # Every photo sharing the stored file shares its variants and EXIF
+    cur.execute(
+        """
+        UPDATE photos SET
+            variants = %(variants)s,
+            taken_at = COALESCE(taken_at, %(taken_at)s),
+            latitude = COALESCE(latitude, %(latitude)s),
+            longitude = COALESCE(longitude, %(longitude)s)
+        WHERE id = %(id)s OR content_hash = (SELECT content_hash FROM photos WHERE id = %(id)s)
+        """,
+        {"variants": Json(variants), "id": photo_id, **exif},
+    )
+
+
+async def process_photo(photo_id: int, src_path: str, upload_dir: str):
+    """Background task: resize and read EXIF in the process pool, then record both on the photo row."""
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    loop = asyncio.get_running_loop()
+    try:
+        variants, exif = await loop.run_in_executor(_get_pool(), process_file, src_path, upload_dir, stem)
+    except Exception:
+        # Undecodable image: the original is still served, listings fall back to it
+        logger.exception("Processing failed for photo %s", photo_id)
+        return
+    await run_db(_store_processed, photo_id, variants, exif, commit=True)
+    await loop.run_in_executor(None, _remove_stale_variants, stem, upload_dir, variants)
+
+
+def _remove_stale_variants(stem: str, upload_dir: str, variants: dict):
+    # Files of an earlier build that the stored variants no longer point at
+    keep = {os.path.basename(url) for entry in variants.values() for key, url in entry.items() if key not in ("width", "height")}
+    for path in variant_files(stem, upload_dir):
+        if os.path.basename(path) not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def variant_files(stem: str, upload_dir: str) -> list[str]:
+    """Variant files on disk for an original named <stem>.<ext> (for cleanup on delete)."""
+    return glob.glob(os.path.join(upload_dir, VARIANT_DIR, f"{glob.escape(stem)}_*"))
+
+
+def srcset(variants: dict | None, fmt: str = "webp") -> str | None:
+    """`<url> <width>w` pairs for an <img srcset> attribute, smallest first."""
+    if not variants:
+        return None
+    seen = {}
+    for entry in variants.values():
+        if fmt in entry:
+            seen[entry[fmt]] = entry["width"]
+    return ", ".join(f"{url} {w}w" for url, w in sorted(seen.items(), key=lambda kv: kv[1])) or None
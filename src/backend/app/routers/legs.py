@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
 #from src.backend.app.routers.connect import get_db
 from .connect import get_db
+from .etag import table_etag, etag_matches, not_modified, etag_response
+from .distance import recompute_leg_miles
 
 router = APIRouter(prefix="/api/legs", tags=["legs"])
 
@@ -50,10 +52,40 @@ class LegUpdate(BaseModel):
     end_osm_state: str | None = None
     miles: float | None = None
 
+
+def _leg_out(r) -> dict:
+    return {
+        "id": r["id"],
+        "trip_id": r["trip_id"],
+        "type": r["type"],
+        "notes": r["notes"] if r["notes"] else None,
+        "date": r["date"],
+        "start_node_id": r["start_node_id"],
+        "end_node_id": r["end_node_id"],
+        "start_latitude": r["start_latitude"],
+        "start_longitude": r["start_longitude"],
+        "end_latitude": r["end_latitude"],
+        "end_longitude": r["end_longitude"],
+        "start_osm_name": r["start_osm_name"],
+        "start_osm_id": r["start_osm_id"],
+        "start_osm_country": r["start_osm_country"],
+        "start_osm_state": r["start_osm_state"],
+        "end_osm_name": r["end_osm_name"],
+        "end_osm_id": r["end_osm_id"],
+        "end_osm_country": r["end_osm_country"],
+        "end_osm_state": r["end_osm_state"],
+        "miles": r["miles"]
+    }
+
 @router.get("/by_trip/{trip_id}")
-def get_legs_by_node(trip_id: int):
+def get_legs_by_node(trip_id: int, request: Request):
     conn = get_db()
     cur = conn.cursor()
+    etag = table_etag(cur, "legs", "trip_id = %s", (trip_id,))
+    if etag_matches(request, etag):
+        cur.close()
+        conn.close()
+        return not_modified(etag)
     cur.execute("""
         SELECT id, trip_id, type, notes, date, start_node_id, end_node_id, start_latitude, start_longitude, end_latitude, end_longitude, start_osm_name, start_osm_id, start_osm_country, start_osm_state, end_osm_name, end_osm_id, end_osm_country, end_osm_state, miles
         FROM legs
@@ -64,31 +96,7 @@ def get_legs_by_node(trip_id: int):
     cur.close()
     conn.close()
 
-    return [
-        {
-            "id": r["id"],
-            "trip_id": r["trip_id"],
-            "type": r["type"],
-            "notes": r["notes"] if r["notes"] else None,
-            "date": r["date"],
-            "start_node_id": r["start_node_id"],
-            "end_node_id": r["end_node_id"],
-            "start_latitude": r["start_latitude"],
-            "start_longitude": r["start_longitude"],
-            "end_latitude": r["end_latitude"],
-            "end_longitude": r["end_longitude"],
-            "start_osm_name": r["start_osm_name"],
-            "start_osm_id": r["start_osm_id"],
-            "start_osm_country": r["start_osm_country"],
-            "start_osm_state": r["start_osm_state"],
-            "end_osm_name": r["end_osm_name"],
-            "end_osm_id": r["end_osm_id"],
-            "end_osm_country": r["end_osm_country"],
-            "end_osm_state": r["end_osm_state"],
-            "miles": r["miles"]
-        }
-        for r in rows
-    ]
+    return etag_response([_leg_out(r) for r in rows], etag)
 
 # Create a new leg
 @router.post("/")
@@ -122,6 +130,8 @@ def create_leg(leg: Leg):
         leg.miles if leg.miles is not None else None
     ))
     new_row = cur.fetchone()
+    # Flights (and legs sent without miles) get the great-circle distance instead
+    recompute_leg_miles(cur, [new_row["id"]])
     conn.commit()
     cur.close()
     conn.close()
@@ -203,6 +213,8 @@ def update_leg(leg_id: int, update: LegUpdate):
     cur = conn.cursor()
     cur.execute(f"UPDATE legs SET {set_clauses} WHERE id = %s RETURNING id", params)
     row = cur.fetchone()
+    if row:
+        recompute_leg_miles(cur, [leg_id])
     conn.commit()
     cur.close()
     conn.close()
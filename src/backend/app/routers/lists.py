@@ -1,12 +1,18 @@
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import logging
 import re
-import datetime as dt
-import calendar as cal
+import select
+import threading
+import time
 
-#from src.backend.app.routers.connect import get_db
-from .connect import get_db
+import psycopg2
+
+#from src.backend.app.routers.connect import get_db, _connect_kwargs
+from .connect import get_db, _connect_kwargs
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/lists", tags=["lists"])
 
@@ -106,6 +112,7 @@ def create_list(payload: ListCreate):
         raise HTTPException(status_code=400, detail="Invalid match_type")
     raw_items = _parse_items(payload.items)
     canon = _canonicalize_items(payload.match_type, raw_items)
+    _validate_patterns(payload.match_type, canon)
 
     conn = get_db(); cur = conn.cursor()
     # Upsert-like behavior on name uniqueness? We'll just error if duplicate.
@@ -121,7 +128,10 @@ def create_list(payload: ListCreate):
     except Exception as e:  # broad except to rollback
         conn.rollback(); cur.close(); conn.close()
         raise HTTPException(status_code=400, detail=f"Insert failed: {e}")
-    row = cur.fetchone(); conn.commit(); cur.close(); conn.close()
+    row = cur.fetchone()
+    # Matched here, on the write, so reads never have to
+    _rematch_stale_lists(cur, [row['id']])
+    conn.commit(); cur.close(); conn.close()
     return row
 
 @router.get("/")
@@ -153,6 +163,7 @@ def update_list(list_id: int, payload: ListUpdate):
                 raise HTTPException(status_code=404, detail="List not found")
             mt = r['match_type']
         updates['items'] = _canonicalize_items(mt, raw_items)
+        _validate_patterns(mt, updates['items'])
 
     if not updates:
         raise HTTPException(status_code=400, detail="No updates supplied")
@@ -165,6 +176,8 @@ def update_list(list_id: int, payload: ListUpdate):
     if not row:
         conn.rollback(); cur.close(); conn.close()
         raise HTTPException(status_code=404, detail="List not found")
+    if 'items' in updates or 'match_type' in updates:
+        _rematch_stale_lists(cur, [list_id])
     conn.commit(); cur.close(); conn.close()
     return {"message": f"List {list_id} updated"}
 
@@ -226,27 +239,355 @@ def _fetch_list(list_id: int) -> Dict[str, Any]:
 ENTITY_SPECS = {
     'nodes': {
         'table': 'nodes',
+        'alias': 'n',
         'id_col': 'id',
         'name_cols': ['name', 'osm_name'],
         'osm_id_col': 'osm_id',
-        'date_cols': ['arrival_date', 'departure_date']
+        'date_cols': ['arrival_date', 'departure_date'],
+        'filter': '(n.invisible IS NOT TRUE)',
+        'has_trip': True,
     },
     'stops': {
         'table': 'stops',
+        'alias': 's',
         'id_col': 'id',
         'name_cols': ['name', 'osm_name'],
         'osm_id_col': 'osm_id',
-        'date_cols': ['start_date', 'end_date']
+        'date_cols': ['start_date', 'end_date'],
+        'filter': 'TRUE',
+        'has_trip': True,
     },
     'adventures': {
         'table': 'adventures',
+        'alias': 'a',
         'id_col': 'id',
         'name_cols': ['name', 'osm_name'],
         'osm_id_col': 'osm_id',
-        'date_cols': ['start_date', 'end_date']
+        'date_cols': ['start_date', 'end_date'],
+        'filter': 'TRUE',
+        'has_trip': False,  # adventures have no trip linkage
     }
 }
 
+# Country/state lists only look at nodes and stops
+_MATCH_ENTITY_TYPES = {
+    'osm_country': ('nodes', 'stops'),
+    'osm_state': ('nodes', 'stops'),
+}
+
+
+def _match_predicate(match_type: str, spec: Dict[str, Any]) -> str:
+    a = spec['alias']
+    if match_type in ('name', 'osm_name'):
+        # Items are case-insensitive regexes (user may supply advanced patterns)
+        return f"{a}.{match_type} ~* i.item"
+    if match_type == 'osm_id':
+        return f"{a}.{spec['osm_id_col']} = i.item"
+    if match_type in ('osm_country', 'osm_state'):
+        return f"LOWER({a}.{match_type}) = LOWER(i.item)"
+    # date: items are canonical YYYY-MM; entity dates overlapping the month (GiST index from 20261018_0018)
+    start_col, end_col = spec['date_cols']
+    return f"entity_daterange({a}.{start_col}, {a}.{end_col}) && i.month"
+
+
+# Date items are canonical YYYY-MM; anything else gets no automatic matches
+_DATE_ITEM = "'^20\\d{2}-(0[1-9]|1[0-2])$'"
+_ITEM_MONTH = """daterange(make_date(left(u.item, 4)::int, right(u.item, 2)::int, 1),
+                              (make_date(left(u.item, 4)::int, right(u.item, 2)::int, 1) + INTERVAL '1 month')::date)"""
+
+
+def _match_sql(match_type: str) -> str:
+    """(list_id, item, entity_type, entity_id) for every list of one match_type in %(list_ids)s.
+
+    Items of all those lists are unnested once and LATERAL-joined to each entity table, so
+    each item is evaluated (and a regex compiled) once. %(<entity_type>_ids)s optionally
+    restricts the pass to specific entities (NULL = all).
+    """
+    month = ""
+    where_item = ""
+    if match_type == 'date':
+        month = f", {_ITEM_MONTH} AS month"
+        where_item = f"AND u.item ~ {_DATE_ITEM}"
+    parts = []
+    for entity_type in _MATCH_ENTITY_TYPES.get(match_type, tuple(ENTITY_SPECS)):
+        spec = ENTITY_SPECS[entity_type]
+        a = spec['alias']
+        parts.append(f"""
+            SELECT i.list_id, i.item, '{entity_type}' AS entity_type, x.id AS entity_id
+            FROM items i
+            CROSS JOIN LATERAL (
+                SELECT {a}.{spec['id_col']} AS id
+                FROM {spec['table']} {a}
+                WHERE {spec['filter']} AND {_match_predicate(match_type, spec)}
+                  AND (%({entity_type}_ids)s::int[] IS NULL OR {a}.{spec['id_col']} = ANY(%({entity_type}_ids)s::int[]))
+            ) x
+        """)
+    return f"""
+        WITH items AS MATERIALIZED (
+            SELECT l.id AS list_id, u.item{month}
+            FROM lists l
+            CROSS JOIN LATERAL unnest(l.items) AS u(item)
+            WHERE l.id = ANY(%(list_ids)s) {where_item}
+        )
+        {" UNION ALL ".join(parts)}
+    """
+
+
+def _candidate_sql(match_type: str) -> Optional[str]:
+    """Lists in %(list_ids)s with an item equal to (or, for dates, overlapping) a value of the
+    entities in %(<entity_type>_ids)s. None for name/osm_name: a regex has to be run to know."""
+    if match_type in ('name', 'osm_name'):
+        return None
+    values = []
+    for entity_type in _MATCH_ENTITY_TYPES.get(match_type, tuple(ENTITY_SPECS)):
+        spec = ENTITY_SPECS[entity_type]
+        a = spec['alias']
+        if match_type == 'osm_id':
+            expr = f"{a}.{spec['osm_id_col']}"
+        elif match_type == 'date':
+            start_col, end_col = spec['date_cols']
+            expr = f"entity_daterange({a}.{start_col}, {a}.{end_col})"
+        else:
+            expr = f"LOWER({a}.{match_type})"
+        values.append(f"""
+            SELECT {expr} AS v FROM {spec['table']} {a}
+            WHERE {spec['filter']} AND {a}.{spec['id_col']} = ANY(COALESCE(%({entity_type}_ids)s::int[], '{{}}'))""")
+    if match_type == 'osm_id':
+        cond = "v.v = u.item"
+    elif match_type == 'date':
+        # CASE, so make_date never sees an item that is not YYYY-MM
+        cond = f"CASE WHEN u.item ~ {_DATE_ITEM} THEN {_ITEM_MONTH} && v.v ELSE FALSE END"
+    else:
+        cond = "v.v = LOWER(u.item)"
+    return f"""
+        WITH v AS MATERIALIZED ({" UNION ALL ".join(values)}
+        )
+        SELECT l.id FROM lists l
+        WHERE l.id = ANY(%(list_ids)s)
+          AND EXISTS (SELECT 1 FROM unnest(l.items) AS u(item) JOIN v ON {cond})
+    """
+
+
+def _entity_params(list_ids: List[int], entity_ids: Optional[Dict[str, List[int]]]) -> Dict[str, Any]:
+    params: Dict[str, Any] = {"list_ids": list_ids}
+    for entity_type in ENTITY_SPECS:
+        params[f"{entity_type}_ids"] = (entity_ids or {}).get(entity_type, []) if entity_ids is not None else None
+    return params
+
+
+def _insert_matches(cur, match_type: str, list_ids: List[int], entity_ids: Optional[Dict[str, List[int]]] = None):
+    cur.execute(
+        f"INSERT INTO list_matches (list_id, item, entity_type, entity_id) {_match_sql(match_type)} ON CONFLICT DO NOTHING",
+        _entity_params(list_ids, entity_ids),
+    )
+
+
+def _refresh_list_matches(cur) -> List[int]:
+    """Bring list_matches up to date; returns ids of lists whose items could not be matched.
+
+    Run by the list matcher after entity/list writes, not by the read endpoints. Caller commits.
+    """
+    _match_queued_entities(cur)
+    return _rematch_stale_lists(cur)
+
+
+def _match_queued_entities(cur):
+    # Entities queued by the nodes/stops/adventures triggers are rematched against the
+    # up-to-date lists that could contain them; stale lists get a full rematch anyway
+    cur.execute("DELETE FROM list_match_queue RETURNING entity_type, entity_id")
+    queued: Dict[str, List[int]] = {}
+    for r in cur.fetchall() or []:
+        queued.setdefault(r['entity_type'], []).append(r['entity_id'])
+    if not queued:
+        return
+
+    types = list(queued)
+    cur.execute(
+        """
+        DELETE FROM list_matches
+        WHERE (entity_type, entity_id) IN (SELECT * FROM unnest(%s::text[], %s::int[]))
+        """,
+        ([t for t in types for _ in queued[t]], [i for t in types for i in queued[t]]),
+    )
+    cur.execute("""
+        SELECT l.id, l.match_type
+        FROM lists l
+        JOIN list_match_status st ON st.list_id = l.id
+        WHERE NOT st.stale
+    """)
+    fresh_by_type: Dict[str, List[int]] = {}
+    for r in cur.fetchall() or []:
+        fresh_by_type.setdefault(r['match_type'], []).append(r['id'])
+
+    for match_type, ids in fresh_by_type.items():
+        if not any(t in queued for t in _MATCH_ENTITY_TYPES.get(match_type, tuple(ENTITY_SPECS))):
+            continue
+        cur.execute("SAVEPOINT list_match")
+        try:
+            candidates = _candidate_sql(match_type)
+            if candidates is not None:
+                cur.execute(candidates, _entity_params(ids, queued))
+                ids = [r['id'] for r in cur.fetchall() or []]
+            if ids:
+                _insert_matches(cur, match_type, ids, queued)
+            cur.execute("RELEASE SAVEPOINT list_match")
+        except Exception:
+            # e.g. an invalid pattern stored before validation existed: fall back to full per-list rematch
+            cur.execute("ROLLBACK TO SAVEPOINT list_match")
+            cur.execute("UPDATE list_match_status SET stale = TRUE WHERE list_id = ANY(%s)", (ids,))
+
+
+def _rematch_stale_lists(cur, list_ids: Optional[List[int]] = None) -> List[int]:
+    """Full rematch of stale lists (new list, or items/match_type changed), limited to list_ids
+    when given; returns the ids that failed. Lists of the same match_type share one pass; if
+    that fails, they are retried one at a time."""
+    cur.execute(
+        """
+        SELECT l.id, l.match_type, st.items_version
+        FROM lists l
+        JOIN list_match_status st ON st.list_id = l.id
+        WHERE st.stale AND (%(all)s OR l.id = ANY(%(ids)s))
+        """,
+        {"all": list_ids is None, "ids": list(list_ids or [])},
+    )
+    stale_by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for r in cur.fetchall() or []:
+        stale_by_type.setdefault(r['match_type'], []).append(r)
+
+    failed: List[int] = []
+    for match_type, rows in stale_by_type.items():
+        if not _rematch_lists(cur, match_type, rows):
+            continue
+        for r in rows:
+            if len(rows) == 1 or _rematch_lists(cur, match_type, [r]):
+                failed.append(r['id'])
+    if failed:
+        cur.execute("UPDATE list_match_status SET match_error = TRUE WHERE list_id = ANY(%s)", (failed,))
+    return failed
+
+
+def _rematch_lists(cur, match_type: str, rows: List[Dict[str, Any]]) -> bool:
+    # Full rematch of lists sharing a match_type; returns True if it failed (and was rolled back).
+    # `stale` is only cleared where items_version is still the one read before matching: a list
+    # edited meanwhile stays stale and is matched again with its new items.
+    ids = [r['id'] for r in rows]
+    cur.execute("SAVEPOINT list_match")
+    try:
+        cur.execute("DELETE FROM list_matches WHERE list_id = ANY(%s)", (ids,))
+        _insert_matches(cur, match_type, ids)
+        cur.execute(
+            """
+            UPDATE list_match_status st
+            SET stale = FALSE, match_error = FALSE, matched_at = now()
+            FROM unnest(%s::int[], %s::bigint[]) AS v(list_id, items_version)
+            WHERE st.list_id = v.list_id AND st.items_version = v.items_version
+            """,
+            (ids, [r['items_version'] for r in rows]),
+        )
+        cur.execute("RELEASE SAVEPOINT list_match")
+        return False
+    except Exception:
+        cur.execute("ROLLBACK TO SAVEPOINT list_match")
+        return True
+
+
+def _validate_patterns(match_type: str, items: List[str]):
+    # Reject items Postgres cannot compile as regexes, so stored lists always match cleanly
+    if match_type not in ('name', 'osm_name') or not items:
+        return
+    conn = get_db(); cur = conn.cursor()
+    try:
+        cur.execute("SELECT bool_and('' ~* p) AS ok FROM unnest(%s::text[]) AS p", (items,))
+    except Exception as e:
+        conn.rollback(); cur.close(); conn.close()
+        raise HTTPException(status_code=400, detail=f"Invalid pattern: {e}")
+    cur.close(); conn.close()
+
+
+def _match_rows(cur, list_id: int, match_type: str) -> List[Dict[str, Any]]:
+    # Read stored matches back with the entity columns each match_type has always returned
+    parts = []
+    for entity_type in _MATCH_ENTITY_TYPES.get(match_type, tuple(ENTITY_SPECS)):
+        spec = ENTITY_SPECS[entity_type]
+        a = spec['alias']
+        start_col, end_col = spec['date_cols']
+        if match_type in ('name', 'osm_name'):
+            extra = f"{a}.{match_type} AS target, "
+        elif match_type == 'osm_id':
+            extra = f"{a}.{spec['osm_id_col']} AS osm_id, "
+        elif match_type in ('osm_country', 'osm_state'):
+            extra = f"LOWER({a}.{match_type}) AS target, "
+        else:
+            extra = ""
+        trip = f"{a}.trip_id, t.name AS trip_name" if spec['has_trip'] else "NULL::int AS trip_id, NULL::text AS trip_name"
+        trip_join = f"LEFT JOIN trips t ON t.id = {a}.trip_id" if spec['has_trip'] else ""
+        parts.append(f"""
+            SELECT lm.item, '{entity_type}' AS entity_type, {a}.id, {a}.name, {a}.osm_name, {extra}
+                   {a}.{start_col} AS start_date, {a}.{end_col} AS end_date, {trip}
+            FROM list_matches lm
+            JOIN {spec['table']} {a} ON {a}.id = lm.entity_id
+            {trip_join}
+            WHERE lm.list_id = %(list_id)s AND lm.entity_type = '{entity_type}'
+        """)
+    cur.execute(" UNION ALL ".join(parts) + " ORDER BY 2, 3", {"list_id": list_id})
+    return cur.fetchall() or []
+
+
+@router.get("/summary")
+def get_lists_summary():
+    """Completion summary for every list in one pass.
+
+    Same per-item fields as the detail endpoint's `summary`, plus per-list totals.
+    Reads list_matches as the writes and the list matcher left it.
+    """
+    conn = get_db(); cur = conn.cursor()
+    cur.execute("""
+        SELECT l.id, l.name, l.match_type, l.manual_overrides, u.item, u.idx,
+               COALESCE(c.cnt, 0) AS auto_match_count, COALESCE(st.match_error, FALSE) AS match_error
+        FROM lists l
+        LEFT JOIN list_match_status st ON st.list_id = l.id
+        LEFT JOIN LATERAL unnest(l.items) WITH ORDINALITY AS u(item, idx) ON TRUE
+        LEFT JOIN (
+            SELECT list_id, item, COUNT(*) AS cnt
+            FROM list_matches
+            GROUP BY list_id, item
+        ) c ON c.list_id = l.id AND c.item = u.item
+        ORDER BY l.name ASC, l.id, u.idx
+    """)
+    rows = cur.fetchall() or []
+    cur.close(); conn.close()
+
+    out: List[Dict[str, Any]] = []
+    by_id: Dict[int, Dict[str, Any]] = {}
+    for r in rows:
+        entry = by_id.get(r['id'])
+        if entry is None:
+            entry = by_id[r['id']] = {
+                "id": r['id'],
+                "name": r['name'],
+                "match_type": r['match_type'],
+                "item_count": 0,
+                "matched_count": 0,
+                "match_error": r['match_error'],
+                "summary": [],
+            }
+            out.append(entry)
+        if r['item'] is None:
+            continue  # list without items
+        overrides = r['manual_overrides'] or []
+        auto_count = int(r['auto_match_count'])
+        matched = auto_count > 0 or r['item'] in overrides
+        entry["summary"].append({
+            "item": r['item'],
+            "auto_match_count": auto_count,
+            "matched": matched,
+            "override": r['item'] in overrides
+        })
+        entry["item_count"] += 1
+        entry["matched_count"] += int(matched)
+    return out
+
+
 @router.get("/{list_id}")
 def get_list_with_matches(list_id: int):
     lst = _fetch_list(list_id)
@@ -254,201 +595,29 @@ def get_list_with_matches(list_id: int):
     items: List[str] = lst['items'] or []
     overrides: List[str] = lst['manual_overrides'] or []
 
-    # Prepare canonical items for date matching (already canonicalized on storage)
     # Build results structure
     matches_summary = []  # each: { item, matched: bool, auto_match_count, override }
-    item_to_entities: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    item_to_entities: Dict[str, Dict[str, List[Dict[str, Any]]]] = {
+        it: {"nodes": [], "stops": [], "adventures": []} for it in items
+    }
 
+    # Matches are materialized in list_matches by the list writes and the list matcher
     conn = get_db(); cur = conn.cursor()
-
-    # We'll fetch all potential entities once per entity type depending on match_type to reduce round trips
-    def build_regex(pattern: str) -> str:
-        # simple escape of special chars except wildcards; treat pattern as literal segment inside case-insensitive search
-        # For name/osm_name we treat item as regex directly if it contains regex meta chars; allow user advanced patterns.
-        return pattern
-
-    if match_type in ('name','osm_name'):
-        # Build combined regex OR for efficiency; but we also want per-item matching, so we fetch wide result set then bucket.
-        regexes = [build_regex(it) for it in items]
-        # Compose broad filter: any of the patterns matches name/osm_name
-        if regexes:
-            # Build OR chains explicitly outside of the SQL literal so they aren't treated as text.
-            name_col = 'name' if match_type=='name' else 'osm_name'
-            node_clauses = [f"n.{name_col} ~* %s" for _ in regexes]
-            node_clause_str = " OR ".join(node_clauses)
-            sql = f"""
-                SELECT 'nodes' AS entity_type, n.id, n.name, n.osm_name, n.{name_col} AS target,
-                       n.arrival_date AS start_date, n.departure_date AS end_date,
-                       n.trip_id, t.name AS trip_name
-                FROM nodes n
-                LEFT JOIN trips t ON t.id = n.trip_id
-                WHERE (n.invisible IS NOT TRUE) AND ({node_clause_str})
-            """
-            params = regexes
-            cur.execute(sql, params); node_rows = cur.fetchall() or []
-
-            stop_clauses = [f"s.{name_col} ~* %s" for _ in regexes]
-            stop_clause_str = " OR ".join(stop_clauses)
-            sql = f"""
-                SELECT 'stops' AS entity_type, s.id, s.name, s.osm_name, s.{name_col} AS target,
-                       s.start_date AS start_date, s.end_date AS end_date,
-                       s.trip_id, t.name AS trip_name
-                FROM stops s
-                LEFT JOIN trips t ON t.id = s.trip_id
-                WHERE {stop_clause_str}
-            """
-            cur.execute(sql, params); stop_rows = cur.fetchall() or []
-
-            adv_clauses = [f"a.{name_col} ~* %s" for _ in regexes]
-            adv_clause_str = " OR ".join(adv_clauses)
-            sql = f"""
-                SELECT 'adventures' AS entity_type, a.id, a.name, a.osm_name, a.{name_col} AS target,
-                       a.start_date AS start_date, a.end_date AS end_date
-                FROM adventures a
-                WHERE {adv_clause_str}
-            """
-            cur.execute(sql, params); adv_rows = cur.fetchall() or []
-        else:
-            node_rows = stop_rows = adv_rows = []
-        # Bucket per item
-        for it in items:
-            pattern = re.compile(it, re.IGNORECASE)
-            item_to_entities[it] = {"nodes": [], "stops": [], "adventures": []}
-            for r in node_rows:
-                if pattern.search(r['target'] or ''):
-                    item_to_entities[it]['nodes'].append(r)
-            for r in stop_rows:
-                if pattern.search(r['target'] or ''):
-                    item_to_entities[it]['stops'].append(r)
-            for r in adv_rows:
-                if pattern.search(r['target'] or ''):
-                    item_to_entities[it]['adventures'].append(r)
-
-    elif match_type == 'osm_id':
-        # direct equality vs any OSM id field
-        if items:
-            cur.execute("""
-                SELECT 'nodes' AS entity_type, n.id, n.name, n.osm_name, n.osm_id,
-                       n.arrival_date AS start_date, n.departure_date AS end_date,
-                       n.trip_id, t.name AS trip_name
-                FROM nodes n
-                LEFT JOIN trips t ON t.id = n.trip_id
-                WHERE (n.invisible IS NOT TRUE) AND n.osm_id = ANY(%s)
-            """, (items,))
-            node_rows = cur.fetchall() or []
-            cur.execute("""
-                SELECT 'stops' AS entity_type, s.id, s.name, s.osm_name, s.osm_id,
-                       s.start_date, s.end_date,
-                       s.trip_id, t.name AS trip_name
-                FROM stops s
-                LEFT JOIN trips t ON t.id = s.trip_id
-                WHERE s.osm_id = ANY(%s)
-            """, (items,))
-            stop_rows = cur.fetchall() or []
-            cur.execute("""
-                SELECT 'adventures' AS entity_type, a.id, a.name, a.osm_name, a.osm_id,
-                       a.start_date, a.end_date
-                FROM adventures a
-                WHERE a.osm_id = ANY(%s)
-            """, (items,))
-            adv_rows = cur.fetchall() or []
-        else:
-            node_rows = stop_rows = adv_rows = []
-        for it in items:
-            item_to_entities[it] = {"nodes": [], "stops": [], "adventures": []}
-            for r in node_rows:
-                if r.get('osm_id') == it:
-                    item_to_entities[it]['nodes'].append(r)
-            for r in stop_rows:
-                if r.get('osm_id') == it:
-                    item_to_entities[it]['stops'].append(r)
-            for r in adv_rows:
-                if r.get('osm_id') == it:
-                    item_to_entities[it]['adventures'].append(r)
-
-    elif match_type == 'date':
-        # items are canonical YYYY-MM; match any entity whose any date col falls within that month
-        # We'll fetch by month boundaries.
-        for it in items:
-            item_to_entities[it] = {"nodes": [], "stops": [], "adventures": []}
-            if re.fullmatch(r"20\d{2}-\d{2}", it):
-                year, month = map(int, it.split('-'))
-                start = dt.date(year, month, 1)
-                end = dt.date(year, month, cal.monthrange(year, month)[1])
-                # Nodes
-                cur.execute("""
-                    SELECT 'nodes' AS entity_type, n.id, n.name, n.osm_name, n.arrival_date AS start_date, n.departure_date AS end_date,
-                           n.trip_id, t.name AS trip_name
-                    FROM nodes n
-                    LEFT JOIN trips t ON t.id = n.trip_id
-                    WHERE (n.invisible IS NOT TRUE) AND (
-                        (n.arrival_date BETWEEN %s AND %s) OR (n.departure_date BETWEEN %s AND %s)
-                        OR (n.arrival_date <= %s AND n.departure_date >= %s)
-                    )
-                """, (start, end, start, end, start, end))
-                item_to_entities[it]['nodes'] = cur.fetchall() or []
-                # Stops
-                cur.execute("""
-                    SELECT 'stops' AS entity_type, s.id, s.name, s.osm_name, s.start_date, s.end_date,
-                           s.trip_id, t.name AS trip_name
-                    FROM stops s
-                    LEFT JOIN trips t ON t.id = s.trip_id
-                    WHERE (
-                        (s.start_date BETWEEN %s AND %s) OR (s.end_date BETWEEN %s AND %s)
-                        OR (s.start_date <= %s AND s.end_date >= %s)
-                    )
-                """, (start, end, start, end, start, end))
-                item_to_entities[it]['stops'] = cur.fetchall() or []
-                # Adventures (no trip linkage)
-                cur.execute("""
-                    SELECT 'adventures' AS entity_type, a.id, a.name, a.osm_name, a.start_date, a.end_date
-                    FROM adventures a
-                    WHERE (
-                        (a.start_date BETWEEN %s AND %s) OR (a.end_date BETWEEN %s AND %s)
-                        OR (a.start_date <= %s AND a.end_date >= %s)
-                    )
-                """, (start, end, start, end, start, end))
-                item_to_entities[it]['adventures'] = cur.fetchall() or []
-            else:
-                # Non-parsable, skip automatic matches
-                pass
-
-    elif match_type in ('osm_country','osm_state'):
-        col = 'osm_country' if match_type == 'osm_country' else 'osm_state'
-        if items:
-            lowered = [it.lower() for it in items]
-            cur2 = get_db(); cur_local = cur2.cursor()  # separate cursor not needed but keeping pattern simple
-            # Use existing cursor instead of new connection actually
-            cur_local = cur  # reuse
-            # Nodes
-            cur_local.execute(f"""
-                SELECT 'nodes' AS entity_type, n.id, n.name, n.osm_name, n.arrival_date AS start_date, n.departure_date AS end_date,
-                       n.trip_id, t.name AS trip_name, LOWER(n.{col}) AS target
-                FROM nodes n
-                LEFT JOIN trips t ON t.id = n.trip_id
-                WHERE (n.invisible IS NOT TRUE) AND n.{col} IS NOT NULL AND LOWER(n.{col}) = ANY(%s)
-            """, (lowered,))
-            node_rows = cur_local.fetchall() or []
-            # Stops
-            cur_local.execute(f"""
-                SELECT 'stops' AS entity_type, s.id, s.name, s.osm_name, s.start_date, s.end_date,
-                       s.trip_id, t.name AS trip_name, LOWER(s.{col}) AS target
-                FROM stops s
-                LEFT JOIN trips t ON t.id = s.trip_id
-                WHERE s.{col} IS NOT NULL AND LOWER(s.{col}) = ANY(%s)
-            """, (lowered,))
-            stop_rows = cur_local.fetchall() or []
-        else:
-            node_rows = stop_rows = []
-        for it in items:
-            key = it.lower()
-            item_to_entities.setdefault(it, {"nodes": [], "stops": [], "adventures": []})
-            for r in node_rows:
-                if r.get('target') == key:
-                    item_to_entities[it]['nodes'].append(r)
-            for r in stop_rows:
-                if r.get('target') == key:
-                    item_to_entities[it]['stops'].append(r)
+    cur.execute("SELECT match_error FROM list_match_status WHERE list_id=%s", (list_id,))
+    status = cur.fetchone()
+    if status and status['match_error']:
+        cur.close(); conn.close()
+        raise HTTPException(status_code=400, detail="Invalid pattern in list items")
+
+    for r in _match_rows(cur, list_id, match_type):
+        r = dict(r)
+        it = r.pop('item')
+        if it not in item_to_entities:
+            continue
+        if r['entity_type'] == 'adventures':
+            # Adventures have no trip linkage
+            r.pop('trip_id'); r.pop('trip_name')
+        item_to_entities[it][r['entity_type']].append(r)
 
     cur.close(); conn.close()
 
@@ -477,3 +646,70 @@ def get_list_with_matches(list_id: int):
         "entities": item_to_entities
     }
     return response
+
+
+# ------------------------ List matcher --------------------------- #
+# Entity writes only queue the changed ids (migration 20261018_0019); a background thread
+# LISTENs on `list_match` and drains the queue, so neither the entity writes nor the list
+# reads pay for matching.
+
+MATCH_CHANNEL = "list_match"
+
+
+class ListMatcher:
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def run_once(self):
+        conn = get_db(); cur = conn.cursor()
+        try:
+            # One matcher at a time across API processes; the others' notifications are covered by its pass
+            cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('list_match')) AS locked")
+            if cur.fetchone()['locked']:
+                _refresh_list_matches(cur)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close(); conn.close()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="list-matcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _listen_forever(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**_connect_kwargs())
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {MATCH_CHANNEL}")
+                # Catch up after (re)connecting: notifications may have been missed
+                self.run_once()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.run_once()
+            except Exception:
+                logger.exception("List matcher failed; reconnecting")
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+list_matcher = ListMatcher()
@@ -0,0 +1,195 @@
+## Viewport queries for the map
+#
+# Everything here takes a bbox of west,south,east,north in degrees and only reads rows
+# whose geog intersects it, via the planar idx_<table>_geom indexes on (geog::geometry).
+# Legs are matched on legs.geom, their great-circle path split at the antimeridian.
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+import math
+
+#from src.backend.app.routers.connect import get_db
+from .connect import get_db
+
+router = APIRouter(prefix="/api/map", tags=["map"])
+
+# Below this zoom stops sit on top of their node and are left out of /features
+STOPS_MIN_ZOOM = 5
+
+
+def parse_bbox(bbox: str) -> list[tuple[float, float, float, float]]:
+    """Split a viewport into one or two (west, south, east, north) boxes within [-180, 180].
+
+    Longitudes may be outside [-180, 180] (a map panned across the antimeridian), or
+    west may be greater than east; a viewport crossing the antimeridian becomes two boxes.
+    """
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if not all(math.isfinite(v) for v in (west, south, east, north)) or south > north:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if east < west:
+        east += 360
+    south, north = max(south, -90.0), min(north, 90.0)
+    if east - west >= 360:
+        return [(-180.0, south, 180.0, north)]
+    # west into [-180, 180), east into (-180, 180], so a box ending on the antimeridian stays whole
+    west = (west + 180) % 360 - 180
+    east = (east - 180) % -360 + 180
+    if west <= east:
+        return [(west, south, east, north)]
+    return [(west, south, 180.0, north), (-180.0, south, east, north)]
+
+
+def bbox_filter(column: str, boxes) -> tuple[str, list]:
+    """SQL condition (and its params) for `column` (a geometry expression) intersecting any box."""
+    clause = " OR ".join(f"ST_Intersects({column}, ST_MakeEnvelope(%s, %s, %s, %s, 4326))" for _ in boxes)
+    return f"({clause})", [v for box in boxes for v in box]
+
+
+# Return the nodes, stops, legs and adventures inside a map viewport
+@router.get("/features")
+def get_map_features(
+    bbox: str = Query(..., description="west,south,east,north in degrees"),
+    zoom: int = Query(0, ge=0, le=22),
+    trip_id: Optional[int] = None,
+):
+    boxes = parse_bbox(bbox)
+    trip_filter, trip_params = ("AND trip_id = %s", [trip_id]) if trip_id is not None else ("", [])
+
+    conn = get_db()
+    cur = conn.cursor()
+
+    where, params = bbox_filter("geog::geometry", boxes)
+    cur.execute(
+        f"""
+        SELECT id, trip_id, name, latitude, longitude, arrival_date, departure_date, invisible
+        FROM nodes WHERE {where} {trip_filter} ORDER BY id
+        """,
+        params + trip_params,
+    )
+    nodes = cur.fetchall()
+
+    stops = []
+    if zoom >= STOPS_MIN_ZOOM:
+        cur.execute(
+            f"""
+            SELECT id, trip_id, node_id, leg_id, name, category, latitude, longitude, start_date, end_date
+            FROM stops WHERE {where} {trip_filter} ORDER BY id
+            """,
+            params + trip_params,
+        )
+        stops = cur.fetchall()
+
+    leg_where, leg_params = bbox_filter("geom", boxes)
+    cur.execute(
+        f"""
+        SELECT id, trip_id, type, date, start_node_id, end_node_id,
+               start_latitude, start_longitude, end_latitude, end_longitude, miles
+        FROM legs WHERE {leg_where} {trip_filter} ORDER BY id
+        """,
+        leg_params + trip_params,
+    )
+    legs = cur.fetchall()
+
+    # Adventures are not part of a trip
+    adventures = []
+    if trip_id is None:
+        cur.execute(
+            f"""
+            SELECT id, name, category, latitude, longitude, start_date, end_date
+            FROM adventures WHERE {where} ORDER BY id
+            """,
+            params,
+        )
+        adventures = cur.fetchall()
+
+    cur.close()
+    conn.close()
+    return {"nodes": nodes, "stops": stops, "legs": legs, "adventures": adventures}
+
+
+# Target cluster cell width in screen pixels (256px tiles)
+CLUSTER_CELL_PX = 60
+
+
+def cluster_cell_degrees(zoom: int) -> float:
+    return 360.0 / (2 ** zoom) * CLUSTER_CELL_PX / 256
+
+
+# Return node, stop and adventure markers in a viewport aggregated on a zoom-dependent grid
+@router.get("/clusters")
+def get_map_clusters(
+    bbox: str = Query(..., description="west,south,east,north in degrees"),
+    zoom: int = Query(..., ge=0, le=22),
+    trip_id: Optional[int] = None,
+):
+    """Grid clusters of the markers in a viewport.
+
+    Points are snapped with ST_SnapToGrid on a grid anchored at 0,0 whose cell is about
+    CLUSTER_CELL_PX wide at this zoom, so cells stay put while panning. Invisible nodes are
+    skipped. A cluster of one carries the point itself in `item`.
+    """
+    boxes = parse_bbox(bbox)
+    where, params = bbox_filter("geog::geometry", boxes)
+    trip_filter, trip_params = ("AND trip_id = %s", [trip_id]) if trip_id is not None else ("", [])
+    adventures = "" if trip_id is not None else f"""
+            UNION ALL
+            SELECT 'adventure', id, NULL, name, category, geog::geometry FROM adventures WHERE {where}"""
+
+    conn = get_db()
+    cur = conn.cursor()
+    # One row per (cell, kind, category); merged into clusters below
+    cur.execute(
+        f"""
+        WITH points AS (
+            SELECT 'node' AS kind, id, trip_id, name, NULL::text AS category, geog::geometry AS geom
+            FROM nodes WHERE {where} AND invisible IS NOT TRUE {trip_filter}
+            UNION ALL
+            SELECT 'stop', id, trip_id, name, category, geog::geometry FROM stops WHERE {where} {trip_filter}{adventures}
+        )
+        SELECT ST_X(cell) AS cell_x, ST_Y(cell) AS cell_y, kind, category,
+               COUNT(*) AS n, SUM(ST_X(geom)) AS sum_x, SUM(ST_Y(geom)) AS sum_y,
+               MIN(ST_X(geom)) AS west, MIN(ST_Y(geom)) AS south, MAX(ST_X(geom)) AS east, MAX(ST_Y(geom)) AS north,
+               MIN(id) AS id, MIN(trip_id) AS trip_id, MIN(name) AS name
+        FROM (SELECT *, ST_SnapToGrid(geom, %s) AS cell FROM points) p
+        GROUP BY cell, kind, category
+        """,
+        params + trip_params + params + trip_params + ([] if trip_id is not None else params) + [cluster_cell_degrees(zoom)],
+    )
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    clusters = {}
+    for r in rows:
+        c = clusters.setdefault((r["cell_x"], r["cell_y"]), {
+            "count": 0, "sum_x": 0.0, "sum_y": 0.0,
+            "bounds": [r["west"], r["south"], r["east"], r["north"]],
+            "kinds": {}, "categories": {}, "item": None,
+        })
+        c["count"] += r["n"]
+        c["sum_x"] += r["sum_x"]
+        c["sum_y"] += r["sum_y"]
+        b = c["bounds"]
+        c["bounds"] = [min(b[0], r["west"]), min(b[1], r["south"]), max(b[2], r["east"]), max(b[3], r["north"])]
+        c["kinds"][r["kind"]] = c["kinds"].get(r["kind"], 0) + r["n"]
+        if r["category"]:
+            c["categories"][r["category"]] = c["categories"].get(r["category"], 0) + r["n"]
+        if r["n"] == 1:
+            c["item"] = {"type": r["kind"], "id": r["id"], "trip_id": r["trip_id"], "name": r["name"], "category": r["category"]}
+
+    result = []
+    for c in clusters.values():
+        result.append({
+            "latitude": c["sum_y"] / c["count"],
+            "longitude": c["sum_x"] / c["count"],
+            "count": c["count"],
+            "bounds": c["bounds"],
+            "kinds": c["kinds"],
+            "categories": c["categories"],
+            "item": c["item"] if c["count"] == 1 else None,
+        })
+    result.sort(key=lambda c: -c["count"])
+    return {"zoom": zoom, "cell_degrees": cluster_cell_degrees(zoom), "clusters": result}
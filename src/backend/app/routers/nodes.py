@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
 #from src.backend.app.routers.connect import get_db
 from .connect import get_db
+from .etag import table_etag, etag_matches, not_modified, etag_response
 
 router = APIRouter(prefix="/api/nodes", tags=["nodes"])
 
@@ -38,11 +39,35 @@ class NodeUpdate(BaseModel):
     osm_state: str | None = None
     invisible: bool | None = None
 
+def _node_out(r) -> dict:
+    return {
+        "id": r["id"],
+        "trip_id": r["trip_id"],
+        "name": r["name"],
+        "description": r["description"],
+        "notes": r["notes"] if r["notes"] else None,
+        "arrival_date": r["arrival_date"],
+        "departure_date": r["departure_date"],
+        "latitude": r["latitude"],
+        "longitude": r["longitude"],
+        "osm_name": r["osm_name"] if r["osm_name"] else None,
+        "osm_id": r["osm_id"] if r["osm_id"] else None,
+        "osm_country": r["osm_country"] if r["osm_country"] else None,
+        "osm_state": r["osm_state"] if r["osm_state"] else None,
+        "invisible": r["invisible"] if r["invisible"] else None
+    }
+
+
 # Return a list of all nodes corresponding to a specific trip
 @router.get("/by_trip/{trip_id}")
-def get_nodes_by_trip(trip_id: int):
+def get_nodes_by_trip(trip_id: int, request: Request):
     conn = get_db()
     cur = conn.cursor()
+    etag = table_etag(cur, "nodes", "trip_id = %s", (trip_id,))
+    if etag_matches(request, etag):
+        cur.close()
+        conn.close()
+        return not_modified(etag)
     cur.execute("""
         SELECT id, trip_id, name, description, notes, arrival_date, departure_date, latitude, longitude, osm_name, osm_id, osm_country, osm_state, invisible
         FROM nodes
@@ -53,25 +78,7 @@ def get_nodes_by_trip(trip_id: int):
     cur.close()
     conn.close()
 
-    return [
-        {
-            "id": r["id"],
-            "trip_id": r["trip_id"],
-            "name": r["name"],
-            "description": r["description"],
-            "notes": r["notes"] if r["notes"] else None,
-            "arrival_date": r["arrival_date"],
-            "departure_date": r["departure_date"],
-            "latitude": r["latitude"],
-            "longitude": r["longitude"],
-            "osm_name": r["osm_name"] if r["osm_name"] else None,
-            "osm_id": r["osm_id"] if r["osm_id"] else None,
-            "osm_country": r["osm_country"] if r["osm_country"] else None,
-            "osm_state": r["osm_state"] if r["osm_state"] else None,
-            "invisible": r["invisible"] if r["invisible"] else None
-        }
-        for r in rows
-    ]
+    return etag_response([_node_out(r) for r in rows], etag)
 
 # Create a new node
 @router.post("/")
@@ -1,18 +1,27 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Query
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, List
 import os
 import shutil
 import uuid
+import hashlib
+import asyncio
 
-#from src.backend.app.routers.connect import get_db
-from .connect import get_db
+from psycopg2.extras import execute_values
+
+#from src.backend.app.routers.connect import run_db
+from .connect import run_db
+#from src.backend.app.routers.images import process_photo, variant_files, srcset
+from .images import process_photo, variant_files, srcset
 
 router = APIRouter(prefix="/api/photos", tags=["photos"])
 
 UPLOAD_DIR = "/workspaces/src/uploads"
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
+MAX_BATCH_FILES = 500
+BATCH_CONCURRENCY = 8  # files copied/hashed at once in /upload_batch
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
@@ -24,6 +33,7 @@ def _allowed(filename: str) -> bool:
 
 @router.post("/upload")
 async def upload_photo(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     trip_id: Optional[int] = Form(None),
     leg_id: Optional[int] = Form(None),
@@ -38,33 +48,171 @@ async def upload_photo(
     if not _allowed(file.filename):
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
-    # Read a chunk to enforce size limit
+    tmp_path, content_hash = await _stream_upload(file)
+    ext = file.filename.rsplit('.', 1)[-1].lower()
+    links = (trip_id, leg_id, node_id, stop_id, adventure_id)
+    try:
+        rows = await run_db(_store_photos, links, [(tmp_path, content_hash, ext, description)], commit=True)
+    finally:
+        # Left over when the content was already stored (or the insert failed)
+        await run_in_threadpool(_discard, tmp_path)
+
+    _schedule_processing(background_tasks, rows)
+    return {"id": rows[0]["id"], "url": rows[0]["url"]}
+
+
+@router.post("/upload_batch")
+async def upload_photo_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    trip_id: Optional[int] = Form(None),
+    leg_id: Optional[int] = Form(None),
+    node_id: Optional[int] = Form(None),
+    stop_id: Optional[int] = Form(None),
+    adventure_id: Optional[int] = Form(None),
+    descriptions: Optional[List[str]] = Form(None)
+):
+    """Upload many photos sharing the same links in one request.
+
+    Files are copied to disk and hashed concurrently, then all rows are written in one
+    transaction. Results are per file, in request order: {"filename", "id", "url"} or
+    {"filename", "error"} for files that were rejected.
+    """
+    if not (trip_id or leg_id or node_id or stop_id or adventure_id):
+        raise HTTPException(status_code=400, detail="One of trip_id, leg_id, node_id, stop_id, or adventure_id must be provided")
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch")
+    if descriptions is not None and len(descriptions) != len(files):
+        raise HTTPException(status_code=400, detail="descriptions must have one entry per file")
+
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def receive(file: UploadFile):
+        if not _allowed(file.filename):
+            return HTTPException(status_code=400, detail="Unsupported file type")
+        async with limit:
+            try:
+                return await _stream_upload(file)
+            except HTTPException as e:
+                return e
+
+    # A failure other than a rejected file (disk error, client gone mid-stream) fails the
+    # batch, but only once every task has finished, so their temp files can all be removed
+    received = await asyncio.gather(*(receive(f) for f in files), return_exceptions=True)
+    errors = [r for r in received if isinstance(r, BaseException) and not isinstance(r, HTTPException)]
+    if errors:
+        await run_in_threadpool(_discard, *(r[0] for r in received if isinstance(r, tuple)))
+        raise errors[0]
+
+    results = [{"filename": f.filename} for f in files]
+    accepted, uploads = [], []
+    for i, (file, outcome) in enumerate(zip(files, received)):
+        if isinstance(outcome, HTTPException):
+            results[i]["error"] = outcome.detail
+            continue
+        tmp_path, content_hash = outcome
+        ext = file.filename.rsplit('.', 1)[-1].lower()
+        description = descriptions[i] if descriptions else None
+        accepted.append(i)
+        uploads.append((tmp_path, content_hash, ext, description or None))
+
+    if uploads:
+        links = (trip_id, leg_id, node_id, stop_id, adventure_id)
+        try:
+            rows = await run_db(_store_photos, links, uploads, commit=True)
+        finally:
+            await run_in_threadpool(_discard, *(u[0] for u in uploads))
+        for i, row in zip(accepted, rows):
+            results[i].update(id=row["id"], url=row["url"])
+        _schedule_processing(background_tasks, rows)
+
+    return {"uploaded": len(uploads), "failed": len(files) - len(uploads), "results": results}
+
+
+async def _stream_upload(file: UploadFile):
+    """Copy an upload to a temp file under UPLOAD_DIR, hashing it on the way.
+
+    Returns (tmp_path, sha256 hex digest); raises 413 past MAX_FILE_SIZE.
+    """
     size = 0
+    digest = hashlib.sha256()
     tmp_path = os.path.join(UPLOAD_DIR, f"tmp_{uuid.uuid4().hex}")
-    with open(tmp_path, 'wb') as tmp:
+    tmp = await run_in_threadpool(open, tmp_path, 'wb')
+    try:
         while True:
             chunk = await file.read(1024 * 1024)
             if not chunk:
                 break
             size += len(chunk)
             if size > MAX_FILE_SIZE:
-                tmp.close()
-                os.remove(tmp_path)
-                raise HTTPException(status_code=413, detail="File too large")
-            tmp.write(chunk)
+                break
+            await run_in_threadpool(_write_chunk, tmp, digest, chunk)
+    except BaseException:
+        tmp.close()
+        _discard(tmp_path)
+        raise
+    finally:
+        if not tmp.closed:
+            await run_in_threadpool(tmp.close)
+    if size > MAX_FILE_SIZE:
+        await run_in_threadpool(os.remove, tmp_path)
+        raise HTTPException(status_code=413, detail="File too large")
+    return tmp_path, digest.hexdigest()
 
-    # Final file name under uploads
-    ext = file.filename.rsplit('.', 1)[-1].lower()
-    safe_name = f"{uuid.uuid4().hex}.{ext}"
-    final_path = os.path.join(UPLOAD_DIR, safe_name)
-    shutil.move(tmp_path, final_path)
 
-    # URL exposed via StaticFiles
-    url_path = f"/uploads/{safe_name}"
+def _write_chunk(tmp, digest, chunk):
+    digest.update(chunk)
+    tmp.write(chunk)
+
 
-    # Derive trip_id if missing
-    conn = get_db()
-    cur = conn.cursor()
+def _discard(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _schedule_processing(background_tasks: BackgroundTasks, rows):
+    # Variants and EXIF are filled in once the process pool is done, once per stored
+    # file; a duplicate of an already processed upload got them on insert
+    seen = set()
+    for row in rows:
+        if row["variants"] is None and row["url"] not in seen:
+            seen.add(row["url"])
+            final_path = os.path.join(UPLOAD_DIR, os.path.basename(row["url"]))
+            background_tasks.add_task(process_photo, row["id"], final_path, UPLOAD_DIR)
+
+
+def _store_blobs(cur, uploads, moved):
+    # Files are named by content, so identical uploads share one file. The per-hash
+    # advisory locks (held until commit) keep _remove_orphaned_blobs from unlinking a
+    # file between our existence check below and our commit; it re-checks the rows after.
+    # Paths of files put in place here are appended to moved.
+    unique = {}
+    for tmp_path, content_hash, ext, _ in uploads:
+        unique.setdefault(content_hash, (tmp_path, ext))
+    # In sorted order (unnest keeps it), so two batches sharing hashes cannot deadlock
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(h)) FROM unnest(%s::text[]) AS h", (sorted(unique),))
+    rows = execute_values(
+        cur,
+        """
+        INSERT INTO photo_blobs (content_hash, url) VALUES %s
+        ON CONFLICT (content_hash) DO UPDATE SET url = photo_blobs.url
+        RETURNING content_hash, url
+        """,
+        [(h, f"/uploads/{h}.{ext}") for h, (_, ext) in unique.items()],
+        page_size=len(unique),
+        fetch=True,
+    )
+    urls = {r["content_hash"]: r["url"] for r in rows}
+    for content_hash, (tmp_path, _) in unique.items():
+        final_path = os.path.join(UPLOAD_DIR, os.path.basename(urls[content_hash]))
+        if not os.path.exists(final_path):
+            shutil.move(tmp_path, final_path)
+            moved.append(final_path)
+    return urls
+
+
+def _derive_trip_id(cur, trip_id, leg_id, node_id, stop_id):
     if trip_id is None:
         if leg_id is not None:
             cur.execute("SELECT trip_id FROM legs WHERE id = %s", (leg_id,))
@@ -82,102 +230,248 @@ async def upload_photo(
             if row and row["trip_id"] is not None:
                 trip_id = row["trip_id"]
         # adventures not tied to a trip, so no derivation
-    cur.execute(
+    return trip_id
+
+
+def _store_photos(cur, links, uploads):
+    """Store files and insert one photo row per upload (tmp_path, content_hash, ext, description).
+
+    Returns the inserted rows (id, url, variants) in upload order.
+    """
+    trip_id, leg_id, node_id, stop_id, adventure_id = links
+    trip_id = _derive_trip_id(cur, trip_id, leg_id, node_id, stop_id)
+    moved = []
+    try:
+        return _insert_photos(cur, (trip_id, leg_id, node_id, stop_id, adventure_id), uploads, moved)
+    except Exception:
+        # The transaction is rolled back, so the blob rows go away: remove their files now,
+        # while the rows are still locked, so a concurrent upload of the same content
+        # waiting on them writes its own copy
+        _discard(*moved)
+        raise
+
+
+def _insert_photos(cur, links, uploads, moved):
+    trip_id, leg_id, node_id, stop_id, adventure_id = links
+    urls = _store_blobs(cur, uploads, moved)
+    # photo_blobs.refcount is bumped by trg_photos_blob_refcount
+    rows = execute_values(
+        cur,
         """
-        INSERT INTO photos (trip_id, leg_id, node_id, stop_id, adventure_id, url, description)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        RETURNING id
+        INSERT INTO photos (trip_id, leg_id, node_id, stop_id, adventure_id, url, description, content_hash, variants)
+        VALUES %s
+        RETURNING id, url, variants
         """,
-        (trip_id, leg_id, node_id, stop_id, adventure_id, url_path, description)
+        [
+            (trip_id, leg_id, node_id, stop_id, adventure_id, urls[content_hash], description, content_hash, content_hash)
+            for _, content_hash, _, description in uploads
+        ],
+        template="(%s, %s, %s, %s, %s, %s, %s, %s, (SELECT variants FROM photos WHERE content_hash = %s AND variants IS NOT NULL LIMIT 1))",
+        page_size=len(uploads),
+        fetch=True,
     )
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    # Duplicates of processed content also take over its EXIF
+    processed = [r["id"] for r in rows if r["variants"] is not None]
+    if processed:
+        cur.execute(
+            """
+            UPDATE photos p SET taken_at = s.taken_at, latitude = s.latitude, longitude = s.longitude
+            FROM (
+                SELECT DISTINCT ON (content_hash) content_hash, taken_at, latitude, longitude
+                FROM photos
+                WHERE content_hash IN (SELECT content_hash FROM photos WHERE id = ANY(%(ids)s))
+                  AND variants IS NOT NULL AND NOT (id = ANY(%(ids)s))
+                ORDER BY content_hash, id
+            ) s
+            WHERE p.id = ANY(%(ids)s) AND p.content_hash = s.content_hash
+            """,
+            {"ids": processed},
+        )
+    return rows
+
 
-    return {"id": row["id"], "url": url_path}
+def _fetch_photos(cur, sql, params):
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    for row in rows:
+        # variants is NULL until generation finishes; clients fall back to url
+        row["srcset"] = srcset(row["variants"])
+    return rows
 
 
 @router.get("/by_trip/{trip_id}")
 async def list_photos_by_trip(trip_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, url, description, leg_id, node_id, stop_id, adventure_id FROM photos WHERE trip_id = %s ORDER BY id DESC", (trip_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    return await run_db(_fetch_photos, "SELECT id, url, variants, description, taken_at, latitude, longitude, leg_id, node_id, stop_id, adventure_id FROM photos WHERE trip_id = %s ORDER BY id DESC", (trip_id,))
 
 
 @router.get("/by_leg/{leg_id}")
 async def list_photos_by_leg(leg_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, url, description, trip_id, node_id, stop_id, adventure_id FROM photos WHERE leg_id = %s ORDER BY id DESC", (leg_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    return await run_db(_fetch_photos, "SELECT id, url, variants, description, taken_at, latitude, longitude, trip_id, node_id, stop_id, adventure_id FROM photos WHERE leg_id = %s ORDER BY id DESC", (leg_id,))
 
 
 @router.get("/by_node/{node_id}")
 async def list_photos_by_node(node_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, url, description, trip_id, leg_id, stop_id, adventure_id FROM photos WHERE node_id = %s ORDER BY id DESC", (node_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    return await run_db(_fetch_photos, "SELECT id, url, variants, description, taken_at, latitude, longitude, trip_id, leg_id, stop_id, adventure_id FROM photos WHERE node_id = %s ORDER BY id DESC", (node_id,))
 
 
 @router.get("/by_stop/{stop_id}")
 async def list_photos_by_stop(stop_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, url, description, trip_id, leg_id, node_id, adventure_id FROM photos WHERE stop_id = %s ORDER BY id DESC", (stop_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    return await run_db(_fetch_photos, "SELECT id, url, variants, description, taken_at, latitude, longitude, trip_id, leg_id, node_id, adventure_id FROM photos WHERE stop_id = %s ORDER BY id DESC", (stop_id,))
 
 @router.get("/by_adventure/{adventure_id}")
 async def list_photos_by_adventure(adventure_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, url, description, trip_id, leg_id, node_id, stop_id FROM photos WHERE adventure_id = %s ORDER BY id DESC", (adventure_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    return await run_db(_fetch_photos, "SELECT id, url, variants, description, taken_at, latitude, longitude, trip_id, leg_id, node_id, stop_id FROM photos WHERE adventure_id = %s ORDER BY id DESC", (adventure_id,))
 
 
-@router.delete("/{photo_id}")
-async def delete_photo(photo_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT url FROM photos WHERE id = %s", (photo_id,))
+def _photos_missing_variants(cur, rebuild_all):
+    cur.execute(
+        f"SELECT id, url FROM photos WHERE url LIKE '/uploads/%%' {'' if rebuild_all else 'AND variants IS NULL'} ORDER BY id"
+    )
+    return cur.fetchall()
+
+
+@router.post("/variants/rebuild")
+async def rebuild_photo_variants(background_tasks: BackgroundTasks, rebuild_all: bool = False):
+    """Queue variant generation and EXIF extraction for photos uploaded before the pipeline existed (or all with rebuild_all)."""
+    rows = await run_db(_photos_missing_variants, rebuild_all)
+    queued = 0
+    for row in rows:
+        path = os.path.join(UPLOAD_DIR, os.path.basename(row["url"]))
+        if os.path.exists(path):
+            background_tasks.add_task(process_photo, row["id"], path, UPLOAD_DIR)
+            queued += 1
+    return {"queued": queued}
+
+
+# Suggestion scoring: distance in units of SUGGEST_DISTANCE_SCALE_M (capped at 2) plus 1 when
+# the capture date falls outside the candidate's dates; unknown terms count as 1. Lower is better.
+SUGGEST_DISTANCE_SCALE_M = 25000
+SUGGEST_CANDIDATES = 10  # per entity type and per criterion, before scoring
+
+_SUGGEST_SQL = """
+WITH params AS (
+    SELECT CASE WHEN %(lat)s::float8 IS NOT NULL AND %(lon)s::float8 IS NOT NULL
+                THEN ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography END AS geog,
+           %(day)s::date AS day
+),
+node_ids AS (
+    (SELECT id FROM nodes WHERE %(lat)s::float8 IS NOT NULL AND geog IS NOT NULL
+     ORDER BY geog <-> ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography LIMIT %(k)s)
+    UNION
+    (SELECT id FROM nodes WHERE entity_daterange(arrival_date, departure_date) @> %(day)s::date LIMIT %(k)s)
+),
+stop_ids AS (
+    (SELECT id FROM stops WHERE %(lat)s::float8 IS NOT NULL AND geog IS NOT NULL
+     ORDER BY geog <-> ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography LIMIT %(k)s)
+    UNION
+    (SELECT id FROM stops WHERE entity_daterange(start_date, end_date) @> %(day)s::date LIMIT %(k)s)
+),
+leg_ids AS (
+    -- Legs have no point of their own: candidates are those travelled around the capture date
+    SELECT id FROM legs WHERE date BETWEEN %(day)s::date - 1 AND %(day)s::date + 1
+    ORDER BY ABS(date - %(day)s::date) LIMIT %(k)s
+),
+candidates AS (
+    SELECT 'node' AS type, n.id, n.name, n.trip_id,
+           ST_Distance(n.geog, p.geog) AS distance_m,
+           entity_daterange(n.arrival_date, n.departure_date) @> p.day AS date_match
+    FROM nodes n JOIN node_ids USING (id), params p
+    UNION ALL
+    SELECT 'stop', s.id, s.name, s.trip_id,
+           ST_Distance(s.geog, p.geog),
+           entity_daterange(s.start_date, s.end_date) @> p.day
+    FROM stops s JOIN stop_ids USING (id), params p
+    UNION ALL
+    SELECT 'leg', l.id, CONCAT_WS(' -> ', l.start_osm_name, l.end_osm_name), l.trip_id,
+           CASE WHEN l.start_latitude IS NOT NULL AND l.start_longitude IS NOT NULL
+                 AND l.end_latitude IS NOT NULL AND l.end_longitude IS NOT NULL
+                THEN ST_Distance(
+                    ST_MakeLine(ST_MakePoint(l.start_longitude, l.start_latitude), ST_MakePoint(l.end_longitude, l.end_latitude))::geography,
+                    p.geog)
+           END,
+           l.date = p.day
+    FROM legs l JOIN leg_ids USING (id), params p
+)
+SELECT type, id, name, trip_id, distance_m, COALESCE(date_match, FALSE) AS date_match,
+       CASE WHEN distance_m IS NULL THEN 1 ELSE LEAST(distance_m / %(scale)s, 2) END
+         + CASE WHEN date_match THEN 0 ELSE 1 END AS score
+FROM candidates
+ORDER BY score, distance_m NULLS LAST, type, id
+LIMIT %(limit)s
+"""
+
+
+def _suggest_links(cur, photo_id, limit):
+    cur.execute("SELECT id, taken_at, latitude, longitude FROM photos WHERE id = %s", (photo_id,))
+    photo = cur.fetchone()
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    if photo["taken_at"] is None and (photo["latitude"] is None or photo["longitude"] is None):
+        raise HTTPException(status_code=400, detail="Photo has no EXIF capture time or location")
+    cur.execute(_SUGGEST_SQL, {
+        "lat": photo["latitude"],
+        "lon": photo["longitude"],
+        "day": photo["taken_at"].date() if photo["taken_at"] else None,
+        "k": SUGGEST_CANDIDATES,
+        "scale": SUGGEST_DISTANCE_SCALE_M,
+        "limit": limit,
+    })
+    return {"photo": photo, "suggestions": cur.fetchall()}
+
+
+@router.get("/{photo_id}/suggest")
+async def suggest_photo_links(photo_id: int, limit: int = Query(5, ge=1, le=50)):
+    """Nodes, stops and legs the photo most likely belongs to, from its EXIF position and date."""
+    return await run_db(_suggest_links, photo_id, limit)
+
+
+def _delete_photo_row(cur, photo_id):
+    cur.execute("DELETE FROM photos WHERE id = %s RETURNING url, content_hash", (photo_id,))
     row = cur.fetchone()
     if not row:
-        cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Photo not found")
+    # Also collects blobs orphaned by cascading deletes of trips, legs, nodes, ...
+    blobs = _purge_unreferenced_blobs(cur)
+    # Files from before content addressing belong to this row alone
+    return (row["url"] if row["content_hash"] is None else None), blobs
 
-    url = row["url"]
-    cur.execute("DELETE FROM photos WHERE id = %s", (photo_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
 
-    # Remove file if exists
+def _purge_unreferenced_blobs(cur):
+    # Only the rows go here; the files are removed by _remove_orphaned_blobs once this
+    # transaction has committed, so a rollback never leaves rows pointing at missing files
+    cur.execute("DELETE FROM photo_blobs WHERE refcount = 0 RETURNING content_hash, url")
+    return cur.fetchall()
+
+
+def _remove_orphaned_blobs(cur, blobs):
+    # After the purge committed: under the same per-hash lock as _store_blobs, unlink only
+    # files whose blob row is still gone (an upload of the same content may have re-created it)
+    for blob in blobs:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (blob["content_hash"],))
+        cur.execute("SELECT 1 FROM photo_blobs WHERE content_hash = %s", (blob["content_hash"],))
+        if cur.fetchone() is None:
+            _remove_upload(blob["url"])
+
+
+def _remove_upload(url):
     if url and url.startswith("/uploads/"):
-        file_path = os.path.join(UPLOAD_DIR, os.path.basename(url))
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception:
-            pass
+        name = os.path.basename(url)
+        paths = [os.path.join(UPLOAD_DIR, name)] + variant_files(os.path.splitext(name)[0], UPLOAD_DIR)
+        for file_path in paths:
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except Exception:
+                pass
 
-    return {"message": "Photo deleted"}
 
+@router.delete("/{photo_id}")
+async def delete_photo(photo_id: int):
+    url, blobs = await run_db(_delete_photo_row, photo_id, commit=True)
 
+    # Remove files and their variants now that the delete is committed
+    await run_in_threadpool(_remove_upload, url)
+    if blobs:
+        await run_db(_remove_orphaned_blobs, blobs, commit=True)
+
+    return {"message": "Photo deleted"}
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Query
-from typing import List, Any, Optional, Tuple, Set
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Any, Optional, Tuple, Set, Dict
+import base64
+import decimal
+import json
 import re
 import datetime as _dt
-import calendar as _cal
 
 #from src.backend.app.routers.connect import get_db
 from .connect import get_db
+from .suggest_index import suggest_index
 
 router = APIRouter(prefix="/api/search", tags=["search"])
 
@@ -61,18 +64,60 @@ def _extract_month_year(raw: str) -> Optional[Tuple[int, int]]:
     return None
 
 
-@router.get("/")
-@router.get("")
-def global_search(q: str = Query("", min_length=0), limit: int = Query(50, ge=1, le=200)) -> List[Any]:
-    """Global fuzzy-ish search across trips, nodes, legs, and stops.
+# Result ordering shared by both endpoints; keyset pagination walks the same key
+# (score, rank, date, title, type, id).
+_SEARCH_SQL = """
+    SELECT *
+    FROM (
+        SELECT x.*, cardinality(x.matched_fields) AS score
+        FROM (
+            SELECT
+                d.entity_type AS type,
+                d.entity_id,
+                d.trip_id,
+                d.title,
+                d.subtitle,
+                d.date,
+                d.start_date,
+                d.end_date,
+                ARRAY(
+                    SELECT f.name
+                    FROM unnest(d.field_names, d.field_values) WITH ORDINALITY AS f(name, value, ord)
+                    WHERE f.value ILIKE %(p)s
+                       OR (%(mp)s IS NOT NULL AND f.name = ANY(%(date_fields)s) AND f.value ILIKE %(mp)s)
+                    ORDER BY f.ord
+                ) AS matched_fields,
+                ROUND(COALESCE(ts_rank(d.document, to_tsquery('simple', %(tsq)s)), 0)::numeric, 6) AS rank
+            FROM search_documents d
+            WHERE (d.search_text ILIKE %(p)s OR d.search_text ILIKE %(mp)s)
+            {token_clause}
+        ) x
+    ) results
+    WHERE score > 0
+    {keyset_clause}
+    ORDER BY score DESC, rank DESC, date DESC NULLS LAST, title ASC, type ASC, entity_id ASC
+    LIMIT %(limit)s;
+"""
 
-    Returns a unified list of result objects with a common shape:
-    { type, id, trip_id, title, subtitle, date, start_date, end_date, matched_fields }
-    """
+# Rows strictly after the cursor in the ORDER BY above (mixed directions, so spelled out)
+_KEYSET_SQL = """
+    AND (
+        score < %(c_score)s OR (score = %(c_score)s AND (
+        rank < %(c_rank)s OR (rank = %(c_rank)s AND (
+        (CASE WHEN %(c_date)s::date IS NULL THEN FALSE ELSE (date < %(c_date)s::date OR date IS NULL) END)
+        OR (date IS NOT DISTINCT FROM %(c_date)s::date AND (
+        title > %(c_title)s OR (title = %(c_title)s AND (
+        type > %(c_type)s OR (type = %(c_type)s AND entity_id > %(c_id)s)))))))))
+    )
+"""
+
+
+def _prepare_search(q: str) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Parse the raw query into SQL params + the multi-token clause, or None if too short."""
     query = (q or "").strip()
     if len(query) < 2:
         # Short queries not allowed to avoid table scans
-        return []
+        return None
 
     cleaned = query.replace('%','').replace('_','')
     # Tokenize (basic) for advanced matching: allow words containing letters/numbers
@@ -94,13 +139,9 @@ def global_search(q: str = Query("", min_length=0), limit: int = Query(50, ge=1,
 
     month_year = _extract_month_year(query)
     month_pattern: Optional[str] = None
-    month_start: Optional[_dt.date] = None
-    month_end: Optional[_dt.date] = None
     if month_year:
         y, m = month_year
         month_pattern = f"%{y}-{m:02d}%"
-        month_start = _dt.date(y, m, 1)
-        month_end = _dt.date(y, m, _cal.monthrange(y, m)[1])
 
     # Month-only query heuristic (e.g., "August 2025") – relax token AND logic
     month_only_query = False
@@ -109,276 +150,195 @@ def global_search(q: str = Query("", min_length=0), limit: int = Query(50, ge=1,
         if month_tokens:
             month_only_query = True
 
-    conn = get_db()
-    cur = conn.cursor()
-    # Build AND clauses for multi-token search (applied to each entity's concatenated blob)
-    token_clauses_trip = token_clauses_node = token_clauses_leg = token_clauses_stop = token_clauses_adv = ""
-    params = {"p": pattern, "limit": limit, "mp": month_pattern}
+    # Date-typed fields also match the month pattern (e.g. "August 2025" -> %2025-08%)
+    date_fields = ['date', 'start_date', 'end_date', 'arrival_date', 'departure_date']
+    params = {"p": pattern, "mp": month_pattern, "date_fields": date_fields,
+              "tsq": " & ".join(f"{tk}:*" for tk in tokens) or None}
     # Only add token-specific clauses if we truly have multiple tokens AND we're not in a relaxed month-only query.
+    token_clause = ""
     if multi_token and not month_only_query:
         for i, tk in enumerate(tokens):
             params[f"tk{i}"] = f"%{tk}%"
-        # Define blob expressions once per entity type
-    trip_blob = "(COALESCE(t.name,'') || ' ' || COALESCE(t.description,'') || ' ' || COALESCE(t.start_date::text,'') || ' ' || COALESCE(t.end_date::text,''))"
-    node_blob = "(COALESCE(n.name,'') || ' ' || COALESCE(n.description,'') || ' ' || COALESCE(n.notes,'') || ' ' || COALESCE(n.osm_name,'') || ' ' || COALESCE(n.osm_country,'') || ' ' || COALESCE(n.osm_state,'') || ' ' || COALESCE(n.arrival_date::text,'') || ' ' || COALESCE(n.departure_date::text,''))"
-    leg_blob = "(COALESCE(l.notes,'') || ' ' || COALESCE(l.type,'') || ' ' || COALESCE(l.start_osm_name,'') || ' ' || COALESCE(l.end_osm_name,'') || ' ' || COALESCE(l.start_osm_country,'') || ' ' || COALESCE(l.end_osm_country,'') || ' ' || COALESCE(l.start_osm_state,'') || ' ' || COALESCE(l.end_osm_state,'') || ' ' || COALESCE(l.date::text,'') || ' ' || COALESCE(fd.airline,'') || ' ' || COALESCE(fd.flight_number,'') || ' ' || COALESCE(fd.start_airport,'') || ' ' || COALESCE(fd.end_airport,''))"
-    stop_blob = "(COALESCE(s.name,'') || ' ' || COALESCE(s.notes,'') || ' ' || COALESCE(s.category,'') || ' ' || COALESCE(s.osm_name,'') || ' ' || COALESCE(s.osm_country,'') || ' ' || COALESCE(s.osm_state,'') || ' ' || COALESCE(s.start_date::text,'') || ' ' || COALESCE(s.end_date::text,''))"
-    adventure_blob = "(COALESCE(a.name,'') || ' ' || COALESCE(a.notes,'') || ' ' || COALESCE(a.category,'') || ' ' || COALESCE(a.osm_name,'') || ' ' || COALESCE(a.osm_country,'') || ' ' || COALESCE(a.osm_state,'') || ' ' || COALESCE(a.start_date::text,'') || ' ' || COALESCE(a.end_date::text,''))"
-    if multi_token and not month_only_query:
-        token_parts = [f"{trip_blob} ILIKE %(tk{i})s" for i in range(len(tokens))]
-        token_clauses_trip = f"AND ( {trip_blob} ILIKE %(p)s AND " + " AND ".join(token_parts) + " )"
-        token_parts = [f"{node_blob} ILIKE %(tk{i})s" for i in range(len(tokens))]
-        token_clauses_node = f"AND ( {node_blob} ILIKE %(p)s AND " + " AND ".join(token_parts) + " )"
-        token_parts = [f"{leg_blob} ILIKE %(tk{i})s" for i in range(len(tokens))]
-        token_clauses_leg = f"AND ( {leg_blob} ILIKE %(p)s AND " + " AND ".join(token_parts) + " )"
-        token_parts = [f"{stop_blob} ILIKE %(tk{i})s" for i in range(len(tokens))]
-        token_clauses_stop = f"AND ( {stop_blob} ILIKE %(p)s AND " + " AND ".join(token_parts) + " )"
-        token_parts = [f"{adventure_blob} ILIKE %(tk{i})s" for i in range(len(tokens))]
-        token_clauses_adv = f"AND ( {adventure_blob} ILIKE %(p)s AND " + " AND ".join(token_parts) + " )"
-
-    sql = f"""
-        WITH results AS (
-            -- Trips
-            SELECT
-                'trip'::text AS type,
-                t.id::text AS id,
-                t.id AS sort_id,
-                t.id AS entity_id,
-                NULL::int AS trip_id,
-                t.name AS title,
-                t.description AS subtitle,
-                t.start_date AS date,
-                t.start_date AS start_date,
-                t.end_date AS end_date,
-                ARRAY_REMOVE(ARRAY[
-                    CASE WHEN t.name ILIKE %(p)s THEN 'name' END,
-                    CASE WHEN t.description ILIKE %(p)s THEN 'description' END,
-                    CASE WHEN (t.start_date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND t.start_date::text ILIKE %(mp)s)) THEN 'start_date' END,
-                    CASE WHEN (t.end_date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND t.end_date::text ILIKE %(mp)s)) THEN 'end_date' END
-                ], NULL) AS matched_fields
-            FROM trips t
-            WHERE (
-                t.name ILIKE %(p)s OR t.description ILIKE %(p)s OR
-                t.start_date::text ILIKE %(p)s OR t.end_date::text ILIKE %(p)s OR
-                (%(mp)s IS NOT NULL AND (t.start_date::text ILIKE %(mp)s OR t.end_date::text ILIKE %(mp)s))
-            )
-            {token_clauses_trip}
-
-            UNION ALL
-            -- Nodes
-            SELECT
-                'node'::text AS type,
-                n.id::text AS id,
-                n.id AS sort_id,
-                n.id AS entity_id,
-                n.trip_id AS trip_id,
-                n.name AS title,
-                COALESCE(NULLIF(n.description,''), NULLIF(n.notes,''), NULLIF(n.osm_name,'')) AS subtitle,
-                COALESCE(n.arrival_date, n.departure_date) AS date,
-                n.arrival_date AS start_date,
-                n.departure_date AS end_date,
-                ARRAY_REMOVE(ARRAY[
-                    CASE WHEN n.name ILIKE %(p)s THEN 'name' END,
-                    CASE WHEN n.description ILIKE %(p)s THEN 'description' END,
-                    CASE WHEN n.notes ILIKE %(p)s THEN 'notes' END,
-                    CASE WHEN n.osm_name ILIKE %(p)s THEN 'osm_name' END,
-                    CASE WHEN n.osm_country ILIKE %(p)s THEN 'osm_country' END,
-                    CASE WHEN n.osm_state ILIKE %(p)s THEN 'osm_state' END,
-                    CASE WHEN (n.arrival_date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND n.arrival_date::text ILIKE %(mp)s)) THEN 'arrival_date' END,
-                    CASE WHEN (n.departure_date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND n.departure_date::text ILIKE %(mp)s)) THEN 'departure_date' END
-                ], NULL) AS matched_fields
-            FROM nodes n
-            WHERE (n.invisible IS NOT TRUE) AND (
-                n.name ILIKE %(p)s OR n.description ILIKE %(p)s OR n.notes ILIKE %(p)s OR
-                n.osm_name ILIKE %(p)s OR n.osm_country ILIKE %(p)s OR n.osm_state ILIKE %(p)s OR
-                n.arrival_date::text ILIKE %(p)s OR n.departure_date::text ILIKE %(p)s OR
-                (%(mp)s IS NOT NULL AND (n.arrival_date::text ILIKE %(mp)s OR n.departure_date::text ILIKE %(mp)s))
-            )
-            {token_clauses_node}
-
-            UNION ALL
-            -- Legs
-            SELECT
-                'leg'::text AS type,
-                l.id::text AS id,
-                l.id AS sort_id,
-                l.id AS entity_id,
-                l.trip_id AS trip_id,
-                (COALESCE(ns.name, l.start_osm_name, 'Unknown') || ' → ' || COALESCE(ne.name, l.end_osm_name, 'Unknown')) AS title,
-                CASE
-                    WHEN l.type = 'flight' AND fd.airline IS NOT NULL THEN
-                        (fd.airline || COALESCE(' ' || fd.flight_number, '') || COALESCE(' (' || l.miles::int || ' mi)', ''))
-                    ELSE (l.type || COALESCE(' (' || l.miles::int || ' mi)', ''))
-                END AS subtitle,
-                l.date AS date,
-                l.date AS start_date,
-                NULL::date AS end_date,
-                ARRAY_REMOVE(ARRAY[
-                    CASE WHEN l.notes ILIKE %(p)s THEN 'notes' END,
-                    CASE WHEN l.type ILIKE %(p)s THEN 'type' END,
-                    CASE WHEN l.start_osm_name ILIKE %(p)s THEN 'start_osm_name' END,
-                    CASE WHEN l.end_osm_name ILIKE %(p)s THEN 'end_osm_name' END,
-                    CASE WHEN l.start_osm_country ILIKE %(p)s THEN 'start_osm_country' END,
-                    CASE WHEN l.end_osm_country ILIKE %(p)s THEN 'end_osm_country' END,
-                    CASE WHEN l.start_osm_state ILIKE %(p)s THEN 'start_osm_state' END,
-                    CASE WHEN l.end_osm_state ILIKE %(p)s THEN 'end_osm_state' END,
-                    CASE WHEN (l.date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND l.date::text ILIKE %(mp)s)) THEN 'date' END,
-                    CASE WHEN fd.airline ILIKE %(p)s THEN 'airline' END,
-                    CASE WHEN fd.flight_number ILIKE %(p)s THEN 'flight_number' END,
-                    CASE WHEN fd.start_airport ILIKE %(p)s THEN 'start_airport' END,
-                    CASE WHEN fd.end_airport ILIKE %(p)s THEN 'end_airport' END
-                ], NULL) AS matched_fields
-            FROM legs l
-            LEFT JOIN nodes ns ON ns.id = l.start_node_id
-            LEFT JOIN nodes ne ON ne.id = l.end_node_id
-            LEFT JOIN flight_details fd ON fd.leg_id = l.id
-            LEFT JOIN car_details cd ON cd.leg_id = l.id
-            WHERE (
-                l.notes ILIKE %(p)s OR l.type ILIKE %(p)s OR
-                l.start_osm_name ILIKE %(p)s OR l.end_osm_name ILIKE %(p)s OR
-                l.start_osm_country ILIKE %(p)s OR l.end_osm_country ILIKE %(p)s OR
-                l.start_osm_state ILIKE %(p)s OR l.end_osm_state ILIKE %(p)s OR
-                l.date::text ILIKE %(p)s OR
-                (%(mp)s IS NOT NULL AND l.date::text ILIKE %(mp)s) OR
-                fd.airline ILIKE %(p)s OR fd.flight_number ILIKE %(p)s OR
-                fd.start_airport ILIKE %(p)s OR fd.end_airport ILIKE %(p)s
-            )
-            {token_clauses_leg}
-
-            UNION ALL
-            -- Stops (use start_date/end_date; expose start_date as primary date for sorting)
-            SELECT
-                'stop'::text AS type,
-                s.id::text AS id,
-                s.id AS sort_id,
-                s.id AS entity_id,
-                s.trip_id AS trip_id,
-                s.name AS title,
-                s.category AS subtitle,
-                s.start_date AS date,
-                s.start_date AS start_date,
-                s.end_date AS end_date,
-                ARRAY_REMOVE(ARRAY[
-                    CASE WHEN s.name ILIKE %(p)s THEN 'name' END,
-                    CASE WHEN s.notes ILIKE %(p)s THEN 'notes' END,
-                    CASE WHEN s.category ILIKE %(p)s THEN 'category' END,
-                    CASE WHEN s.osm_name ILIKE %(p)s THEN 'osm_name' END,
-                    CASE WHEN s.osm_country ILIKE %(p)s THEN 'osm_country' END,
-                    CASE WHEN s.osm_state ILIKE %(p)s THEN 'osm_state' END,
-                    CASE WHEN (s.start_date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND s.start_date::text ILIKE %(mp)s)) THEN 'start_date' END,
-                    CASE WHEN (s.end_date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND s.end_date::text ILIKE %(mp)s)) THEN 'end_date' END
-                ], NULL) AS matched_fields
-            FROM stops s
-            WHERE (
-                s.name ILIKE %(p)s OR s.notes ILIKE %(p)s OR s.category ILIKE %(p)s OR
-                s.osm_name ILIKE %(p)s OR s.osm_country ILIKE %(p)s OR s.osm_state ILIKE %(p)s OR
-                s.start_date::text ILIKE %(p)s OR s.end_date::text ILIKE %(p)s OR
-                (%(mp)s IS NOT NULL AND (s.start_date::text ILIKE %(mp)s OR s.end_date::text ILIKE %(mp)s))
-            )
-            {token_clauses_stop}
-
-            UNION ALL
-            -- Adventures (no trip association)
-            SELECT
-                'adventure'::text AS type,
-                a.id::text AS id,
-                a.id AS sort_id,
-                a.id AS entity_id,
-                NULL::int AS trip_id,
-                a.name AS title,
-                a.category AS subtitle,
-                COALESCE(a.start_date, a.end_date) AS date,
-                a.start_date AS start_date,
-                a.end_date AS end_date,
-                ARRAY_REMOVE(ARRAY[
-                    CASE WHEN a.name ILIKE %(p)s THEN 'name' END,
-                    CASE WHEN a.notes ILIKE %(p)s THEN 'notes' END,
-                    CASE WHEN a.category ILIKE %(p)s THEN 'category' END,
-                    CASE WHEN a.osm_name ILIKE %(p)s THEN 'osm_name' END,
-                    CASE WHEN a.osm_country ILIKE %(p)s THEN 'osm_country' END,
-                    CASE WHEN a.osm_state ILIKE %(p)s THEN 'osm_state' END,
-                    CASE WHEN (a.start_date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND a.start_date::text ILIKE %(mp)s)) THEN 'start_date' END,
-                    CASE WHEN (a.end_date::text ILIKE %(p)s OR (%(mp)s IS NOT NULL AND a.end_date::text ILIKE %(mp)s)) THEN 'end_date' END
-                ], NULL) AS matched_fields
-            FROM adventures a
-            WHERE (
-                a.name ILIKE %(p)s OR a.notes ILIKE %(p)s OR a.category ILIKE %(p)s OR
-                a.osm_name ILIKE %(p)s OR a.osm_country ILIKE %(p)s OR a.osm_state ILIKE %(p)s OR
-                a.start_date::text ILIKE %(p)s OR a.end_date::text ILIKE %(p)s OR
-                (%(mp)s IS NOT NULL AND (a.start_date::text ILIKE %(mp)s OR a.end_date::text ILIKE %(mp)s))
-            )
-            {token_clauses_adv}
-        )
-        SELECT *
-        FROM results
-        ORDER BY COALESCE(array_length(matched_fields,1),0) DESC, date DESC NULLS LAST, title ASC
-        LIMIT %(limit)s;
-    """
+        token_clause = "AND " + " AND ".join(f"d.search_text ILIKE %(tk{i})s" for i in range(len(tokens)))
+    return params, token_clause
+
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    key = [
+        row["score"],
+        str(row["rank"]),
+        row["date"].isoformat() if row.get("date") is not None else None,
+        row["title"],
+        row["type"],
+        row["entity_id"],
+    ]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, rank, date, title, typ, ent_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {
+            "c_score": int(score),
+            "c_rank": decimal.Decimal(rank),
+            "c_date": _dt.date.fromisoformat(date) if date else None,
+            "c_title": str(title),
+            "c_type": str(typ),
+            "c_id": int(ent_id),
+        }
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _run_search(cur, params: Dict[str, Any], token_clause: str, limit: int, after: Optional[Dict[str, Any]] = None) -> List[dict]:
+    sql = _SEARCH_SQL.format(token_clause=token_clause, keyset_clause=_KEYSET_SQL if after else "")
+    cur.execute(sql, {**params, **(after or {}), "limit": limit})
+    return cur.fetchall() or []
+
+
+def _format_result(r: Dict[str, Any]) -> dict:
+    ent_id = r.get("entity_id")
+    return {
+        "type": r.get("type"),
+        "id": int(ent_id) if ent_id is not None else None,
+        "trip_id": r.get("trip_id"),
+        "title": r.get("title"),
+        "subtitle": r.get("subtitle"),
+        "date": r.get("date"),
+        "start_date": r.get("start_date"),
+        "end_date": r.get("end_date"),
+        "matched_fields": r.get("matched_fields") or [],
+    }
+
 
-    cur.execute(sql, params)
-    rows = cur.fetchall() or []
-    # Normalize Python side & gather trip associations
-    results: List[dict] = []
+def _associated_trips(cur, results: List[dict]) -> List[dict]:
+    """Trips owning matched nodes/legs/stops that did not match themselves."""
     trip_ids_in_results: Set[int] = set()
     component_trip_ids: Set[int] = set()
-    for r in rows:
-        ent_id = r.get("entity_id")
-        trip_id = r.get("trip_id")
-        typ = r.get("type")
-        rf = {
-            "type": typ,
-            "id": int(ent_id) if ent_id is not None else None,
-            "trip_id": trip_id,
-            "title": r.get("title"),
-            "subtitle": r.get("subtitle"),
-            "date": r.get("date"),
-            "start_date": r.get("start_date"),
-            "end_date": r.get("end_date"),
-            "matched_fields": r.get("matched_fields") or [],
-        }
-        results.append(rf)
-        if typ == 'trip' and ent_id is not None:
-            trip_ids_in_results.add(int(ent_id))
-        if typ in ('node','leg','stop') and trip_id is not None:
-            component_trip_ids.add(trip_id)
+    for r in results:
+        if r["type"] == 'trip' and r["id"] is not None:
+            trip_ids_in_results.add(r["id"])
+        if r["type"] in ('node','leg','stop') and r["trip_id"] is not None:
+            component_trip_ids.add(r["trip_id"])
 
     missing_trip_ids = sorted([tid for tid in component_trip_ids if tid not in trip_ids_in_results])
-    if missing_trip_ids:
-        cur.execute(
-            """
-            SELECT id, name, description, start_date, end_date
-            FROM trips
-            WHERE id = ANY(%s)
-            """,
-            (missing_trip_ids,)
-        )
-        trip_rows = cur.fetchall() or []
-        for tr in trip_rows:
-            results.append({
-                "type": "trip",
-                "id": tr["id"],
-                "trip_id": None,
-                "title": tr["name"],
-                "subtitle": tr.get("description"),
-                "date": tr.get("start_date"),
-                "matched_fields": ["associated"],
-            })
+    if not missing_trip_ids:
+        return []
+    cur.execute(
+        """
+        SELECT id, name, description, start_date, end_date
+        FROM trips
+        WHERE id = ANY(%s)
+        """,
+        (missing_trip_ids,)
+    )
+    trip_rows = cur.fetchall() or []
+    return [
+        {
+            "type": "trip",
+            "id": tr["id"],
+            "trip_id": None,
+            "title": tr["name"],
+            "subtitle": tr.get("description"),
+            "date": tr.get("start_date"),
+            "matched_fields": ["associated"],
+        }
+        for tr in trip_rows
+    ]
+
+
+@router.get("/")
+@router.get("")
+def global_search(q: str = Query("", min_length=0), limit: int = Query(50, ge=1, le=200)) -> List[Any]:
+    """Global fuzzy-ish search across trips, nodes, legs, stops, and adventures.
 
+    Returns a unified list of result objects with a common shape:
+    { type, id, trip_id, title, subtitle, date, start_date, end_date, matched_fields }
+    """
+    prepared = _prepare_search(q)
+    if prepared is None:
+        return []
+    params, token_clause = prepared
+
+    conn = get_db()
+    cur = conn.cursor()
+    # One indexed query over search_documents (kept in sync by triggers, see migration 20261018_0013).
+    # search_text ILIKE is answered from the trigram index; matched_fields re-checks the individual fields.
+    rows = _run_search(cur, params, token_clause, limit)
+    ranks = {(r["type"], r["entity_id"]): r["rank"] for r in rows}
+    results = [_format_result(r) for r in rows]
+    results.extend(_associated_trips(cur, results))
     cur.close(); conn.close()
 
-    # Re-sort after adding associated trips
-    def sort_key(obj):
-        return (
-            -(len(obj.get("matched_fields", [])) or 0),
-            obj.get("date") if obj.get("date") is not None else None,
-            obj.get("title") or ""
-        )
-    # Since Python can't sort descending on first and date desc easily with simple tuple, adjust:
+    # Re-sort after adding associated trips (they carry no text rank)
     results.sort(key=lambda o: (
         - (len(o.get('matched_fields') or [])),
+        - ranks.get((o['type'], o['id']), 0),
         o.get('date') is None,  # push None dates last
         o.get('date') if o.get('date') is None else -o['date'].toordinal() if hasattr(o.get('date'), 'toordinal') else o.get('date'),
         o.get('title') or ''
     ))
 
     return results
+
+
+_SUGGEST_TYPES = {"trip", "node", "stop", "adventure"}
+
+
+@router.get("/suggest")
+def search_suggest(
+    q: str = Query("", min_length=0),
+    limit: int = Query(10, ge=1, le=50),
+    types: Optional[str] = Query(None, description="Comma-separated subset of trip,node,stop,adventure"),
+) -> List[Any]:
+    """Typeahead: names / osm names starting with q (or with a word starting with q).
+
+    Served from the in-process prefix index; Postgres is only touched by the
+    background listener that keeps the index current.
+    """
+    type_filter: Optional[Set[str]] = None
+    if types:
+        type_filter = {t.strip() for t in types.split(",") if t.strip()}
+        unknown = type_filter - _SUGGEST_TYPES
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(sorted(unknown))}")
+    if not suggest_index.ready.is_set():
+        # First request after startup: wait briefly for the initial load
+        suggest_index.start()
+        suggest_index.ready.wait(timeout=5)
+    return suggest_index.suggest(q, limit, type_filter)
+
+
+@router.get("/page")
+def global_search_page(
+    q: str = Query("", min_length=0),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Keyset-paginated variant of global_search.
+
+    Returns { results, associated, next_cursor }. Pages follow the same order as
+    global_search; pass next_cursor back to continue, it is null on the last page.
+    Associated trips are listed separately per page so they never disturb the ordering.
+    """
+    prepared = _prepare_search(q)
+    if prepared is None:
+        return {"results": [], "associated": [], "next_cursor": None}
+    params, token_clause = prepared
+    after = _decode_cursor(cursor) if cursor else None
+
+    conn = get_db()
+    cur = conn.cursor()
+    rows = _run_search(cur, params, token_clause, limit + 1, after)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    results = [_format_result(r) for r in rows]
+    associated = _associated_trips(cur, results)
+    cur.close(); conn.close()
+
+    return {
+        "results": results,
+        "associated": associated,
+        "next_cursor": _encode_cursor(rows[-1]) if has_more else None,
+    }
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
 #from src.backend.app.routers.connect import get_db
 from .connect import get_db
+from .etag import table_etag, etag_matches, not_modified, etag_response
 
 router = APIRouter(prefix="/api/stop_categories", tags=["stop_categories"])
 
@@ -18,14 +19,19 @@ class StopCategoryUpdate(BaseModel):
 
 @router.get("/")
 @router.get("")
-def list_categories():
+def list_categories(request: Request):
     conn = get_db()
     cur = conn.cursor()
+    etag = table_etag(cur, "stop_categories")
+    if etag_matches(request, etag):
+        cur.close()
+        conn.close()
+        return not_modified(etag)
     cur.execute("SELECT id, name, emoji, created_at, updated_at FROM stop_categories ORDER BY name ASC")
     rows = cur.fetchall()
     cur.close()
     conn.close()
-    return [
+    return etag_response([
         {
             "id": r["id"],
             "name": r["name"],
@@ -33,7 +39,7 @@ def list_categories():
             "created_at": r["created_at"],
             "updated_at": r["updated_at"],
         } for r in rows
-    ]
+    ], etag)
 
 
 @router.post("/")
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
 #from src.backend.app.routers.connect import get_db
 from .connect import get_db
+from .etag import table_etag, etag_matches, not_modified, etag_response
 
 router = APIRouter(prefix="/api/stops", tags=["stops"])
 
@@ -77,6 +78,25 @@ def get_stops_by_leg(leg_id: int):
         for r in rows
     ]
 
+def _stop_out(r) -> dict:
+    return {
+        "id": r["id"],
+        "trip_id": r["trip_id"],
+        "name": r["name"],
+        "notes": r["notes"] if r["notes"] else None,
+        "category": r["category"],
+        "node_id": r["node_id"],
+        "leg_id": r["leg_id"],
+        "start_date": r["start_date"],
+        "end_date": r["end_date"],
+        "latitude": r["latitude"],
+        "longitude": r["longitude"],
+        "osm_name": r["osm_name"],
+        "osm_id": r["osm_id"],
+        "osm_country": r["osm_country"],
+        "osm_state": r["osm_state"]
+    }
+
 # Return a list of all stops corresponding to a specific node
 @router.get("/by_node/{node_id}")
 def get_stops_by_node(node_id: int):
@@ -112,11 +132,16 @@ def get_stops_by_node(node_id: int):
         for r in rows
     ]
 
-# Return a list of all stops corresponding to a specific node
+# Return a list of all stops corresponding to a specific trip
 @router.get("/by_trip/{trip_id}")
-def get_stops_by_node(trip_id: int):
+def get_stops_by_trip(trip_id: int, request: Request):
     conn = get_db()
     cur = conn.cursor()
+    etag = table_etag(cur, "stops", "trip_id = %s", (trip_id,))
+    if etag_matches(request, etag):
+        cur.close()
+        conn.close()
+        return not_modified(etag)
     cur.execute("""
     SELECT id, trip_id, name, notes, category, node_id, leg_id, start_date, end_date, latitude, longitude, osm_name, osm_id, osm_country, osm_state
         FROM stops
@@ -127,26 +152,7 @@ def get_stops_by_node(trip_id: int):
     cur.close()
     conn.close()
 
-    return [
-        {
-            "id": r["id"],
-            "trip_id": r["trip_id"],
-            "name": r["name"],
-            "notes": r["notes"] if r["notes"] else None,
-            "category": r["category"],
-            "node_id": r["node_id"],
-            "leg_id": r["leg_id"],
-            "start_date": r["start_date"],
-            "end_date": r["end_date"],
-            "latitude": r["latitude"],
-            "longitude": r["longitude"],
-            "osm_name": r["osm_name"],
-            "osm_id": r["osm_id"],
-            "osm_country": r["osm_country"],
-            "osm_state": r["osm_state"]
-        }
-        for r in rows
-    ]
+    return etag_response([_stop_out(r) for r in rows], etag)
 
 @router.post("/")
 def create_stop(stop: Stop):
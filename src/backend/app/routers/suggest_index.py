@@ -0,0 +1,252 @@
+## In-process prefix index for /api/search/suggest
+#
+# Names and osm names of trips, nodes, stops and adventures are held in a sorted list
+# of (key, kind, type, id) tuples and searched with bisect, so typeahead never queries
+# Postgres. A background thread LISTENs on the `search_suggest` channel (see migration
+# 20261018_0014) and reloads only the entities named in each notification, or everything
+# on RELOAD_ALL (sent after a database restore).
+
+import bisect
+import heapq
+import logging
+import re
+import select
+import threading
+import time
+import unicodedata
+
+import psycopg2
+
+#from src.backend.app.routers.connect import _connect_kwargs
+from .connect import _connect_kwargs
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "search_suggest"
+RELOAD_ALL = "*"
+
+# Prefixes up to this length match too many keys to rank by scanning them; they get a
+# bucket of (rank, type, id) kept in rank order instead
+SHORT_PREFIX = 2
+
+_ENTITY_SQL = {
+    "trip": "SELECT 'trip' AS type, id, NULL::int AS trip_id, name, NULL::text AS osm_name FROM trips",
+    "node": "SELECT 'node' AS type, id, trip_id, name, osm_name FROM nodes WHERE invisible IS NOT TRUE",
+    "stop": "SELECT 'stop' AS type, id, trip_id, name, osm_name FROM stops",
+    "adventure": "SELECT 'adventure' AS type, id, NULL::int AS trip_id, name, osm_name FROM adventures",
+}
+
+_WORD_START = re.compile(r"(?<!\w)\w")
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+
+# kind: 0 = title prefix, 1 = word inside title, 2 = osm_name prefix, 3 = word inside osm_name
+def _keys_for(title: str | None, osm_name: str | None) -> set[tuple[str, int]]:
+    keys: set[tuple[str, int]] = set()
+    for base_kind, text in ((0, title), (2, osm_name)):
+        norm = normalize(text or "")
+        if not norm:
+            continue
+        for m in _WORD_START.finditer(norm):
+            keys.add((norm[m.start():], base_kind if m.start() == 0 else base_kind + 1))
+    return keys
+
+
+def _rank(kind: int, title: str | None) -> tuple[int, int, str]:
+    return (kind, len(title or ""), title or "")
+
+
+def _bucket_items(keys, title):
+    # (prefix, (rank..., type, id)) for the short prefixes of each of an entity's keys
+    out = []
+    for key, kind, typ, ent_id in keys:
+        for n in range(1, min(SHORT_PREFIX, len(key)) + 1):
+            out.append((key[:n], (*_rank(kind, title), typ, ent_id)))
+    return out
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: list[tuple[str, int, str, int]] = []
+        self._entries: dict[tuple[str, int], dict] = {}
+        self._entity_keys: dict[tuple[str, int], list[tuple[str, int, str, int]]] = {}
+        self._buckets: dict[str, list[tuple]] = {}
+        self.ready = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------- lookups
+
+    def suggest(self, prefix: str, limit: int = 10, types: set[str] | None = None) -> list[dict]:
+        p = normalize(prefix)
+        if not p:
+            return []
+        with self._lock:
+            if len(p) <= SHORT_PREFIX:
+                return self._suggest_short(p, limit, types)
+            candidates: dict[tuple[str, int], tuple[int, int, str]] = {}
+            i = bisect.bisect_left(self._keys, (p,))
+            while i < len(self._keys):
+                key, kind, typ, ent_id = self._keys[i]
+                if not key.startswith(p):
+                    break
+                i += 1
+                if types and typ not in types:
+                    continue
+                rank = _rank(kind, self._entries[(typ, ent_id)]["title"])
+                prev = candidates.get((typ, ent_id))
+                if prev is None or rank < prev:
+                    candidates[(typ, ent_id)] = rank
+            best = heapq.nsmallest(limit, candidates.items(), key=lambda kv: kv[1])
+            return [dict(self._entries[k]) for k, _ in best]
+
+    def _suggest_short(self, p: str, limit: int, types: set[str] | None) -> list[dict]:
+        # The bucket is in rank order, so the first `limit` distinct entities are the best
+        out, seen = [], set()
+        for *_, typ, ent_id in self._buckets.get(p, ()):
+            if (types and typ not in types) or (typ, ent_id) in seen:
+                continue
+            seen.add((typ, ent_id))
+            out.append(dict(self._entries[(typ, ent_id)]))
+            if len(out) == limit:
+                break
+        return out
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------- updates
+
+    def _remove_locked(self, ident: tuple[str, int]):
+        items = self._entity_keys.pop(ident, [])
+        entry = self._entries.pop(ident, None)
+        for item in items:
+            i = bisect.bisect_left(self._keys, item)
+            if i < len(self._keys) and self._keys[i] == item:
+                del self._keys[i]
+        if entry is not None:
+            for prefix, ranked in _bucket_items(items, entry["title"]):
+                bucket = self._buckets.get(prefix, [])
+                i = bisect.bisect_left(bucket, ranked)
+                if i < len(bucket) and bucket[i] == ranked:
+                    del bucket[i]
+
+    def _upsert_locked(self, row: dict):
+        ident = (row["type"], row["id"])
+        self._remove_locked(ident)
+        items = sorted((key, kind, row["type"], row["id"]) for key, kind in _keys_for(row["name"], row["osm_name"]))
+        for item in items:
+            bisect.insort(self._keys, item)
+        for prefix, ranked in _bucket_items(items, row["name"]):
+            bisect.insort(self._buckets.setdefault(prefix, []), ranked)
+        self._entity_keys[ident] = items
+        self._entries[ident] = {
+            "type": row["type"],
+            "id": row["id"],
+            "trip_id": row["trip_id"],
+            "title": row["name"],
+            "osm_name": row["osm_name"],
+        }
+
+    def load_all(self, cur):
+        rows = []
+        for sql in _ENTITY_SQL.values():
+            cur.execute(sql)
+            rows.extend(cur.fetchall())
+        keys, entries, entity_keys, buckets = [], {}, {}, {}
+        for row in rows:
+            ident = (row["type"], row["id"])
+            items = sorted((key, kind, row["type"], row["id"]) for key, kind in _keys_for(row["name"], row["osm_name"]))
+            keys.extend(items)
+            for prefix, ranked in _bucket_items(items, row["name"]):
+                buckets.setdefault(prefix, []).append(ranked)
+            entity_keys[ident] = items
+            entries[ident] = {
+                "type": row["type"],
+                "id": row["id"],
+                "trip_id": row["trip_id"],
+                "title": row["name"],
+                "osm_name": row["osm_name"],
+            }
+        keys.sort()
+        for bucket in buckets.values():
+            bucket.sort()
+        with self._lock:
+            self._keys, self._entries, self._entity_keys, self._buckets = keys, entries, entity_keys, buckets
+        self.ready.set()
+
+    def refresh(self, cur, changed: dict[str, set[int]]):
+        fetched: list[dict] = []
+        for typ, ids in changed.items():
+            sql = _ENTITY_SQL.get(typ)
+            if not sql or not ids:
+                continue
+            where = " AND " if " WHERE " in sql else " WHERE "
+            cur.execute(f"{sql}{where}id = ANY(%s)", (list(ids),))
+            fetched.extend(cur.fetchall())
+        found = {(r["type"], r["id"]) for r in fetched}
+        with self._lock:
+            for typ, ids in changed.items():
+                for ent_id in ids:
+                    if (typ, ent_id) not in found:
+                        self._remove_locked((typ, ent_id))
+            for row in fetched:
+                self._upsert_locked(row)
+
+    # ------------------------------------------------------------- listener
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="suggest-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _listen_forever(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**_connect_kwargs())
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {CHANNEL}")
+                # (Re)load everything after (re)connecting: notifications may have been missed
+                self.load_all(cur)
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    changed: dict[str, set[int]] = {}
+                    reload_all = False
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        if note.payload == RELOAD_ALL:
+                            reload_all = True
+                            continue
+                        typ, _, ent_id = note.payload.partition(":")
+                        if ent_id.isdigit():
+                            changed.setdefault(typ, set()).add(int(ent_id))
+                    if reload_all:
+                        self.load_all(cur)
+                    elif changed:
+                        self.refresh(cur, changed)
+            except Exception:
+                logger.exception("Suggest index listener failed; reconnecting")
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,175 @@
+## Mapbox Vector Tiles for the map
+#
+# Tiles are built with ST_AsMVT over nodes, stops, adventures, leg lines and car routes
+# (simplified for the zoom), and cached on disk as TILE_CACHE_DIR/z/x/y.mvt. Each cache
+# file starts with the snapshot xmin it was generated under; triggers log the bounding
+# box of every geometry change in map_geometry_changes, so a cached tile is reused unless
+# a change that the tile may not have seen (xid >= its xmin) touches its envelope.
+
+import hashlib
+import os
+import struct
+import time
+import uuid
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+#from src.backend.app.routers.connect import get_db
+from .connect import get_db
+from .etag import make_etag, etag_matches, not_modified
+from .car_details import route_column
+
+router = APIRouter(prefix="/api/tiles", tags=["tiles"])
+
+TILE_CACHE_DIR = Path(os.getenv("TILE_CACHE_DIR", "/workspaces/src/tile_cache")).resolve()
+MAX_ZOOM = 20
+EXTENT = 4096
+BUFFER = 64
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+# Change log rows (and cache files) older than this are dropped / regenerated
+CHANGE_RETENTION_SECONDS = 7 * 24 * 3600
+PRUNE_INTERVAL_SECONDS = 3600
+
+_HEADER = struct.Struct(">q")
+_last_prune = 0.0
+
+# Tile envelope in 4326 (with the MVT buffer) for index lookups; constant per request
+_ENVELOPE = f"ST_Transform(ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => {BUFFER / EXTENT}), 4326)"
+
+_TILE_SQL = f"""
+WITH
+nodes_layer AS (
+    SELECT ST_AsMVTGeom(ST_Transform(geog::geometry, 3857), ST_TileEnvelope(%(z)s, %(x)s, %(y)s), {EXTENT}, {BUFFER}, true) AS geom,
+           id, trip_id, name
+    FROM nodes WHERE geog::geometry && {_ENVELOPE} AND invisible IS NOT TRUE
+),
+stops_layer AS (
+    SELECT ST_AsMVTGeom(ST_Transform(geog::geometry, 3857), ST_TileEnvelope(%(z)s, %(x)s, %(y)s), {EXTENT}, {BUFFER}, true) AS geom,
+           id, trip_id, node_id, name, category
+    FROM stops WHERE geog::geometry && {_ENVELOPE}
+),
+adventures_layer AS (
+    SELECT ST_AsMVTGeom(ST_Transform(geog::geometry, 3857), ST_TileEnvelope(%(z)s, %(x)s, %(y)s), {EXTENT}, {BUFFER}, true) AS geom,
+           id, name, category
+    FROM adventures WHERE geog::geometry && {_ENVELOPE}
+),
+legs_layer AS (
+    SELECT ST_AsMVTGeom(ST_Transform(geom, 3857), ST_TileEnvelope(%(z)s, %(x)s, %(y)s), {EXTENT}, {BUFFER}, true) AS geom,
+           id, trip_id, type
+    FROM legs WHERE geom && {_ENVELOPE}
+),
+routes_layer AS (
+    SELECT ST_AsMVTGeom(ST_Transform({{route}}, 3857), ST_TileEnvelope(%(z)s, %(x)s, %(y)s), {EXTENT}, {BUFFER}, true) AS geom,
+           cd.leg_id, l.trip_id
+    FROM car_details cd
+    JOIN legs l ON l.id = cd.leg_id
+    WHERE cd.route::geometry && {_ENVELOPE}
+)
+SELECT
+    COALESCE((SELECT ST_AsMVT(t, 'nodes', {EXTENT}, 'geom') FROM nodes_layer t WHERE geom IS NOT NULL), '')
+    || COALESCE((SELECT ST_AsMVT(t, 'stops', {EXTENT}, 'geom') FROM stops_layer t WHERE geom IS NOT NULL), '')
+    || COALESCE((SELECT ST_AsMVT(t, 'adventures', {EXTENT}, 'geom') FROM adventures_layer t WHERE geom IS NOT NULL), '')
+    || COALESCE((SELECT ST_AsMVT(t, 'legs', {EXTENT}, 'geom') FROM legs_layer t WHERE geom IS NOT NULL), '')
+    || COALESCE((SELECT ST_AsMVT(t, 'routes', {EXTENT}, 'geom') FROM routes_layer t WHERE geom IS NOT NULL), '')
+    AS tile
+"""
+
+
+def _tile_sql(z: int) -> str:
+    # Car routes at the simplification that fits the zoom (car_details.route_* columns)
+    column = route_column(z)
+    return _TILE_SQL.replace("{route}", f"cd.{column}" if column else "cd.route::geometry")
+
+
+# Read before building the tile: changes from transactions with xid >= xmin may not be in it
+_FRESHNESS_SQL = f"""
+SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS xmin,
+       %(version)s::bigint IS NOT NULL AND EXISTS (
+           SELECT 1 FROM map_geometry_changes
+           WHERE xid >= %(version)s AND geom && {_ENVELOPE}
+       ) AS dirty
+"""
+
+
+def _cache_path(z: int, x: int, y: int) -> Path:
+    return TILE_CACHE_DIR / str(z) / str(x) / f"{y}.mvt"
+
+
+def _read_cache(path: Path):
+    """(version, tile bytes), or None when missing or past the change log retention."""
+    try:
+        if time.time() - path.stat().st_mtime > CHANGE_RETENTION_SECONDS:
+            return None
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    return _HEADER.unpack_from(data)[0], data[_HEADER.size:]
+
+
+def _write_cache(path: Path, version: int, tile: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    tmp.write_bytes(_HEADER.pack(version) + tile)
+    os.replace(tmp, path)
+
+
+def _prune_changes(cur):
+    global _last_prune
+    if time.time() - _last_prune < PRUNE_INTERVAL_SECONDS:
+        return
+    _last_prune = time.time()
+    cur.execute(
+        "DELETE FROM map_geometry_changes WHERE changed_at < now() - make_interval(secs => %s)",
+        (CHANGE_RETENTION_SECONDS,),
+    )
+
+
+def clear_tile_cache():
+    """Drop every cached tile and the change log (e.g. after a database restore)."""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM map_geometry_changes")
+    conn.commit()
+    cur.close()
+    conn.close()
+    removed = 0
+    for path in TILE_CACHE_DIR.rglob("*.mvt"):
+        try:
+            path.unlink()
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+@router.get("/{z}/{x}/{y}.mvt")
+def get_tile(z: int, x: int, y: int, request: Request):
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    path = _cache_path(z, x, y)
+    cached = _read_cache(path)
+    params = {"z": z, "x": x, "y": y, "version": cached[0] if cached else None}
+
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(_FRESHNESS_SQL, params)
+    fresh = cur.fetchone()
+    if cached and not fresh["dirty"]:
+        tile = cached[1]
+    else:
+        cur.execute(_tile_sql(z), params)
+        tile = bytes(cur.fetchone()["tile"])
+        _write_cache(path, fresh["xmin"], tile)
+        _prune_changes(cur)
+        conn.commit()
+    cur.close()
+    conn.close()
+
+    etag = make_etag("tile", z, x, y, hashlib.sha1(tile).hexdigest())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(content=tile, media_type=MEDIA_TYPE, headers={"ETag": etag, "Cache-Control": "no-cache"})
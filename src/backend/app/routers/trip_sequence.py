@@ -0,0 +1,64 @@
+## Orders a trip's nodes and legs into Node -> Leg -> Node chains
+#
+# Used by /api/trips/{trip_id}/all_nodes_and_legs. Legs are indexed by start_node_id
+# so each chain step is O(1); the whole build is O(N + L) after sorting nodes by arrival.
+
+from collections import deque
+
+
+def _arrival_key(node: dict):
+    # Nodes without an arrival date go last; id keeps the order stable
+    arrival = node.get("arrival_date")
+    return (arrival is None, arrival or "", node["id"])
+
+
+def build_sequence(nodes: list[dict], legs: list[dict]) -> dict:
+    """Chain nodes and legs for display.
+
+    Chains start at the earliest node that still has unused outgoing legs (or was
+    never emitted), and follow legs in id order until they run out. A new chain
+    starts a new `segment`, re-emitting its start node when it branches off an
+    already visited node. Disconnected components and orphan nodes become their
+    own segments. Legs whose start node is not part of the trip are returned in
+    `unlinked_legs`.
+
+    Returns {"sequence": [{"type", "segment", "data"}, ...], "unlinked_legs": [...]}.
+    """
+    nodes_by_id = {n["id"]: n for n in nodes}
+    outgoing: dict[int, deque] = {}
+    unlinked_legs = []
+    for leg in sorted(legs, key=lambda l: l["id"]):
+        if leg["start_node_id"] in nodes_by_id:
+            outgoing.setdefault(leg["start_node_id"], deque()).append(leg)
+        else:
+            unlinked_legs.append(leg)
+
+    sequence: list[dict] = []
+    emitted: set[int] = set()
+    segment = -1
+
+    def walk(node_id: int):
+        nonlocal segment
+        segment += 1
+        sequence.append({"type": "node", "segment": segment, "data": nodes_by_id[node_id]})
+        emitted.add(node_id)
+        current = node_id
+        while outgoing.get(current):
+            leg = outgoing[current].popleft()
+            sequence.append({"type": "leg", "segment": segment, "data": leg})
+            nxt = leg["end_node_id"]
+            if nxt not in nodes_by_id:
+                break
+            sequence.append({"type": "node", "segment": segment, "data": nodes_by_id[nxt]})
+            emitted.add(nxt)
+            current = nxt
+
+    for node in sorted(nodes, key=_arrival_key):
+        node_id = node["id"]
+        if node_id not in emitted:
+            walk(node_id)
+        # Branches: further legs leaving a node that a previous chain already passed through
+        while outgoing.get(node_id):
+            walk(node_id)
+
+    return {"sequence": sequence, "unlinked_legs": unlinked_legs}
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 
 #from src.backend.app.connect import get_db
 from .connect import get_db
+from .etag import table_etag, etag_matches, not_modified, etag_response
+from .trip_sequence import build_sequence
+from .nodes import _node_out
+from .legs import _leg_out
+from .stops import _stop_out
+from .photos import _fetch_photos
+from .car_details import route_polyline_sql
 
 router = APIRouter(prefix="/api/trips", tags=["trips"])
 
@@ -24,19 +31,24 @@ class TripUpdate(BaseModel):
 # Return a list of all trips in order by start date
 @router.get("/")
 @router.get("")
-def get_trips():
+def get_trips(request: Request):
     conn = get_db()
     #print("Connection is type:", type(conn))
     cur = conn.cursor()
+    etag = table_etag(cur, "trips")
+    if etag_matches(request, etag):
+        cur.close()
+        conn.close()
+        return not_modified(etag)
     cur.execute("SELECT id, name, start_date, end_date FROM trips ORDER BY start_date")
     rows = cur.fetchall()
     cur.close()
     conn.close()
 
-    return [
+    return etag_response([
         {"id": r["id"], "name": r["name"], "start_date": r["start_date"], "end_date": r["end_date"]}
         for r in rows
-    ]
+    ], etag)
 
 # Create a new trip
 @router.post("/")
@@ -174,39 +186,98 @@ def get_all_nodes_and_legs(trip_id: int):
         for l in legs
     ]
 
-    # Build ordered sequence: Node -> Leg -> Node -> Leg -> ...
-    ordered_sequence = []
-    
-    if nodes:
-        # Start with the first node (earliest arrival_date)
-        ordered_nodes = sorted(nodes, key=lambda n: n["arrival_date"] or "")
-        current_node_id = ordered_nodes[0]["id"]
-        ordered_sequence.append({"type": "node", "data": nodes_dict[current_node_id]})
-        
-        # Find legs and next nodes in sequence
-        remaining_legs = legs_list.copy()
-        
-        while remaining_legs:
-            # Find leg that starts from current node
-            leg_found = None
-            for i, leg in enumerate(remaining_legs):
-                if leg["start_node_id"] == current_node_id:
-                    leg_found = remaining_legs.pop(i)
-                    break
-            
-            if leg_found:
-                ordered_sequence.append({"type": "leg", "data": leg_found})
-                # Add the end node
-                next_node_id = leg_found["end_node_id"]
-                if next_node_id in nodes_dict:
-                    ordered_sequence.append({"type": "node", "data": nodes_dict[next_node_id]})
-                    current_node_id = next_node_id
-                else:
-                    break
-            else:
-                break
-
-    return {"sequence": ordered_sequence}
+    # Build ordered sequence: Node -> Leg -> Node -> Leg -> ... (one segment per chain)
+    return build_sequence(list(nodes_dict.values()), legs_list)
+
+
+BUNDLE_PARTS = ("nodes", "legs", "stops", "details", "photos")
+
+
+@router.get("/{trip_id}/bundle")
+def get_trip_bundle(
+    trip_id: int,
+    include: str | None = Query(None, description="Comma-separated subset of nodes,legs,stops,details,photos (default: all)"),
+    zoom: int | None = Query(None, ge=0, le=22, description="Simplify car route polylines for this map zoom"),
+):
+    """Everything needed to render a trip in one response, one query per part.
+
+    Node, leg and stop rows have the same shape as the matching /by_trip endpoints;
+    `details` adds car_details and flight_details for the trip's legs.
+    """
+    if include:
+        parts = {p.strip() for p in include.split(",") if p.strip()}
+        unknown = parts - set(BUNDLE_PARTS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    else:
+        parts = set(BUNDLE_PARTS)
+
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT id, name, start_date, end_date, description FROM trips WHERE id = %s", (trip_id,))
+    trip = cur.fetchone()
+    if not trip:
+        cur.close()
+        conn.close()
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    bundle = {"trip": dict(trip)}
+
+    if "nodes" in parts:
+        cur.execute("""
+            SELECT id, trip_id, name, description, notes, arrival_date, departure_date, latitude, longitude, osm_name, osm_id, osm_country, osm_state, invisible
+            FROM nodes
+            WHERE trip_id = %s
+            ORDER BY arrival_date NULLS LAST, updated_at ASC NULLS FIRST
+        """, (trip_id,))
+        bundle["nodes"] = [_node_out(r) for r in cur.fetchall()]
+
+    if "legs" in parts:
+        cur.execute("""
+            SELECT id, trip_id, type, notes, date, start_node_id, end_node_id, start_latitude, start_longitude, end_latitude, end_longitude, start_osm_name, start_osm_id, start_osm_country, start_osm_state, end_osm_name, end_osm_id, end_osm_country, end_osm_state, miles
+            FROM legs
+            WHERE trip_id = %s
+            ORDER BY id
+        """, (trip_id,))
+        bundle["legs"] = [_leg_out(r) for r in cur.fetchall()]
+
+    if "stops" in parts:
+        cur.execute("""
+            SELECT id, trip_id, name, notes, category, node_id, leg_id, start_date, end_date, latitude, longitude, osm_name, osm_id, osm_country, osm_state
+            FROM stops
+            WHERE trip_id = %s
+            ORDER BY start_date ASC NULLS LAST, updated_at ASC NULLS LAST
+        """, (trip_id,))
+        bundle["stops"] = [_stop_out(r) for r in cur.fetchall()]
+
+    if "details" in parts:
+        cur.execute(f"""
+            SELECT cd.leg_id, cd.driving_time_seconds, {route_polyline_sql(zoom)} AS polyline
+            FROM car_details cd
+            JOIN legs l ON l.id = cd.leg_id
+            WHERE l.trip_id = %s
+            ORDER BY cd.leg_id
+        """, (trip_id,))
+        bundle["car_details"] = [dict(r) for r in cur.fetchall()]
+        cur.execute("""
+            SELECT fd.leg_id, fd.flight_number, fd.airline, fd.start_airport, fd.end_airport
+            FROM flight_details fd
+            JOIN legs l ON l.id = fd.leg_id
+            WHERE l.trip_id = %s
+            ORDER BY fd.leg_id
+        """, (trip_id,))
+        bundle["flight_details"] = [dict(r) for r in cur.fetchall()]
+
+    if "photos" in parts:
+        bundle["photos"] = [dict(r) for r in _fetch_photos(
+            cur,
+            "SELECT id, url, variants, description, taken_at, latitude, longitude, leg_id, node_id, stop_id, adventure_id FROM photos WHERE trip_id = %s ORDER BY id DESC",
+            (trip_id,),
+        )]
+
+    cur.close()
+    conn.close()
+    return bundle
 
 
 @router.get("/{trip_id}/miles")
@@ -221,159 +292,216 @@ def get_total_miles(trip_id: int):
     total_miles = row["total_miles"] if row and row["total_miles"] is not None else 0
     return {"total_miles": total_miles}
 
-@router.get("/data/statistics")
-def get_trip_statistics():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT SUM(miles) AS all_trip_miles FROM legs")
-    miles_row = cur.fetchone()
-    all_trip_miles = miles_row["all_trip_miles"] if miles_row and miles_row["all_trip_miles"] is not None else 0
-    all_trip_miles = round(all_trip_miles)
-
-    cur.execute("""
-        SELECT
-            (COUNT(DISTINCT osm_id) FILTER (WHERE osm_id IS NOT NULL)
-             + COUNT(*) FILTER (WHERE osm_id IS NULL)) AS unique_destination_count
-        FROM nodes
-        WHERE (invisible IS NOT TRUE)
-    """)
-    destinations_row = cur.fetchone()
-    unique_destination_count = destinations_row["unique_destination_count"] if destinations_row and destinations_row["unique_destination_count"] is not None else 0
-
-    cur.execute("SELECT SUM(miles) AS all_flight_miles FROM legs WHERE type = 'flight'")
-    flight_miles_row = cur.fetchone()
-    all_flight_miles = flight_miles_row["all_flight_miles"] if flight_miles_row and flight_miles_row["all_flight_miles"] is not None else 0
-
-    cur.execute("SELECT SUM(miles) AS all_car_miles FROM legs WHERE type = 'car'")
-    drive_miles_row = cur.fetchone()
-    all_car_miles = drive_miles_row["all_car_miles"] if drive_miles_row and drive_miles_row["all_car_miles"] is not None else 0
-
-    cur.execute("SELECT COUNT(DISTINCT osm_country) AS country_count FROM nodes WHERE osm_country IS NOT NULL")
-    country_row = cur.fetchone()
-    country_count = country_row["country_count"] if country_row and country_row["country_count"] is not None else 0
-
-    cur.execute("""
-        SELECT COUNT(DISTINCT osm_state) AS state_count
-        FROM (
-            SELECT osm_state FROM nodes WHERE osm_state IS NOT NULL
-            UNION
-            SELECT osm_state FROM stops WHERE osm_state IS NOT NULL
-        ) AS s
-    """)
-    state_row = cur.fetchone()
-    state_count = state_row["state_count"] if state_row and state_row["state_count"] is not None else 0
-
-    # Miles grouped by each travel type
-    cur.execute("""
+# From-scratch recompute of the dashboard statistics in one round-trip (consistency check)
+_STATISTICS_SQL = """
+    WITH leg_miles AS (
         SELECT type, COALESCE(SUM(miles), 0) AS total_miles
         FROM legs
         GROUP BY type
-    """)
-    miles_by_type_rows = cur.fetchall() or []
-    miles_by_type = {r["type"]: round(r["total_miles"] or 0) for r in miles_by_type_rows if r["type"] is not None}
-    # Ensure car and flight are always present in miles_by_type
-    miles_by_type["flight"] = round(all_flight_miles or 0)
-    miles_by_type["car"] = round(all_car_miles or 0)
-
-    # Total nights across all trips: merge overlapping date ranges and sum, counting only time actually on trips
-    cur.execute(
-        """
-        SELECT start_date, end_date
+    ),
+    visible_nodes AS (
+        SELECT osm_id, osm_country, osm_state FROM nodes WHERE invisible IS NOT TRUE
+    ),
+    -- Total nights: merge overlapping trip date ranges (gaps-and-islands) and sum, counting only time actually on trips
+    ranges AS (
+        SELECT start_date AS s, end_date AS e
         FROM trips
-        WHERE start_date IS NOT NULL AND end_date IS NOT NULL
-        ORDER BY start_date
-        """
-    )
-    trip_ranges = cur.fetchall() or []
-    merged: list[list] = []  # list of [start_date, end_date]
-    for r in trip_ranges:
-        s = r["start_date"]
-        e = r["end_date"]
-        if not s or not e or e <= s:
-            continue
-        if not merged:
-            merged.append([s, e])
-        else:
-            last_s, last_e = merged[-1]
-            if s <= last_e:
-                if e > last_e:
-                    merged[-1][1] = e
-            else:
-                merged.append([s, e])
-    total_nights = sum((e - s).days for s, e in merged)
-
-    # States by country from nodes (unique states per country)
-    cur.execute(
-        """
-        SELECT osm_country, ARRAY_AGG(DISTINCT osm_state ORDER BY osm_state) AS states
-        FROM nodes
-        WHERE osm_country IS NOT NULL AND (invisible IS NOT TRUE)
-        
+        WHERE start_date IS NOT NULL AND end_date IS NOT NULL AND end_date > start_date
+    ),
+    flagged AS (
+        SELECT s, e,
+               CASE WHEN s <= MAX(e) OVER (ORDER BY s, e ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+                    THEN 0 ELSE 1 END AS new_island
+        FROM ranges
+    ),
+    islands AS (
+        SELECT MIN(s) AS s, MAX(e) AS e
+        FROM (SELECT s, e, SUM(new_island) OVER (ORDER BY s, e ROWS UNBOUNDED PRECEDING) AS island FROM flagged) f
+        GROUP BY island
+    ),
+    states_by_country AS (
+        SELECT osm_country, ARRAY_REMOVE(ARRAY_AGG(DISTINCT osm_state), NULL) AS states
+        FROM visible_nodes
+        WHERE osm_country IS NOT NULL
         GROUP BY osm_country
-        ORDER BY osm_country
-        """
-    )
-    states_rows = cur.fetchall() or []
-    states_by_country = {r["osm_country"]: [s for s in (r["states"] or []) if s is not None] for r in states_rows}
-
-    # Destinations by country (count of unique OSM places per country)
-    cur.execute(
-        """
+    ),
+    destinations_by_country AS (
         SELECT osm_country, COUNT(DISTINCT osm_id) AS dest_count
-        FROM nodes
-        WHERE osm_country IS NOT NULL AND osm_id IS NOT NULL AND (invisible IS NOT TRUE)
+        FROM visible_nodes
+        WHERE osm_country IS NOT NULL AND osm_id IS NOT NULL
         GROUP BY osm_country
-        ORDER BY osm_country
-        """
+    ),
+    -- Stops + adventures by category counts
+    categories AS (
+        SELECT category, COUNT(*) AS cnt
+        FROM (SELECT category FROM stops UNION ALL SELECT category FROM adventures) c
+        WHERE category IS NOT NULL
+        GROUP BY category
     )
-    dest_rows = cur.fetchall() or []
-    destinations_by_country = {r["osm_country"]: int(r["dest_count"] or 0) for r in dest_rows}
+    SELECT jsonb_build_object(
+        'all_trip_miles', (SELECT COALESCE(SUM(miles), 0) FROM legs),
+        'trip_count', (SELECT COUNT(*) FROM trips),
+        'unique_destination_count', (
+            SELECT COUNT(DISTINCT osm_id) FILTER (WHERE osm_id IS NOT NULL) + COUNT(*) FILTER (WHERE osm_id IS NULL)
+            FROM visible_nodes
+        ),
+        'country_count', (SELECT COUNT(DISTINCT osm_country) FROM nodes WHERE osm_country IS NOT NULL),
+        'state_count', (
+            SELECT COUNT(*) FROM (
+                SELECT osm_state FROM nodes WHERE osm_state IS NOT NULL
+                UNION
+                SELECT osm_state FROM stops WHERE osm_state IS NOT NULL
+            ) s
+        ),
+        'miles_by_type', COALESCE((SELECT jsonb_object_agg(type, total_miles) FROM leg_miles WHERE type IS NOT NULL), '{}'::jsonb),
+        'total_nights', (SELECT COALESCE(SUM(e - s), 0) FROM islands),
+        'states_by_country', COALESCE((SELECT jsonb_object_agg(osm_country, states) FROM states_by_country), '{}'::jsonb),
+        'destinations_by_country', COALESCE((SELECT jsonb_object_agg(osm_country, dest_count) FROM destinations_by_country), '{}'::jsonb),
+        'stops_by_category', COALESCE((SELECT jsonb_object_agg(category, cnt) FROM categories), '{}'::jsonb)
+    ) AS data
+"""
+
+# global_stats kinds read by get_trip_statistics (see migration 20261018_0016)
+_STATISTICS_KINDS = [
+    "trip_count", "leg_miles", "dest_no_osm", "dest_osm",
+    "country", "state", "country_state", "country_dest", "category",
+]
+
+
+def _finalize_statistics(raw: dict) -> dict:
+    # Rounding and always-present keys, shared by the counters and the from-scratch recompute
+    miles_by_type = {t: round(m or 0) for t, m in raw["miles_by_type"].items()}
+    # Ensure car and flight are always present in miles_by_type
+    miles_by_type.setdefault("flight", 0)
+    miles_by_type.setdefault("car", 0)
+    categories = {c: int(n or 0) for c, n in raw["stops_by_category"].items()}
+    for key in ('hotel','restaurant','attraction','park','other'):
+        categories.setdefault(key, 0)
+    return {
+        "all_trip_miles": round(raw["all_trip_miles"] or 0),
+        "trip_count": int(raw["trip_count"] or 0),
+        "unique_destination_count": int(raw["unique_destination_count"] or 0),
+        "country_count": int(raw["country_count"] or 0),
+        "state_count": int(raw["state_count"] or 0),
+        "miles_by_type": miles_by_type,
+        "total_nights": int(raw["total_nights"] or 0),
+        "states_by_country": {c: sorted(states) for c, states in sorted(raw["states_by_country"].items())},
+        "destinations_by_country": {c: int(n) for c, n in sorted(raw["destinations_by_country"].items())},
+        "stops_by_category": categories,
+    }
 
-    # Stops + adventures by category counts (ensure all categories present)
+
+def _statistics_from_counters(cur) -> dict:
+    # global_stats_current sums the compacted counters and the delta log, keeping only keys
+    # with refs > 0, so distinct counts are row counts
     cur.execute(
-        """
-        SELECT category, COUNT(*) AS cnt
-        FROM stops
-        GROUP BY category
-        """
+        "SELECT kind, key, subkey, refs, value FROM global_stats_current WHERE kind = ANY(%s)",
+        (_STATISTICS_KINDS,),
     )
-    stop_cat_rows = cur.fetchall() or []
+    rows = cur.fetchall() or []
+    cur.execute("SELECT stats_total_nights() AS total_nights")
+    raw = {
+        "all_trip_miles": 0.0,
+        "trip_count": 0,
+        "unique_destination_count": 0,
+        "country_count": 0,
+        "state_count": 0,
+        "miles_by_type": {},
+        "total_nights": cur.fetchone()["total_nights"],
+        "states_by_country": {},
+        "destinations_by_country": {},
+        "stops_by_category": {},
+    }
+    for r in rows:
+        kind = r["kind"]
+        if kind == "leg_miles":
+            raw["all_trip_miles"] += r["value"]
+            if r["key"]:  # '' holds legs without a type
+                raw["miles_by_type"][r["key"]] = r["value"]
+        elif kind == "trip_count":
+            raw["trip_count"] = r["refs"]
+        elif kind == "dest_no_osm":
+            raw["unique_destination_count"] += r["refs"]
+        elif kind == "dest_osm":
+            raw["unique_destination_count"] += 1
+        elif kind == "country":
+            raw["country_count"] += 1
+        elif kind == "state":
+            raw["state_count"] += 1
+        elif kind == "country_state":
+            states = raw["states_by_country"].setdefault(r["key"], [])
+            if r["subkey"]:  # '' marks nodes with a country but no state
+                states.append(r["subkey"])
+        elif kind == "country_dest":
+            raw["destinations_by_country"][r["key"]] = raw["destinations_by_country"].get(r["key"], 0) + 1
+        elif kind == "category":
+            raw["stops_by_category"][r["key"]] = r["refs"]
+    return _finalize_statistics(raw)
+
+
+@router.get("/data/statistics")
+def get_trip_statistics():
+    # Read-only: the trigger-maintained counters plus the not yet compacted delta log
+    conn = get_db()
+    cur = conn.cursor()
+    stats = _statistics_from_counters(cur)
+    cur.close()
+    conn.close()
+    return stats
+
+
+@router.get("/data/statistics/check")
+def check_trip_statistics():
+    """Recompute every statistic from scratch and report where the counters drifted.
+
+    Repair with POST /api/admin/stats/rebuild.
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    stored = _statistics_from_counters(cur)
+    cur.execute(_STATISTICS_SQL)
+    expected = _finalize_statistics(cur.fetchone()["data"])
+
     cur.execute(
         """
-        SELECT category, COUNT(*) AS cnt
-        FROM adventures
-        GROUP BY category
+        WITH expected AS (
+            SELECT t.id AS trip_id, t.name,
+                   COALESCE((SELECT SUM(miles) FROM legs l WHERE l.trip_id = t.id), 0) AS total_miles
+            FROM trips t
+        ),
+        stored AS (
+            SELECT key::int AS trip_id, value AS total_miles
+            FROM global_stats_current
+            WHERE kind = 'trip_miles'
+        )
+        SELECT COALESCE(e.trip_id, s.trip_id) AS trip_id, e.name,
+               s.total_miles AS stored_miles, e.total_miles AS expected_miles
+        FROM expected e
+        FULL JOIN stored s ON s.trip_id = e.trip_id
+        WHERE e.trip_id IS NULL
+           OR ABS(COALESCE(s.total_miles, 0) - e.total_miles) > 0.01
+        ORDER BY 1
         """
     )
-    adv_cat_rows = cur.fetchall() or []
-    categories = {}
-    for r in stop_cat_rows:
-        categories[r["category"]] = categories.get(r["category"], 0) + int(r["cnt"] or 0)
-    for r in adv_cat_rows:
-        categories[r["category"]] = categories.get(r["category"], 0) + int(r["cnt"] or 0)
-    for key in ('hotel','restaurant','attraction','park','other'):
-        categories.setdefault(key, 0)
-
-    # Trip count
-    cur.execute("SELECT COUNT(*) AS trip_count FROM trips")
-    trip_row = cur.fetchone()
-    trip_count = trip_row["trip_count"] if trip_row and trip_row["trip_count"] is not None else 0
-
+    trip_rows = cur.fetchall() or []
     cur.close()
     conn.close()
 
-    return {
-        "all_trip_miles": all_trip_miles,
-        "trip_count": trip_count,
-        "unique_destination_count": unique_destination_count,
-        "country_count": country_count,
-        "state_count": state_count,
-        "miles_by_type": miles_by_type,
-        "total_nights": total_nights,
-        "states_by_country": states_by_country,
-        "destinations_by_country": destinations_by_country,
-        "stops_by_category": categories,
+    drift = {
+        key: {"stored": stored[key], "expected": expected[key]}
+        for key in expected
+        if stored.get(key) != expected[key]
     }
+    trips = [
+        {
+            "trip_id": r["trip_id"],
+            "name": r["name"],
+            "stored_miles": r["stored_miles"],
+            "expected_miles": r["expected_miles"],
+        }
+        for r in trip_rows
+    ]
+    return {"consistent": not drift and not trips, "drift": drift, "trips": trips}
 
 
 @router.get("/data/trips_by_miles")
@@ -382,10 +510,9 @@ def get_trips_by_miles():
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT t.id, t.name, COALESCE(SUM(l.miles), 0) AS total_miles
+        SELECT t.id, t.name, COALESCE(s.value, 0) AS total_miles
         FROM trips t
-        LEFT JOIN legs l ON l.trip_id = t.id
-        GROUP BY t.id, t.name
+        LEFT JOIN global_stats_current s ON s.kind = 'trip_miles' AND s.key = t.id::text
         ORDER BY total_miles DESC, t.start_date ASC
         """
     )
@@ -404,11 +531,10 @@ def get_trips_by_nights():
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT t.id, t.name,
-               COALESCE(GREATEST(0, (t.end_date::date - t.start_date::date)), 0)::int AS nights
-        FROM trips t
-        WHERE t.start_date IS NOT NULL AND t.end_date IS NOT NULL
-        ORDER BY nights DESC, t.start_date ASC
+        SELECT id, name, GREATEST(0, end_date - start_date) AS nights
+        FROM trips
+        WHERE start_date IS NOT NULL AND end_date IS NOT NULL
+        ORDER BY nights DESC, start_date ASC
         """
     )
     rows = cur.fetchall() or []
@@ -0,0 +1,126 @@
+## Serves /uploads (photo originals and their variants)
+#
+# Uploaded files are never modified in place: originals are named by content hash (or a
+# random uuid for older uploads) and variants by the original's name plus a hash of their
+# own bytes, so a rebuilt variant gets a new URL. Responses are therefore cacheable
+# forever and carry a strong ETag, and a revalidation is answered with 304.
+# Range requests are supported for large originals. With UPLOADS_ACCEL_REDIRECT set
+# (e.g. "/protected_uploads/"), only headers are sent and nginx streams the file itself.
+
+import os
+import re
+import mimetypes
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+#from src.backend.app.routers.photos import UPLOAD_DIR
+from .photos import UPLOAD_DIR
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+ACCEL_REDIRECT = os.getenv("UPLOADS_ACCEL_REDIRECT")
+CHUNK_SIZE = 256 * 1024
+
+_ROOT = os.path.realpath(UPLOAD_DIR)
+_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+
+def _resolve(path: str) -> str:
+    full = os.path.realpath(os.path.join(_ROOT, path))
+    # Temp files of in-flight uploads are not served
+    if not full.startswith(_ROOT + os.sep) or os.path.basename(full).startswith("tmp_") or not os.path.isfile(full):
+        raise HTTPException(status_code=404, detail="Not found")
+    return full
+
+
+def _etag(full: str, st: os.stat_result) -> str:
+    # Content-addressed originals already carry their hash; other files never change after
+    # being written, so size and mtime identify their bytes
+    stem = os.path.splitext(os.path.basename(full))[0]
+    if _HASH_NAME.match(stem):
+        return f'"{stem}"'
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    return header.strip() == "*" or any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """(start, end) inclusive for a single byte range; None to serve the whole file.
+
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    m = _RANGE.match(header.strip())
+    if not m:
+        return None
+    first, last = m.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise _unsatisfiable(size)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise _unsatisfiable(size)
+    return start, end
+
+
+def _unsatisfiable(size: int) -> HTTPException:
+    return HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+
+
+def _iter_file(full: str, start: int, length: int):
+    with open(full, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+def serve_upload(path: str, request: Request):
+    full = _resolve(path)
+    st = os.stat(full)
+    etag = _etag(full, st)
+    media_type = mimetypes.guess_type(full)[0] or "application/octet-stream"
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if ACCEL_REDIRECT:
+        # nginx handles Range itself for internal redirects
+        rel = os.path.relpath(full, _ROOT).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = ACCEL_REDIRECT.rstrip("/") + "/" + rel
+        return Response(status_code=200, headers=headers, media_type=media_type)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    # If-Range with a stale validator means: send the whole (new) file
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, st.st_size)
+
+    if byte_range is None:
+        # FileResponse uses the server's zero-copy path (pathsend) where available
+        return FileResponse(full, media_type=media_type, headers=headers, stat_result=st)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(_iter_file(full, start, length), status_code=206, media_type=media_type, headers=headers)
@@ -0,0 +1,113 @@
+"""Benchmark the trip sequence builder against the previous O(L^2) implementation.
+
+Run from src/backend:  python benchmarks/bench_trip_sequence.py [--legs 1000 2000 5000] [--repeat 3]
+
+Synthetic trips are one long chain with a few branches and disconnected side trips.
+No database needed.
+"""
+import argparse
+import datetime as dt
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app" / "routers"))
+from trip_sequence import build_sequence  # noqa: E402
+
+
+def legacy_sequence(nodes, legs):
+    # The pre-index implementation from routers/trips.py, kept for comparison
+    nodes_dict = {n["id"]: n for n in nodes}
+    ordered_sequence = []
+    if nodes:
+        ordered_nodes = sorted(nodes, key=lambda n: n["arrival_date"] or "")
+        current_node_id = ordered_nodes[0]["id"]
+        ordered_sequence.append({"type": "node", "data": nodes_dict[current_node_id]})
+        remaining_legs = legs.copy()
+        while remaining_legs:
+            leg_found = None
+            for i, leg in enumerate(remaining_legs):
+                if leg["start_node_id"] == current_node_id:
+                    leg_found = remaining_legs.pop(i)
+                    break
+            if leg_found:
+                ordered_sequence.append({"type": "leg", "data": leg_found})
+                next_node_id = leg_found["end_node_id"]
+                if next_node_id in nodes_dict:
+                    ordered_sequence.append({"type": "node", "data": nodes_dict[next_node_id]})
+                    current_node_id = next_node_id
+                else:
+                    break
+            else:
+                break
+    return {"sequence": ordered_sequence}
+
+
+def synthetic_trip(n_legs: int, seed: int = 0):
+    rng = random.Random(seed)
+    start = dt.date(2020, 1, 1)
+    nodes, legs = [], []
+
+    def add_node(day):
+        nodes.append({"id": len(nodes) + 1, "arrival_date": start + dt.timedelta(days=day)})
+        return nodes[-1]["id"]
+
+    def add_leg(a, b):
+        legs.append({"id": len(legs) + 1, "start_node_id": a, "end_node_id": b})
+
+    # Main chain, with ~5% of nodes also branching off into a short excursion
+    # (added after the main leg, so the legacy builder still follows the chain)
+    current = add_node(0)
+    day = 0
+    while len(legs) < n_legs * 0.9:
+        day += 1
+        nxt = add_node(day)
+        add_leg(current, nxt)
+        if rng.random() < 0.05:
+            add_leg(current, add_node(day))
+        current = nxt
+    # Disconnected side trips and orphan nodes
+    while len(legs) < n_legs:
+        a = add_node(rng.randint(0, day))
+        b = add_node(rng.randint(0, day))
+        add_leg(a, b)
+    for _ in range(n_legs // 100):
+        add_node(rng.randint(0, day))
+
+    # Legs arrive in id order from the database; shuffle node order like an unsorted fetch
+    rng.shuffle(nodes)
+    return nodes, legs
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--legs", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'legs':>8} {'nodes':>8} {'legacy ms':>12} {'indexed ms':>12} {'speedup':>9} {'legacy legs':>12} {'indexed legs':>13}")
+    for n_legs in args.legs:
+        nodes, legs = synthetic_trip(n_legs)
+        legacy_t, legacy = best_of(lambda: legacy_sequence(nodes, legs), args.repeat)
+        new_t, new = best_of(lambda: build_sequence(nodes, legs), args.repeat)
+        legacy_legs = sum(1 for s in legacy["sequence"] if s["type"] == "leg")
+        new_legs = sum(1 for s in new["sequence"] if s["type"] == "leg") + len(new["unlinked_legs"])
+        assert new_legs == len(legs), "indexed builder dropped legs"
+        print(
+            f"{n_legs:>8} {len(nodes):>8} {legacy_t * 1000:>12.2f} {new_t * 1000:>12.2f} "
+            f"{legacy_t / new_t if new_t else float('inf'):>8.1f}x {legacy_legs:>12} {new_legs:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
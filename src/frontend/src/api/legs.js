@@ -6,7 +6,7 @@ export const createLeg = (payload) => api.post('/legs', payload).then(r => r.dat
 export const updateLeg = (id, payload) => api.put(`/legs/${id}`, payload).then(r => r.data);
 export const deleteLeg = (id) => api.delete(`/legs/${id}`).then(r => r.data);
 
-export const getCarDetails = (legID) => api.get(`/car_details/${legID}`).then(r => r.data);
+export const getCarDetails = (legID, zoom) => api.get(`/car_details/${legID}`, { params: { zoom } }).then(r => r.data);
 export const createCarDetails = (payload) => api.post('/car_details', payload).then(r => r.data);
 
 export const getFlightDetails = (legID) => api.get(`/flight_details/${legID}`).then(r => r.data);
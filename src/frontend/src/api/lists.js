@@ -2,6 +2,8 @@ import { api } from './client';
 
 export const listLists = () => api.get('/lists').then(r => r.data);
 export const getList = (id) => api.get(`/lists/${id}`).then(r => r.data);
+// Completion counts for every list: [{ id, name, match_type, item_count, matched_count, match_error, summary }]
+export const getListsSummary = () => api.get('/lists/summary').then(r => r.data);
 export const createList = (payload) => api.post('/lists', payload).then(r => r.data);
 export const updateList = (id, payload) => api.put(`/lists/${id}`, payload).then(r => r.data);
 export const deleteList = (id) => api.delete(`/lists/${id}`).then(r => r.data);
@@ -10,5 +12,5 @@ export const deleteList = (id) => api.delete(`/lists/${id}`).then(r => r.data);
 export const addOverride = (id, item) => api.post(`/lists/${id}/overrides`, { item }).then(r => r.data);
 export const removeOverride = (id, item) => api.delete(`/lists/${id}/overrides`, { params: { item } }).then(r => r.data);
 
-const listsApi = { listLists, getList, createList, updateList, deleteList, addOverride, removeOverride };
+const listsApi = { listLists, getList, getListsSummary, createList, updateList, deleteList, addOverride, removeOverride };
 export default listsApi;
@@ -0,0 +1,11 @@
+import { api } from './client';
+
+const bboxParam = (bounds) => [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()].join(',');
+
+// Features inside a Leaflet LatLngBounds: resolves { nodes, stops, legs, adventures }
+export const getMapFeatures = (bounds, zoom, { tripId } = {}) =>
+  api.get('/map/features', { params: { bbox: bboxParam(bounds), zoom, trip_id: tripId } }).then(r => r.data);
+
+// Grid clusters for low zooms: resolves { zoom, cell_degrees, clusters: [{ latitude, longitude, count, bounds, kinds, categories, item }] }
+export const getMapClusters = (bounds, zoom, { tripId } = {}) =>
+  api.get('/map/clusters', { params: { bbox: bboxParam(bounds), zoom, trip_id: tripId } }).then(r => r.data);
@@ -1,12 +1,25 @@
-import { api } from "./client";
+import { api, API_ORIGIN } from "./client";
 
 export const uploadPhoto = (formData) => api.post('/photos/upload', formData, {
   headers: { 'Content-Type': 'multipart/form-data' }
 }).then(r => r.data);
 
+export const uploadPhotoBatch = (formData) => api.post('/photos/upload_batch', formData, {
+  headers: { 'Content-Type': 'multipart/form-data' }
+}).then(r => r.data);
+
 export const listPhotosByTrip = (tripID) => api.get(`/photos/by_trip/${tripID}`).then(r => r.data);
 export const listPhotosByLeg = (legID) => api.get(`/photos/by_leg/${legID}`).then(r => r.data);
 export const listPhotosByNode = (nodeID) => api.get(`/photos/by_node/${nodeID}`).then(r => r.data);
 export const listPhotosByStop = (stopID) => api.get(`/photos/by_stop/${stopID}`).then(r => r.data);
 export const listPhotosByAdventure = (adventureID) => api.get(`/photos/by_adventure/${adventureID}`).then(r => r.data);
+export const suggestPhotoLinks = (id, limit = 5) => api.get(`/photos/${id}/suggest`, { params: { limit } }).then(r => r.data);
 export const deletePhoto = (id) => api.delete(`/photos/${id}`).then(r => r.data);
+
+const withOrigin = (url) => (url.startsWith('http') ? url : `${API_ORIGIN}${url}`);
+
+// Resized variant if the backend has generated it, otherwise the original
+export const photoSrc = (photo, size = 'large') => withOrigin(photo.variants?.[size]?.webp || photo.url);
+export const photoSrcSet = (photo) => photo.srcset
+  ? photo.srcset.split(', ').map(part => withOrigin(part)).join(', ')
+  : undefined;
@@ -4,3 +4,15 @@ export const globalSearch = (query, limit = 50) => {
   if (!query || query.trim().length < 2) return Promise.resolve([]);
   return api.get('/search', { params: { q: query, limit } }).then(r => r.data);
 };
+
+// Keyset-paginated search: resolves { results, associated, next_cursor }
+export const globalSearchPage = (query, { limit = 50, cursor } = {}) => {
+  if (!query || query.trim().length < 2) return Promise.resolve({ results: [], associated: [], next_cursor: null });
+  return api.get('/search/page', { params: { q: query, limit, cursor } }).then(r => r.data);
+};
+
+// Typeahead suggestions: resolves [{ type, id, trip_id, title, osm_name }]
+export const searchSuggest = (query, { limit = 10, types } = {}) => {
+  if (!query || !query.trim()) return Promise.resolve([]);
+  return api.get('/search/suggest', { params: { q: query, limit, types } }).then(r => r.data);
+};
@@ -5,6 +5,10 @@ export const listTrips = () => api.get('/trips').then(r => r.data);
 export const createTrip = (payload) => api.post('/trips', payload).then(r => r.data);
 export const updateTrip = (id, payload) => api.put(`/trips/${id}`, payload).then(r => r.data);
 export const deleteTrip = (id) => api.delete(`/trips/${id}`).then(r => r.data);
+// include: optional array/string subset of 'nodes','legs','stops','details','photos'
+export const getTripBundle = (id, include) => api.get(`/trips/${id}/bundle`, {
+  params: include ? { include: Array.isArray(include) ? include.join(',') : include } : undefined,
+}).then(r => r.data);
 export const getTripMiles = (id) => api.get(`/trips/${id}/miles`).then(r => r.data);
 export const getTripStatistics = () => api.get('/trips/data/statistics').then(r => r.data);
 export const getTripsByMiles = () => api.get('/trips/data/trips_by_miles').then(r => r.data);
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import styled from 'styled-components';
-import { API_ORIGIN } from '../../api/client';
+import { photoSrc, photoSrcSet } from '../../api/photos';
 
 const SliderContainer = styled.div`
   width: 100%;
@@ -75,7 +75,7 @@ export default function PhotoSlideshowLarge({ photos = [], image_height }) {
     <SliderContainer image_height={image_height}>
       {photos.map((p, i) => (
         <Slide key={p.id || p.url || i} active={i === index}>
-          <Img src={p.url.startsWith('http') ? p.url : `${API_ORIGIN}${p.url}`} alt={p.description || `Photo ${i+1}`} />
+          <Img src={photoSrc(p)} srcSet={photoSrcSet(p)} sizes="100vw" alt={p.description || `Photo ${i+1}`} />
         </Slide>
       ))}
       {photos.length > 1 && (
@@ -1,6 +1,6 @@
 import React from 'react';
 import styled from 'styled-components';
-import { API_ORIGIN } from '../../api/client';
+import { photoSrc } from '../../api/photos';
 
 const SmallSlider = styled.div`
   width: 100%;
@@ -26,7 +26,7 @@ export default function PhotoSlideshowSmall({ photos = [] }) {
   return (
     <SmallSlider>
       {thumbs.map((p, i) => (
-  <Thumb key={p.id || p.url || i} src={p.url.startsWith('http') ? p.url : `${API_ORIGIN}${p.url}`} alt={p.description || `Photo ${i+1}`} />
+  <Thumb key={p.id || p.url || i} src={photoSrc(p, 'thumb')} alt={p.description || `Photo ${i+1}`} />
       ))}
     </SmallSlider>
   );
@@ -6,7 +6,7 @@ import { Button, Text, Flex } from '../../styles/components';
 import AdventureForm from '../../components/forms/AdventureForm';
 import ConfirmDeleteButton from '../../components/common/ConfirmDeleteButton';
 import { getAdventure, updateAdventure, deleteAdventure } from '../../api/adventures';
-import { uploadPhoto, listPhotosByAdventure } from '../../api/photos';
+import { uploadPhoto, listPhotosByAdventure, photoSrc } from '../../api/photos';
 
 export default function UpdateAdventure() {
   const navigate = useNavigate();
@@ -121,7 +121,7 @@ export default function UpdateAdventure() {
         {photos && photos.length > 0 && (
           <div style={{ marginTop: '1rem', display: 'grid', gridTemplateColumns: 'repeat(auto-fill, minmax(120px, 1fr))', gap: '8px' }}>
             {photos.map(p => (
-              <img key={p.id} src={p.url} alt={p.description || ''} style={{ width: '100%', height: 100, objectFit: 'cover', borderRadius: 8, background: '#0f172a' }} />
+              <img key={p.id} src={photoSrc(p, 'thumb')} alt={p.description || ''} style={{ width: '100%', height: 100, objectFit: 'cover', borderRadius: 8, background: '#0f172a' }} />
             ))}
           </div>
         )}